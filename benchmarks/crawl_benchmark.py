@@ -0,0 +1,90 @@
+"""
+Runs the ETL pipeline against the local FACUA stand-in and reports its throughput.
+
+By default the whole data_etl.main pipeline is run, which needs a PostgreSQL database
+(the credentials come from the same .env file as data_etl.py; use a dedicated
+database because its tables are dropped). With --extract-only the crawl, parsing and
+transformation run without loading anything.
+
+Usage (from the repository root):
+    python benchmarks/crawl_benchmark.py --products 50 --latency 0.05 --async
+    python benchmarks/crawl_benchmark.py --extract-only --error-rate 0.02
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCHMARKS_DIR, "..", "src"))
+
+from facua_stub_server import add_server_arguments, build_server
+
+import data_etl
+from support.async_extraction_support import crawl_product_pages
+from support.data_extraction_support import configure_cache, iter_product_pages
+from support.data_transformation_support import create_table_df, get_product_info
+from support.html_parsing_support import parse_product_page
+
+
+def extract_only(root_url, asynchronous, max_in_flight, per_host):
+    configure_cache(None)
+    if asynchronous:
+        product_pages = crawl_product_pages(root_url, max_in_flight=max_in_flight, per_host=per_host)
+    else:
+        product_pages = iter_product_pages(root_url)
+
+    rows = 0
+    for product_name, link, content in product_pages:
+        product_page = parse_product_page(content) if content else None
+        if not product_page:
+            continue
+        table_head_list, table_body_list, title = product_page
+        product_info = get_product_info(link, title or product_name)
+        rows += len(create_table_df(table_head_list, table_body_list, *product_info, link))
+    return rows
+
+
+def report(server, elapsed):
+    timings = np.array(server.timings) * 1000
+    counters = server.counters
+    print(f"\nPages served: {counters['requests']} in {elapsed:.2f} s ({counters['requests'] / elapsed:.1f} pages/s)")
+    print(f"Errors injected: {counters['errors']}, not modified: {counters['not_modified']}, "
+          f"not found: {counters['not_found']}, bytes sent: {counters['bytes'] / 1024 ** 2:.1f} MB")
+    if len(timings):
+        p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+        print(f"Server-side latency: p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ETL pipeline against a local FACUA stand-in.")
+    add_server_arguments(parser)
+    parser.add_argument("--async", dest="asynchronous", action="store_true", help="fetch pages concurrently")
+    parser.add_argument("--max-in-flight", type=int, default=32, help="maximum concurrent requests")
+    parser.add_argument("--per-host", type=int, default=8, help="maximum concurrent requests per host")
+    parser.add_argument("--database", default="comparativa_supermercados_benchmark",
+                        help="PostgreSQL database to load into (its tables are dropped)")
+    parser.add_argument("--extract-only", action="store_true", help="crawl, parse and transform without loading")
+    args = parser.parse_args()
+
+    with build_server(args) as server:
+        root_url = server.url + "/"
+        start = time.perf_counter()
+        if args.extract_only:
+            rows = extract_only(root_url, args.asynchronous, args.max_in_flight, args.per_host)
+            print(f"Price rows extracted: {rows}")
+        else:
+            with tempfile.TemporaryDirectory() as output_dir:
+                data_etl.main(root_url=root_url, database=args.database, output_dir=output_dir,
+                              asynchronous=args.asynchronous, max_in_flight=args.max_in_flight,
+                              per_host=args.per_host, cache_dir=None,
+                              frontier_path=os.path.join(output_dir, "crawl_frontier.sqlite"), metrics_dir=None,
+                              attribute_cache_path=os.path.join(output_dir, "product_attributes.sqlite"))
+        report(server, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
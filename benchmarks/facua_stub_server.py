@@ -0,0 +1,331 @@
+"""
+Local stand-in for super.facua.org, used to benchmark and test the crawler offline.
+
+The server either generates a synthetic copy of the site (supermarkets, categories,
+product grids and price tables) or replays pages recorded in the on-disk HTTP cache.
+The markup uses the same classes the extraction selectors look for. Latency and
+error rates can be configured to reproduce a slow or flaky source.
+
+Usage (from the repository root):
+    python benchmarks/facua_stub_server.py --port 8000 --products 50 --latency 0.05
+    python benchmarks/facua_stub_server.py --from-cache data/cache/http
+"""
+import argparse
+import gzip
+import hashlib
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import date, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from support.html_parsing_support import CARD_CLASS, PRODUCT_GRID_CLASS, PRICE_TABLE_CLASS
+
+
+FACUA_URL = "https://super.facua.org"
+
+SUPERMARKETS = ["mercadona", "carrefour", "dia", "alcampo", "eroski", "hipercor", "el-corte-ingles", "lidl", "aldi", "consum"]
+
+BRANDS = ["Hacendado", "Carrefour", "Dia", "Coosur", "Carbonell", "Koipe", "La Española", "Oleoestepa", "Borges",
+          "Ybarra", "Puleva", "Pascual", "Central Lechera Asturiana", "Kaiku", "Lauki", "Covap", "Celta", "Nestlé",
+          "Eroski", "Alcampo", "Dcoop", "Hojiblanca", "Capicua", "Bomilk", "El Corte Inglés", "Maeva", "La Masía"]
+
+PRODUCT_TEMPLATES = {
+    "aceite-de-oliva": [
+        "Aceite de oliva virgen extra {brand} {volume} l",
+        "Aceite de oliva virgen {brand} botella {volume} litros",
+        "Aceite de oliva intenso {brand} {volume} l",
+        "Aceite de oliva suave {brand} garrafa {volume} l",
+        "Aceite de oliva virgen extra ecológico {brand} {ml} ml",
+    ],
+    "aceite-de-girasol": [
+        "Aceite de girasol {brand} {volume} l",
+        "Aceite de girasol alto oleico para freír {brand} {volume} l",
+        "Aceite refinado de girasol {brand} botella {volume} litros",
+    ],
+    "leche": [
+        "Leche semidesnatada {brand} {units} x {volume} l",
+        "Leche entera {brand} brik {volume} l",
+        "Leche desnatada con calcio {brand} pack {units} uds. x {volume} l",
+        "Leche semidesnatada sin lactosa {brand} {units} briks de {volume} l",
+        "Leche de cabra entera {brand} {volume} l",
+        "Leche entera fresca {brand} botella {ml} ml",
+        "Leche condensada {brand} {grams} g",
+    ],
+}
+
+
+def _page(title, body):
+    return (f"<!DOCTYPE html><html lang=\"es\"><head><meta charset=\"utf-8\"><title>{title}</title></head>"
+            f"<body><nav class=\"navbar\"><a href=\"/\">FACUA</a></nav><div class=\"container\">{body}</div></body></html>")
+
+
+def _card(href, text):
+    return f'<div class="col mb-5"><div class="{CARD_CLASS}"><a href="{href}"><img src="/img.png"></a><p>{text}</p></div></div>'
+
+
+class SyntheticSite:
+    """
+    Deterministic synthetic copy of the FACUA site structure.
+
+    Parameters:
+    ----------
+    supermarkets : int
+        Number of supermarkets listed on the main page.
+    products : int
+        Number of products listed in each category of each supermarket.
+    days : int
+        Number of days of price history in each product table.
+    seed : int
+        Seed of the generated names and prices.
+    """
+
+    def __init__(self, supermarkets=3, products=20, days=365, seed=0):
+        self.supermarkets = SUPERMARKETS[:supermarkets]
+        self.products = products
+        self.days = days
+        self.seed = seed
+
+    def _random(self, *key):
+        return random.Random(f"{self.seed}/" + "/".join(key))
+
+    def product_name(self, category, index):
+        rng = self._random(category, str(index))
+        template = rng.choice(PRODUCT_TEMPLATES[category])
+        return template.format(brand=rng.choice(BRANDS), volume=rng.choice(["1", "0,75", "1,5", "2", "5"]),
+                               ml=rng.choice(["250", "500", "750"]), units=rng.choice(["4", "6", "12"]),
+                               grams=rng.choice(["370", "450", "1000"]))
+
+    def render(self, path, base_url):
+        parts = [part for part in path.split("?")[0].split("/") if part]
+
+        if not parts:
+            cards = "".join(_card(f"{base_url}/{supermarket}/", supermarket.replace("-", " ").title())
+                            for supermarket in self.supermarkets)
+            return _page("Supermercados", f'<div class="row">{cards}</div>')
+
+        if parts[0] not in self.supermarkets or len(parts) > 3:
+            return None
+
+        if len(parts) == 1:
+            cards = "".join(_card(f"{base_url}/{parts[0]}/{category}/", category.replace("-", " ").capitalize())
+                            for category in PRODUCT_TEMPLATES)
+            return _page(parts[0], f'<div class="row">{cards}</div>')
+
+        category = parts[1]
+        if category not in PRODUCT_TEMPLATES:
+            return None
+
+        if len(parts) == 2:
+            # a first grid of featured products precedes the full listing, as on the real site
+            featured = "".join(_card(f"{base_url}/{parts[0]}/{category}/producto-{index}/", self.product_name(category, index))
+                               for index in range(min(4, self.products)))
+            cards = "".join(_card(f"{base_url}/{parts[0]}/{category}/producto-{index}/", self.product_name(category, index))
+                            for index in range(self.products))
+            return _page(category, f'<div class="{PRODUCT_GRID_CLASS}">{featured}</div>'
+                                   f'<div class="{PRODUCT_GRID_CLASS}">{cards}</div>')
+
+        try:
+            index = int(parts[2].rsplit("-", 1)[-1])
+        except ValueError:
+            return None
+        if index >= self.products:
+            return None
+
+        rng = self._random(parts[0], category, str(index), "prices")
+        price = rng.uniform(0.8, 12)
+        rows = []
+        today = date.today()
+        for day in range(self.days):
+            price = max(0.5, price * rng.uniform(0.98, 1.02))
+            rows.append(f"<tr><td>{(today - timedelta(days=day)).strftime('%d/%m/%Y')}</td>"
+                        f"<td>{price:.2f}".replace(".", ",") + "</td><td></td></tr>")
+        table = (f'<table class="{PRICE_TABLE_CLASS}"><thead><tr><th>Fecha</th><th>Precio</th><th>Variación</th></tr></thead>'
+                 f'<tbody>{"".join(rows)}</tbody></table>')
+        return _page("Precios", f"<h2>Tabla de precios por día para {self.product_name(category, index)}</h2>{table}")
+
+
+class RecordedSite:
+    """
+    Replays pages recorded in the on-disk HTTP cache, rewriting FACUA links to the local server.
+
+    Parameters:
+    ----------
+    cache_dir : str
+        Directory of the HTTP cache filled by data_etl.py.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._index = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+
+    def render(self, path, base_url):
+        url = FACUA_URL + path
+        with self._lock:
+            keys = [hashlib.sha256(candidate.encode("utf-8")).hexdigest()
+                    for candidate in (url, url.rstrip("/"), url.rstrip("/") + "/")]
+            row = self._index.execute(
+                f"SELECT key FROM entries WHERE key IN ({', '.join('?' * len(keys))})", keys
+            ).fetchone()
+        if not row:
+            return None
+        with gzip.open(os.path.join(self.cache_dir, "bodies", row[0][:2], f"{row[0]}.html.gz"), "rt", encoding="utf-8") as f:
+            return f.read().replace(FACUA_URL, base_url)
+
+
+class FacuaStubServer:
+    """
+    Threaded HTTP server serving a synthetic or recorded FACUA site.
+
+    Parameters:
+    ----------
+    site : SyntheticSite or RecordedSite
+        Source of the pages.
+    host : str
+        Interface to listen on.
+    port : int
+        Port to listen on, 0 picks a free one.
+    latency : float
+        Mean added latency per request, in seconds.
+    jitter : float
+        Maximum random deviation from the mean latency, in seconds.
+    error_rate : float
+        Probability of answering a request with a 503 error.
+    """
+
+    def __init__(self, site, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        self.site = site
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timings = []
+        self.counters = {"requests": 0, "errors": 0, "not_modified": 0, "not_found": 0, "bytes": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                start = time.perf_counter()
+                stub._respond(self)
+                with stub._lock:
+                    stub.timings.append(time.perf_counter() - start)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_port}"
+        self._thread = None
+
+    def _respond(self, handler):
+        with self._lock:
+            self.counters["requests"] += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.error_rate
+        time.sleep(delay)
+
+        if fail:
+            with self._lock:
+                self.counters["errors"] += 1
+            self._send(handler, 503, b"Service Unavailable", {"Retry-After": "1"})
+            return
+
+        content = self.site.render(handler.path, self.url)
+        if content is None:
+            with self._lock:
+                self.counters["not_found"] += 1
+            self._send(handler, 404, b"Not Found")
+            return
+
+        body = content.encode("utf-8")
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if handler.headers.get("If-None-Match") == etag:
+            with self._lock:
+                self.counters["not_modified"] += 1
+            self._send(handler, 304, b"", {"ETag": etag})
+            return
+
+        if "gzip" in handler.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            headers = {"Content-Encoding": "gzip", "ETag": etag}
+        else:
+            headers = {"ETag": etag}
+        with self._lock:
+            self.counters["bytes"] += len(body)
+        self._send(handler, 200, body, headers)
+
+    @staticmethod
+    def _send(handler, status, body, headers=None):
+        handler.send_response(status)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        if status != 304:
+            handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        if status != 304:
+            handler.wfile.write(body)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="facua-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def build_server(args):
+    if args.from_cache:
+        site = RecordedSite(args.from_cache)
+    else:
+        site = SyntheticSite(supermarkets=args.supermarkets, products=args.products, days=args.days, seed=args.seed)
+    return FacuaStubServer(site, port=args.port, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, seed=args.seed)
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--port", type=int, default=0, help="port to listen on (default: a free one)")
+    parser.add_argument("--supermarkets", type=int, default=3, help="number of synthetic supermarkets")
+    parser.add_argument("--products", type=int, default=20, help="synthetic products per category and supermarket")
+    parser.add_argument("--days", type=int, default=365, help="days of price history per product")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean added latency per request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="maximum deviation from the mean latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 503 response")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic site and of the injected errors")
+    parser.add_argument("--from-cache", help="replay pages recorded in this HTTP cache directory instead")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of super.facua.org.")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = build_server(args)
+    print(f"Serving FACUA stand-in on {server.url}/ (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
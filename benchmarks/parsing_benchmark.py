@@ -0,0 +1,118 @@
+"""
+Compares the HTML parser backends on saved FACUA pages.
+
+Pages are read either from a directory of .html files or from the on-disk HTTP cache
+filled by data_etl.py. Every backend is checked against the original full-tree
+BeautifulSoup parsing before its timings are reported.
+
+Usage (from the repository root):
+    python benchmarks/parsing_benchmark.py                      # pages from data/cache/http
+    python benchmarks/parsing_benchmark.py --pages saved_pages/ --repeat 5
+"""
+import argparse
+import glob
+import gzip
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from support.html_parsing_support import BACKENDS, CARD_CLASS, PRODUCT_GRID_CLASS, PRICE_TABLE_CLASS
+from support.http_cache_support import DEFAULT_CACHE_DIR
+
+
+# reference implementation: the full-tree parsing used before the backends existed
+def _cards_links_full(content):
+    soup = BeautifulSoup(content, "html.parser")
+    return [card.find("a")["href"] for card in soup.find_all("div", {"class": CARD_CLASS})]
+
+def _product_cards_full(content):
+    soup = BeautifulSoup(content, "html.parser")
+    product_cards = soup.find_all("div", {"class", PRODUCT_GRID_CLASS})[-1].find_all("div", {"class": CARD_CLASS})
+    return [card.find("p").text.strip() for card in product_cards], [card.find("a")["href"] for card in product_cards]
+
+def _product_page_full(content):
+    soup = BeautifulSoup(content, "html.parser")
+    table = soup.find("table", {"class": PRICE_TABLE_CLASS})
+    if not table:
+        return None
+    table_head_list = [element.text.strip() for element in table.find("thead").find_all("th")][:2]
+    table_body_list = [[element.text.strip().replace(",", ".") for element in row.find_all("td")][:2]
+                       for row in table.find("tbody").find_all("tr")]
+    return table_head_list, table_body_list, soup.find("h2").text.strip()
+
+REFERENCE = {"cards": _cards_links_full, "products": _product_cards_full, "page": _product_page_full}
+
+
+def load_pages(pages_dir=None, cache_dir=DEFAULT_CACHE_DIR):
+    if pages_dir:
+        paths = glob.glob(os.path.join(pages_dir, "**", "*.htm*"), recursive=True)
+        opener = open
+    else:
+        paths = glob.glob(os.path.join(cache_dir, "bodies", "*", "*.html.gz"))
+        opener = gzip.open
+    pages = []
+    for path in sorted(paths):
+        with opener(path, "rt", encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+
+def page_kind(content):
+    if PRICE_TABLE_CLASS in content:
+        return "page"
+    if PRODUCT_GRID_CLASS in content:
+        return "products"
+    return "cards"
+
+
+def run_benchmark(pages, repeat=3):
+    by_kind = {}
+    for content in pages:
+        by_kind.setdefault(page_kind(content), []).append(content)
+
+    results = []
+    for kind, kind_pages in sorted(by_kind.items()):
+        expected = [REFERENCE[kind](content) for content in kind_pages]
+        candidates = {"html.parser (full tree)": REFERENCE[kind]}
+        candidates.update({name: functions[kind] for name, functions in BACKENDS.items()})
+
+        for name, parse in candidates.items():
+            matches = [parse(content) for content in kind_pages] == expected
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for content in kind_pages:
+                    parse(content)
+            elapsed = (time.perf_counter() - start) / repeat
+            results.append({
+                "kind": kind, "backend": name, "pages": len(kind_pages),
+                "ms_per_page": 1000 * elapsed / len(kind_pages),
+                "pages_per_second": len(kind_pages) / elapsed if elapsed else float("inf"),
+                "matches_reference": matches
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HTML parser backends on saved pages.")
+    parser.add_argument("--pages", help="directory with saved .html pages (default: the HTTP cache)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="HTTP cache directory to read pages from")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed passes over the pages")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages, args.cache_dir)
+    if not pages:
+        print("No saved pages found.")
+        return
+
+    print(f"{'page kind':<10} {'backend':<24} {'pages':>6} {'ms/page':>9} {'pages/s':>9}  matches")
+    for result in run_benchmark(pages, args.repeat):
+        print(f"{result['kind']:<10} {result['backend']:<24} {result['pages']:>6} {result['ms_per_page']:>9.3f} "
+              f"{result['pages_per_second']:>9.1f}  {result['matches_reference']}")
+
+
+if __name__ == "__main__":
+    main()
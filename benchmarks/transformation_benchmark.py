@@ -0,0 +1,325 @@
+"""
+Benchmarks the product name transformations: extract_brand, extract_quantity_from_product_name,
+extract_distinction_eco, extract_subcategory, get_product_info and parse_date, with their
+columnar versions.
+
+The columnar get_products_info is timed on the distinct names of the corpus, and on a catalogue
+repeating each of them on the rows of its price table, where each product is transformed once.
+
+Names come from a checked-in corpus (benchmarks/corpus/product_names.csv) holding the product
+names shown in the notebooks and names built from the brands, keywords and quantity formats
+found there. Before timing anything, every function is checked against a correctness oracle
+(benchmarks/corpus/transformation_oracle.jsonl) with the attributes the names must get, so a
+speed-up that changes an extracted attribute fails the run. Throughput and allocations are
+compared with a baseline saved on the same machine.
+
+Usage (from the repository root):
+    python benchmarks/transformation_benchmark.py                      # check the oracle, time, compare
+    python benchmarks/transformation_benchmark.py --save-baseline      # record this run as the baseline
+    python benchmarks/transformation_benchmark.py --update-oracle      # after an intended rule change
+    python benchmarks/transformation_benchmark.py --build-corpus       # regenerate the corpus
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import sys
+import timeit
+import tracemalloc
+from datetime import date, timedelta
+
+import pandas as pd
+from unidecode import unidecode
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from support.data_transformation_support import (
+    BRANDS, configure_attribute_cache, extract_brand, extract_brands, extract_distinction_eco,
+    extract_quantity_from_product_name, extract_subcategory, get_product_info, get_products_info,
+    parse_date, parse_dates, sanitize_filename
+)
+from support.metrics_support import DEFAULT_METRICS_DIR
+
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+CORPUS_PATH = os.path.join(CORPUS_DIR, "product_names.csv")
+ORACLE_PATH = os.path.join(CORPUS_DIR, "transformation_oracle.jsonl")
+# timings depend on the machine, so the baseline is kept with the local metrics
+BASELINE_PATH = os.path.join(DEFAULT_METRICS_DIR, "transformation_baseline.json")
+
+DATES = [date(2019, 1, 1) + timedelta(days=day) for day in range(6 * 365)]
+
+# price rows of each product in the catalogue case, a month of daily prices
+ROWS_PER_PRODUCT = 30
+
+
+# names as they appear in the notebooks, scraped from super.facua.org
+NOTEBOOK_NAMES = [
+    ("aceite_de_girasol", "mercadona", "Aceite De Girasol Refinado 0,2º Hacendado 1 L."),
+    ("aceite_de_girasol", "mercadona", "Aceite De Girasol Refinado 0,2º Hacendado 5 L."),
+    ("aceite_de_girasol", "carrefour", "Aceite de girasol Capicua garrafa 5 l."),
+    ("aceite_de_girasol", "carrefour", "Aceite de girasol Carrefour Classic' 1 l."),
+    ("aceite_de_girasol", "carrefour", "Aceite de girasol Carrefour garrafa 5 l."),
+    ("aceite_de_oliva", "mercadona", "Aceite De Oliva 0,4º Hacendado 1 L."),
+    ("aceite_de_oliva", "mercadona", "Aceite De Oliva 1º Hacendado 1 L."),
+    ("aceite_de_oliva", "mercadona", "Aceite De Oliva Intenso Hacendado 3 L."),
+    ("aceite_de_oliva", "mercadona", "Aceite De Oliva Suave Hacendado 3 L."),
+    ("aceite_de_oliva", "mercadona", "Aceite De Oliva Virgen Extra Hacendado 0.2 L."),
+    ("aceite_de_oliva", "alcampo", "Ybarra aceite de oliva virgen extra garrafa 5 l"),
+    ("leche", "mercadona", "Leche +Proteínas Desnatada Hacendado 6 L."),
+    ("leche", "mercadona", "Leche Desnatada Calcio Hacendado 6 L."),
+    ("leche", "mercadona", "Leche Desnatada Hacendado 1 L."),
+    ("leche", "mercadona", "Leche Desnatada Hacendado 1.5 L."),
+    ("leche", "mercadona", "Leche Desnatada Hacendado 6 L."),
+]
+
+# quantity formats found in the names of each category (transformation notebook, section 2.2)
+QUANTITY_FORMATS = {
+    "aceite_de_oliva": ["1 l", "3 l", "0.2 l", "0.75 l", "0.5 l", "5 l", "750 ml", "250 ml", "500 ml", "10 ml",
+                        "200 ml", "2,5 l", "50 cl", "75 cl", "300 ml", "400 ml", "25 cl", "150 ml", "1 litro",
+                        "3 litros", "5 litros", "20 cl", "20 ml", "20cl", "2 l", "280 ml", "100 ml", "4 l", "1l"],
+    "aceite_de_girasol": ["1 l", "5 l", "3 l", "150 ml", "50 ml", "1 litro", "5 litros", "3 litros", "200 ml"],
+    "leche": ["6 l", "1 l", "1.5 l", "9 l", "1.2 l", "250ml", "450 g", "210 g", "387 g", "370 g", "740 g",
+              "400 ml", "500 ml", "800 g", "1200 g", "200 ml", "1,5l", "9 x 1l", "6 x 200 ml", "750 ml", "525 g",
+              "10 x 7,5 g", "2 x 210 g", "2 x 160 g", "265 ml", "4 x 120 g", "6 x 100 g", "14 x 100 g", "270 ml",
+              "2,2 l", "50 cl", "400 g", "6x200 ml", "3x210 g", "10x7,5 g", "6x188ml", "3x200 ml", "6 x 1 l",
+              "2.2 l", "6 x 1.5 l", "6 x 2.2 l", "3 x 200 ml", "6 x 188 ml", "600 g", "1,5 ml", "500 g",
+              "188 ml", "20cl.", "2 l", "6x1 l", "6x 1 l", "6 x 1l", "4 x 1.5 l", "6 x 500 ml", "1.5l", "1l",
+              "6x 1l", "1 litro", "1,5 litros", "6 unidades de 1 l", "6 uds. x 1 l", "6 briks de 1 l"],
+}
+
+DESCRIPTORS = {
+    "aceite_de_oliva": ["virgen extra", "virgen", "intenso", "suave", "0,4º", "1º", "virgen extra arbequina",
+                        "virgen extra picual", "virgen extra ecológico", "virgen extra eco", "virgen extra hojiblanca",
+                        "de orujo", ""],
+    "aceite_de_girasol": ["refinado 0,2º", "alto oleico", "para freír", "especial freir", "ecológico", "", ""],
+    "leche": ["entera", "semidesnatada", "desnatada", "semidesnatada sin lactosa", "desnatada calcio",
+              "entera fresca", "+proteínas desnatada", "de cabra entera", "de cabra semidesnatada",
+              "de vaca entera", "condensada", "evaporada", "entera ecológica", "semidesnatada eco",
+              "sin lactosa", "desnatada 0% mg"],
+}
+
+CONTAINERS = ["botella", "garrafa", "botella de", "brik", "pack", "lata", "bidón", "spray", "pet", "", "", ""]
+
+SUPERMARKETS = ["mercadona", "carrefour", "dia", "alcampo", "eroski", "hipercor"]
+
+NOT_OILS = ["Atún claro en aceite de oliva {brand} pack 3 x 80 g", "Sardinas con aceite de oliva {brand} lata 120 g"]
+
+
+# function to generate the corpus: the notebook names plus names built from their parts
+def build_corpus(names_per_category=300, seed=2024):
+    rng = random.Random(seed)
+    brands = [brand.title() for brand in BRANDS] + ["La Española", "Central Lechera Asturiana", "Kaiku Sin Lactosa"]
+    rows = list(NOTEBOOK_NAMES)
+    for category, formats in QUANTITY_FORMATS.items():
+        label = category.replace("_", " ")
+        for _ in range(names_per_category - sum(1 for row in NOTEBOOK_NAMES if row[0] == category)):
+            brand = rng.choice(brands + [""])
+            parts = [rng.choice(DESCRIPTORS[category]), brand, rng.choice(CONTAINERS), rng.choice(formats)]
+            if category == "aceite_de_oliva" and rng.random() < 0.02:
+                name = rng.choice(NOT_OILS).format(brand=brand)
+            elif rng.random() < 0.25:
+                # brand first, as in 'Ybarra aceite de oliva virgen extra garrafa 5 l'
+                name = " ".join([brand, label] + parts[:1] + parts[2:])
+            else:
+                name = " ".join([label] + parts)
+            name = re.sub(r"\s+", " ", name).strip()
+            style = rng.random()
+            name = name.title() if style < 0.4 else name.upper() if style < 0.45 else name[:1].upper() + name[1:]
+            if rng.random() < 0.5:
+                name += "."
+            rows.append((category, rng.choice(SUPERMARKETS), name))
+
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    with open(CORPUS_PATH, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["category", "supermarket", "product_name"])
+        writer.writerows(rows)
+    return len(rows)
+
+
+def load_corpus():
+    with open(CORPUS_PATH, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        slug = re.sub(r"[^a-z0-9]+", "-", unidecode(row["product_name"].lower())).strip("-")
+        row["link"] = f"https://super.facua.org/{row['supermarket']}/{row['category'].replace('_', '-')}/{slug}/"
+        # the name as get_product_info hands it to the extraction functions
+        row["clean_name"] = sanitize_filename(unidecode(row["product_name"].lower()))
+    return rows
+
+
+# functions checked by the oracle, as (name, function returning the result for a corpus row)
+ORACLE_FUNCTIONS = [
+    ("extract_brand", lambda row: extract_brand(row["clean_name"])),
+    ("extract_quantity_from_product_name", lambda row: extract_quantity_from_product_name(row["clean_name"], row["category"])),
+    ("extract_distinction_eco", lambda row: extract_distinction_eco(row["clean_name"], row["category"])),
+    ("extract_subcategory", lambda row: extract_subcategory(row["clean_name"], row["category"])),
+    ("get_product_info", lambda row: get_product_info(row["link"], row["product_name"])),
+]
+
+
+def _jsonable(value):
+    # tuples become lists, so results compare equal to the ones read back from the oracle
+    return json.loads(json.dumps(value))
+
+
+def compute_oracle(rows):
+    return [{"product_name": row["product_name"], "category": row["category"],
+             **{name: _jsonable(function(row)) for name, function in ORACLE_FUNCTIONS}}
+            for row in rows]
+
+
+def save_oracle(rows):
+    with open(ORACLE_PATH, "w", encoding="utf-8") as f:
+        for entry in compute_oracle(rows):
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def check_oracle(rows, max_examples=3):
+    """
+    Returns the number of mismatches of each function, scalar and columnar, against the oracle.
+    """
+    with open(ORACLE_PATH, encoding="utf-8") as f:
+        expected = [json.loads(line) for line in f]
+    if [(entry["product_name"], entry["category"]) for entry in expected] != [(row["product_name"], row["category"]) for row in rows]:
+        raise SystemExit("The oracle does not match the corpus: run with --update-oracle after --build-corpus.")
+
+    actual = compute_oracle(rows)
+    # columnar versions must give the attributes of their scalar counterparts
+    names = [row["clean_name"] for row in rows]
+    products = pd.DataFrame({"link": [row["link"] for row in rows], "product_name": [row["product_name"] for row in rows]})
+    columnar = {
+        "extract_brands": (extract_brands(names), "extract_brand"),
+        "get_products_info": ([list(info) for info in get_products_info(products).itertuples(index=False)], "get_product_info"),
+    }
+    for name, (values, scalar_name) in columnar.items():
+        for entry, value in zip(actual, values):
+            entry[name] = _jsonable(value)
+        for entry in expected:
+            entry[name] = entry[scalar_name]
+
+    mismatches = {}
+    for name in [name for name, _ in ORACLE_FUNCTIONS] + list(columnar):
+        wrong = [(entry["product_name"], entry[name], result[name])
+                 for entry, result in zip(expected, actual) if entry[name] != result[name]]
+        mismatches[name] = len(wrong)
+        for product_name, expected_value, value in wrong[:max_examples]:
+            print(f"  {name}({product_name!r}): expected {expected_value}, got {value}")
+
+    date_strs = [day.strftime("%d/%m/%Y") for day in DATES]
+    mismatches["parse_date"] = sum(parse_date(date_str) != day for date_str, day in zip(date_strs, DATES))
+    mismatches["parse_dates"] = sum(parsed != day for parsed, day in zip(parse_dates(date_strs).date, DATES))
+    return mismatches
+
+
+# benchmark cases, as (name, function, argument tuples, items processed per pass)
+def benchmark_cases(rows):
+    names = [row["clean_name"] for row in rows]
+    products = pd.DataFrame({"link": [row["link"] for row in rows], "product_name": [row["product_name"] for row in rows]})
+    # extracted price tables repeat the link and name of each product on all its rows
+    catalogue = products.loc[products.index.repeat(ROWS_PER_PRODUCT)].reset_index(drop=True)
+    date_strs = [day.strftime("%d/%m/%Y") for day in DATES]
+    scalar = [(name, lambda function=function: [function(row) for row in rows], len(rows)) for name, function in ORACLE_FUNCTIONS]
+    return scalar + [
+        ("parse_date", lambda: [parse_date(date_str) for date_str in date_strs], len(date_strs)),
+        ("extract_brands (columnar)", lambda: extract_brands(names), len(rows)),
+        ("get_products_info (columnar)", lambda: get_products_info(products), len(rows)),
+        (f"get_products_info ({ROWS_PER_PRODUCT} rows/product)", lambda: get_products_info(catalogue), len(catalogue)),
+        ("parse_dates (columnar)", lambda: parse_dates(date_strs), len(date_strs)),
+    ]
+
+
+def measure(run, items, repeat=5):
+    """
+    Returns the best throughput over `repeat` timings, and the memory allocated by one pass.
+    """
+    # each timing runs enough passes to last 0.2 seconds, which the warm-up also covers
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    tracemalloc.start()
+    try:
+        snapshot_before = tracemalloc.take_snapshot()
+        result = run()
+        snapshot_after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    allocations = sum(max(stat.count_diff, 0) for stat in snapshot_after.compare_to(snapshot_before, "lineno"))
+    return {
+        "items": items,
+        "items_per_second": items / best if best else float("inf"),
+        "us_per_item": 1e6 * best / items,
+        "peak_kib": peak / 1024,
+        "blocks_per_item": allocations / items,
+    }
+
+
+def run_benchmark(rows, repeat=5):
+    return {name: measure(run, items, repeat) for name, run, items in benchmark_cases(rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the product name transformations on the checked-in corpus.")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed passes over the corpus")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="JSON file of the baseline timings")
+    parser.add_argument("--save-baseline", action="store_true", help="save this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with an error on a slowdown beyond the tolerance")
+    parser.add_argument("--update-oracle", action="store_true", help="store the current results as the expected ones")
+    parser.add_argument("--build-corpus", action="store_true", help="regenerate the corpus of product names")
+    args = parser.parse_args()
+
+    # every call must derive the attributes, not read them from the memoized ones
+    configure_attribute_cache(enabled=False)
+
+    if args.build_corpus:
+        print(f"Corpus rebuilt with {build_corpus()} product names.")
+    rows = load_corpus()
+    if args.update_oracle or not os.path.exists(ORACLE_PATH):
+        save_oracle(rows)
+        print(f"Oracle saved to {ORACLE_PATH}")
+
+    print(f"Checking {len(rows)} product names against the oracle")
+    mismatches = check_oracle(rows)
+    if any(mismatches.values()):
+        print(f"Results differ from the oracle: {', '.join(f'{name}: {count}' for name, count in mismatches.items() if count)}")
+        sys.exit(1)
+
+    results = run_benchmark(rows, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    regressions = []
+    print(f"{'function':<36} {'items':>6} {'items/s':>11} {'us/item':>9} {'peak KiB':>9} {'blocks/item':>11} {'vs baseline':>11}")
+    for name, result in results.items():
+        comparison = ""
+        if name in baseline:
+            ratio = result["items_per_second"] / baseline[name]["items_per_second"]
+            comparison = f"{ratio:.2f}x"
+            if ratio < 1 / (1 + args.tolerance):
+                regressions.append(name)
+                comparison += " slower"
+        print(f"{name:<36} {result['items']:>6} {result['items_per_second']:>11.0f} {result['us_per_item']:>9.2f} "
+              f"{result['peak_kib']:>9.1f} {result['blocks_per_item']:>11.2f} {comparison:>11}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if regressions:
+        print(f"Slower than the baseline: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import pandas as pd
+import os
+import glob
+import numpy as np
+import time
+import argparse
+
+from psycopg2 import errors
+from tqdm import tqdm
+
+from data_etl import database_credentials, init_transform_worker, load_product_pages, print_stage_summary
+from data_etl import transform_product_page_measured
+
+from support.html_parsing_support import get_parser_backend, set_parser_backend
+from support.http_cache_support import HTTPCache, DEFAULT_CACHE_DIR
+from support.crawl_frontier_support import CrawlFrontier, DEFAULT_FRONTIER_PATH
+from support.pipeline_support import Pipeline
+from support.metrics_support import get_metrics, collect_metrics, labels_from_url, DEFAULT_METRICS_DIR
+
+from support.data_transformation_support import get_product_info, create_table_df_from_columns, parse_dates
+from support.data_transformation_support import configure_attribute_cache, close_attribute_cache
+
+from support.data_load_support import drop_all_tables, create_all_tables, get_crawl_state, EXTRACTED_DIR, CSV_NAME
+from support.data_load_support import TableAccumulator, OUTPUT_FORMATS, default_output_format
+from support.data_load_support import get_price_load_stats, reset_price_load_stats
+from support.parquet_dataset_support import DATASET_NAME, parquet_available, read_price_dataset
+from support.dimension_cache_support import configure_dimension_cache
+from support.unit_of_work_support import UnitOfWork
+from support.database_connection_support import connect_to_database
+
+SOURCES = ("extracted", "pages")
+
+
+# function to read every extracted price: the Parquet dataset, else the consolidated CSV, else the per-product CSVs
+def read_extracted_prices(output_dir=EXTRACTED_DIR):
+    dataset_path = os.path.join(output_dir, DATASET_NAME)
+    if parquet_available() and os.path.isdir(dataset_path):
+        return read_price_dataset(dataset_path)
+
+    consolidated_path = os.path.join(output_dir, CSV_NAME)
+    paths = [consolidated_path] if os.path.exists(consolidated_path) else sorted(glob.glob(os.path.join(output_dir, "*", "*", "*.csv")))
+    tables = []
+    for path in paths:
+        try:
+            # keep empty distinctions as empty strings, as they were extracted
+            tables.append(pd.read_csv(path, keep_default_na=False))
+        except pd.errors.EmptyDataError:
+            continue
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+# function to split the extracted prices by product, as (link, product name, table header, dates, prices) items
+def iter_extracted_products(df):
+    if df.empty:
+        return
+    date_column, price_column = df.columns[:2]
+    if pd.api.types.infer_dtype(df[date_column], skipna=True) == "string":
+        # 'dd/mm/yyyy' strings of the CSV files
+        dates = np.asarray(parse_dates(df[date_column].tolist()), dtype="datetime64[ns]")
+    else:
+        dates = df[date_column].to_numpy(dtype="datetime64[ns]")
+    prices = df[price_column].to_numpy()
+    if prices.dtype == np.float32:
+        # float32 prices of the Parquet dataset, back to the decimals they were scraped with
+        prices = prices.astype(str).astype(np.float64)
+
+    products = df.groupby(["url", "product_name"], sort=False, observed=True).indices
+    for (link, product_name), rows in products.items():
+        yield link, product_name, [date_column, price_column], dates[rows], prices[rows]
+
+# function to derive the product information and the price table of an extracted product again, in a worker process
+def retransform_extracted_product(link, product_name, table_head_list, dates, prices):
+    with collect_metrics() as metrics:
+        labels = labels_from_url(link)
+        with metrics.timer("get_product_info", **labels):
+            product_info = get_product_info(link, product_name)
+        with metrics.timer("create_table_df", **labels):
+            dates = pd.DatetimeIndex(dates)
+            table_df = create_table_df_from_columns(table_head_list, dates, prices, *product_info, link)
+        product_page = {
+            "link": link,
+            "content_hash": None,
+            "product_info": product_info,
+            "prices": list(zip(dates.date, prices.tolist())),
+            "table_df": table_df
+        }
+    return product_page, metrics.snapshot()
+
+# Main function
+def main(database="comparativa_supermercados", output_dir=EXTRACTED_DIR, source="extracted",
+         cache_dir=DEFAULT_CACHE_DIR, frontier_path=DEFAULT_FRONTIER_PATH, workers=None, batch_size=200,
+         parser_backend=None, attribute_cache_path=None, output_format=None, metrics_dir=DEFAULT_METRICS_DIR,
+         commit_every=1000, commit_interval=5.0):
+    if source not in SOURCES:
+        raise ValueError(f"Unknown backfill source {source!r}, expected one of {SOURCES}")
+
+    # Read what is re-transformed before touching the database, so a missing source loses nothing
+    cache = None
+    if source == "extracted":
+        extracted_df = read_extracted_prices(output_dir)
+        items = iter_extracted_products(extracted_df)
+        fetch_item, skip = (lambda item: item), (lambda item: False)
+        transform = retransform_extracted_product
+        print(f"Backfilling {len(extracted_df)} extracted prices from {output_dir}")
+        if extracted_df.empty:
+            print("Nothing to backfill.")
+            return
+    else:
+        frontier = CrawlFrontier(frontier_path)
+        items = frontier.items("product")
+        frontier.close()
+        cache = HTTPCache(cache_dir, offline=True)
+
+        def fetch_item(item):
+            entry = cache.lookup(item.url)
+            return item.url, item.name, entry.content if entry else None
+
+        # pages evicted from the cache are counted, not parsed
+        skip = lambda page: page[2] is None
+        transform = transform_product_page_measured
+        print(f"Backfilling {len(items)} product pages from {cache_dir}")
+        if not items:
+            print("Nothing to backfill.")
+            return
+
+    # Created before the tables are dropped, so a format that cannot be written loses nothing
+    tables = TableAccumulator(output_dir, stream=True, keep=False, output_format=output_format or default_output_format())
+
+    conn = connect_to_database(database, database_credentials)
+    if not conn:
+        print("Failed to connect to database.")
+        return
+
+    # Page hashes of the previous load, so the next incremental crawl still skips the unchanged pages.
+    # Its tables are dropped next, so they are read as they are, without the natural key indexes
+    try:
+        previous_hashes = {link: content_hash for link, (_, content_hash) in get_crawl_state(conn).items()}
+    except (errors.UndefinedTable, errors.UndefinedColumn):
+        conn.rollback()
+        previous_hashes = {}
+    drop_all_tables(conn)
+    create_all_tables(conn)
+    # the tables are empty: every dimension ID is cached as it is inserted
+    dimension_cache = configure_dimension_cache()
+    unit_of_work = UnitOfWork(conn, max_products=commit_every, max_seconds=commit_interval)
+
+    if parser_backend:
+        set_parser_backend(parser_backend)
+    # Without a path the attributes are derived again with the current rules
+    configure_attribute_cache(attribute_cache_path, enabled=attribute_cache_path is not None)
+
+    start_time = time.time()
+    metrics = get_metrics()
+    metrics.reset()
+    reset_price_load_stats()
+    missing_pages = 0
+
+    def load(batch):
+        nonlocal missing_pages
+        product_pages = []
+        for item, result in batch:
+            if result is None:
+                missing_pages += 1
+                continue
+            product_page, product_metrics = result
+            metrics.merge(product_metrics)
+            if product_page:
+                if product_page["content_hash"] is None:
+                    product_page["content_hash"] = previous_hashes.get(product_page["link"])
+                product_pages.append(product_page)
+        load_product_pages(conn, product_pages, output_dir=output_dir, output_format=tables.output_format,
+                           unit_of_work=unit_of_work)
+        for product_page in product_pages:
+            if product_page["link"] not in unit_of_work.failures:
+                tables.add(product_page["table_df"])
+        unit_of_work.maybe_commit()
+
+    # Transform every product on all the cores, loading the results in batches
+    pipeline = Pipeline(fetch_workers=1 if source == "extracted" else 4, transform_workers=workers,
+                        batch_size=batch_size, initializer=init_transform_worker,
+                        initargs=(get_parser_backend(), attribute_cache_path, attribute_cache_path is not None))
+    try:
+        with tqdm(desc="Products") as progress:
+            pipeline.run(items, fetch_item, transform, load, skip=skip, on_progress=progress.update)
+    except BaseException:
+        # keep the previous dataset rather than a partial one
+        tables.abort()
+        raise
+    finally:
+        unit_of_work.close()
+    tables.save()
+
+    elapsed_time = time.time() - start_time
+    print(f"Computation time: {elapsed_time:.2f} seconds")
+    print(f"Backfilled table: {tables.rows} rows, pipeline batches: {pipeline.stats()['batches']}"
+          f"{f', product pages missing from the cache: {missing_pages}' if source == 'pages' else ''}")
+    dataset_stats = tables.dataset_stats()
+    if dataset_stats:
+        print(f"Parquet dataset: {dataset_stats['files']} files, {dataset_stats['bytes'] / 1024 ** 2:.1f} MB written")
+    price_stats = get_price_load_stats()
+    print(f"Prices inserted: {price_stats['inserted']}, duplicates skipped: {price_stats['skipped']}, "
+          f"invalid skipped: {price_stats['invalid']}")
+    unit_of_work_stats = unit_of_work.stats()
+    print(f"Transactions committed: {unit_of_work_stats['commits']}, "
+          f"mean commit latency: {1000 * unit_of_work_stats['mean_commit_seconds']:.2f} ms, "
+          f"products rolled back: {unit_of_work_stats['failed_products']}")
+    for link, error in unit_of_work.failures.items():
+        print(f"  {link}: {error}")
+    dimension_cache_stats = dimension_cache.stats()
+    print(f"Dimension ID cache hits: {dimension_cache_stats['hits']}, misses: {dimension_cache_stats['misses']}")
+    print_stage_summary(metrics)
+    if metrics_dir:
+        json_path, prometheus_path = metrics.export(metrics_dir)
+        print(f"Metrics saved to {json_path} and {prometheus_path}")
+
+    close_attribute_cache()
+    if cache:
+        cache.close()
+    conn.close()
+
+# Run main function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transform the already extracted FACUA prices again with the current rules, and reload them.")
+    parser.add_argument("--source", choices=SOURCES, default="extracted",
+                        help="re-transform the extracted data files, or parse the product pages of the HTTP cache again")
+    parser.add_argument("--database", default="comparativa_supermercados", help="PostgreSQL database to reload")
+    parser.add_argument("--output-dir", default=EXTRACTED_DIR, help="folder of the extracted data, read and written again")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="directory of the on-disk HTTP cache (pages source)")
+    parser.add_argument("--frontier", dest="frontier_path", default=DEFAULT_FRONTIER_PATH, help="SQLite file of the crawl work queue (pages source)")
+    parser.add_argument("--workers", type=int, default=None, help="transformation processes (default: CPUs)")
+    parser.add_argument("--batch-size", type=int, default=200, help="products loaded per database batch")
+    parser.add_argument("--parser", dest="parser_backend", help="HTML parser backend: selectolax, lxml or html.parser")
+    parser.add_argument("--attribute-cache", dest="attribute_cache_path", default=None,
+                        help="SQLite file of memoized product attributes (default: derive them all again)")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default=None,
+                        help="extracted data as a partitioned Parquet dataset or CSV files (default: parquet when pyarrow is installed)")
+    parser.add_argument("--commit-every", type=int, default=1000, help="products loaded per database transaction")
+    parser.add_argument("--commit-interval", type=float, default=5.0, help="seconds after which a database transaction is committed")
+    parser.add_argument("--metrics-dir", default=DEFAULT_METRICS_DIR, help="folder of the JSON and Prometheus metrics of the run")
+    parser.add_argument("--no-metrics", action="store_true", help="do not export the metrics of the run")
+    args = parser.parse_args()
+
+    main(database=args.database, output_dir=args.output_dir, source=args.source, cache_dir=args.cache_dir,
+         frontier_path=args.frontier_path, workers=args.workers, batch_size=args.batch_size,
+         parser_backend=args.parser_backend, attribute_cache_path=args.attribute_cache_path,
+         output_format=args.output_format, metrics_dir=None if args.no_metrics else args.metrics_dir,
+         commit_every=args.commit_every, commit_interval=args.commit_interval)
@@ -0,0 +1,36 @@
+import argparse
+
+from data_etl import database_credentials
+
+from support.data_load_support import merge_duplicate_rows
+from support.database_connection_support import connect_to_database
+
+
+# Main function
+def main(database="comparativa_supermercados", apply=False):
+    conn = connect_to_database(database, database_credentials)
+    if not conn:
+        print("Failed to connect to database.")
+        return
+
+    # Rows of databases loaded before the natural key indexes, merged into the first row of their key
+    merged = merge_duplicate_rows(conn, apply=apply)
+    conn.close()
+
+    if not merged:
+        print("No tables to deduplicate.")
+        return
+    for table, rows in merged.items():
+        print(f"{table:<24} {rows:>9} duplicated rows {'merged' if apply else 'would be merged'}")
+    if not apply:
+        print("Nothing was changed: run again with --apply to merge them and create the unique indexes.")
+    return merged
+
+# Run main function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the rows repeating the natural key of an earlier row, loaded before the unique indexes existed.")
+    parser.add_argument("--database", default="comparativa_supermercados", help="PostgreSQL database to deduplicate")
+    parser.add_argument("--apply", action="store_true", help="merge the rows (default: only report how many would be merged)")
+    args = parser.parse_args()
+
+    main(database=args.database, apply=args.apply)
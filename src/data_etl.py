@@ -1,8 +1,13 @@
-from bs4 import BeautifulSoup
 import pandas as pd
 import os
 import numpy as np
 import time
+import argparse
+import hashlib
+from functools import partial
+from multiprocessing.util import Finalize
+
+import psycopg2
 
 from tqdm import tqdm
 
@@ -15,14 +20,33 @@ database_credentials = {
 
 from unidecode import unidecode
 
-from support.data_extraction_support import fetch, get_supermarkets_links, get_categories_links, get_product_names_links
+from support.data_extraction_support import fetch, get_supermarkets_links, get_categories_links, get_product_names_links, iter_product_pages_from_frontier
+from support.data_extraction_support import expand_frontier_listings, claim_frontier_products
+from support.data_extraction_support import configure_session, get_session_stats, configure_cache, configure_rate_limiter
+from support.async_extraction_support import crawl_product_pages
+from support.html_parsing_support import parse_product_page, set_parser_backend, get_parser_backend
+from support.http_cache_support import DEFAULT_CACHE_DIR
+from support.crawl_frontier_support import CrawlFrontier, DEFAULT_FRONTIER_PATH
+from support.pipeline_support import Pipeline
+from support.metrics_support import get_metrics, metric_labels, labels_from_url, collect_metrics, DEFAULT_METRICS_DIR
+from support.attribute_cache_support import DEFAULT_ATTRIBUTE_CACHE_PATH
 
 from support.data_transformation_support import extract_distinction_eco, extract_subcategory, get_subcategory_distinction
 from support.data_transformation_support import extract_brand, extract_quantity_from_product_name, create_table_df, get_product_info, parse_date
+from support.data_transformation_support import configure_attribute_cache, close_attribute_cache
+from support.data_transformation_support import split_price_rows, parse_dates, parse_prices, create_table_df_from_columns
+from support.data_transformation_support import table_memory_usage
 
 from support.data_load_support import save_to_csv, insert_brand, insert_category, insert_product, insert_subcategory
 from support.data_load_support import insert_supermarket, insert_supermarket_product, insert_price
-from support.data_load_support import connect_to_database, drop_all_tables, create_all_tables
+from support.data_load_support import drop_all_tables, create_all_tables, get_crawl_state, update_content_hash, EXTRACTED_DIR
+from support.data_load_support import get_price_load_stats, reset_price_load_stats
+from support.data_load_support import TableAccumulator, OUTPUT_FORMATS, default_output_format
+from support.dimension_cache_support import configure_dimension_cache
+from support.unit_of_work_support import UnitOfWork
+from support.database_connection_support import connect_to_database
+
+ROOT_URL = "https://super.facua.org/"
 
 
 # function to extract, process and load table data from a product link
@@ -31,88 +55,442 @@ def get_table_from_product_link_etl(conn, link, product_name):
     if not content:
         return pd.DataFrame()
 
-    # Parse HTML
-    product_data_soup = BeautifulSoup(content, "html.parser")
-    table = product_data_soup.find("table", {"class": "table table-striped table-responsive text-center"})
-    if not table:
-        return pd.DataFrame()  
+    return get_table_from_product_page_etl(conn, link, product_name, content)
 
-    # Extract table headers and rows
-    table_head_list = [element.text.strip() for element in table.find("thead").findAll("th")][:2]
-    table_body_list = [[element.text.strip().replace(",",".") for element in row.findAll("td")][:2]
-                       for row in table.find("tbody").findAll("tr")]
-    
-    product_name = product_data_soup.find("h2").text.strip()
+# function to process and load table data from an already fetched product page
+# crawl_state maps product links to their latest stored date and page hash, and enables incremental loading
+def get_table_from_product_page_etl(conn, link, product_name, content, crawl_state=None, output_dir=EXTRACTED_DIR, output_format="csv",
+                                    unit_of_work=None):
+    stored_state = crawl_state.get(link) if crawl_state is not None else None
+    product_page = transform_product_page(link, product_name, content, stored_state)
+    if not product_page:
+        return pd.DataFrame()
+
+    load_product_pages(conn, [product_page], append=crawl_state is not None, output_dir=output_dir, output_format=output_format,
+                       unit_of_work=unit_of_work)
+    return product_page["table_df"]
+
+# function to parse and transform a product page without touching the database, so it can run in a worker process
+# stored_state is the (latest stored date, page hash) of the product, if it was loaded before
+def transform_product_page(link, product_name, content, stored_state=None):
+    # Skip pages that did not change since the last load
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    latest_date, stored_hash = stored_state or (None, None)
+    if stored_hash == content_hash:
+        return None
+
+    # Parse HTML, extracting only the price table headers, rows and the product title
+    metrics = get_metrics()
+    labels = labels_from_url(link)
+    with metrics.timer("parse", **labels) as timer:
+        timer.bytes = len(content)
+        product_page = parse_product_page(content)
+        if not product_page:
+            timer.fail()
+    if not product_page:
+        return None
+
+    table_head_list, table_body_list, title = product_page
+    product_name = title or product_name
+
+    # Transform data for table
+    with metrics.timer("get_product_info", **labels):
+        product_info = get_product_info(link, product_name)
+    with metrics.timer("create_table_df", **labels):
+        # Parse the date and price columns at once
+        dates, prices = split_price_rows(table_body_list)
+        dates, prices = parse_dates(dates), parse_prices(prices)
+
+        # Keep only the prices that are numbers ('nan' or 'inf' are parsed too) and newer than the ones already stored
+        keep = np.isfinite(prices)
+        if latest_date is not None:
+            keep &= dates > pd.Timestamp(latest_date)
+        if not keep.all():
+            dates, prices = dates[keep], prices[keep]
+
+        table_df = create_table_df_from_columns(table_head_list, dates, prices, *product_info, link)
+
+    return {
+        "link": link,
+        "content_hash": content_hash,
+        "product_info": product_info,
+        "prices": list(zip(dates.date, prices.tolist())),
+        "table_df": table_df
+    }
+
+# function to transform a product page in a pipeline worker, sending its metrics back with the result
+def transform_product_page_measured(link, product_name, content, stored_state=None):
+    with collect_metrics() as metrics:
+        product_page = transform_product_page(link, product_name, content, stored_state)
+    return product_page, metrics.snapshot()
+
+# function to set up a pipeline worker process like the main process
+def init_transform_worker(parser_backend, attribute_cache_path, attribute_cache_enabled=True):
+    set_parser_backend(parser_backend)
+    configure_attribute_cache(attribute_cache_path, enabled=attribute_cache_enabled)
+    # pool workers exit without running atexit handlers, but multiprocessing finalizers do run
+    Finalize(None, close_attribute_cache, exitpriority=10)
+
+# function to insert the rows of transformed product pages, their prices at once, and their page hashes
+# returns the loaded (product page, supermarket-product ID) pairs, and the number of prices inserted and of duplicates skipped
+def insert_product_pages(conn, product_pages):
+    loaded_products = []
+    for product_page in product_pages:
+        product_name, brand_name, quantity, volume_weight, units, subcategory, distinction, eco, category_name, supermarket_name = product_page["product_info"]
+
+        product_name_norm = category_name.replace("_"," ") + " " + subcategory + " " + distinction
+
+        if eco:
+            product_name_norm + " eco"
+
+        with metric_labels(supermarket=supermarket_name, category=category_name):
+            # Database insertion
+            brand_id = insert_brand(conn, brand_name)
+            supermarket_id = insert_supermarket(conn, supermarket_name)
+            category_id = insert_category(conn, category_name)
+            subcategory_id = insert_subcategory(conn, subcategory, category_id, distinction, eco)
+            product_id = insert_product(conn, brand_id, subcategory_id, product_name_norm, quantity, units, volume_weight)
+            supermarket_product_id = insert_supermarket_product(conn, supermarket_id, product_id, product_page["link"], product_name)
+        loaded_products.append((product_page, supermarket_product_id))
 
-    # Transform data for table and load into database
-    product_name, brand_name, quantity, volume_weight, units, subcategory, distinction, eco, category_name, supermarket_name = get_product_info(link, product_name)
-    table_df = create_table_df(table_head_list, table_body_list, product_name, brand_name, quantity, volume_weight, units, subcategory, distinction, eco, category_name, supermarket_name, link)
+    price_table_data = [(supermarket_product_id, date, price)
+                        for product_page, supermarket_product_id in loaded_products for date, price in product_page["prices"]]
+    inserted, skipped = insert_price(conn, price_table_data)
 
+    for product_page, supermarket_product_id in loaded_products:
+        update_content_hash(conn, supermarket_product_id, product_page["content_hash"])
+    return loaded_products, inserted, skipped
 
-    product_name_norm = category_name.replace("_"," ") + " " + subcategory + " " + distinction
+# function to load a batch of transformed product pages, inserting their prices at once
+# with the parquet output format the tables only go to the dataset written by TableAccumulator
+# in a unit of work the batch is loaded in a savepoint; if it fails, each product is loaded again in its own
+# savepoint, rows and prices together, and the links of the products that failed are left in its failures
+# returns the number of prices inserted and of duplicates skipped
+def load_product_pages(conn, product_pages, append=False, output_dir=EXTRACTED_DIR, output_format="csv", unit_of_work=None):
+    if unit_of_work is None:
+        loaded_products, inserted, skipped = insert_product_pages(conn, product_pages)
+    else:
+        try:
+            with unit_of_work.savepoint():
+                loaded_products, inserted, skipped = insert_product_pages(conn, product_pages)
+            unit_of_work.loaded(len(loaded_products))
+        except psycopg2.Error:
+            # A bad row: load each product on its own, so only the product it belongs to fails
+            loaded_products, inserted, skipped = [], 0, 0
+            for product_page in product_pages:
+                with unit_of_work.product(product_page["link"]):
+                    product_loaded, product_inserted, product_skipped = insert_product_pages(conn, [product_page])
+                    loaded_products += product_loaded
+                    inserted += product_inserted
+                    skipped += product_skipped
 
-    if eco:
-        product_name_norm + " eco"
+    # Save as CSV, once the rows of the product are stored
+    if output_format == "csv":
+        for product_page, _ in loaded_products:
+            product_info = product_page["product_info"]
+            if not product_page["table_df"].empty:
+                save_to_csv(product_page["table_df"], product_info[9], product_info[8], product_info[0], append=append, output_dir=output_dir)
+    return inserted, skipped
 
-    # Database insertion
-    brand_id = insert_brand(conn, brand_name)
-    supermarket_id = insert_supermarket(conn, supermarket_name)
-    category_id = insert_category(conn, category_name)
-    subcategory_id = insert_subcategory(conn, subcategory, category_id, distinction, eco)
-    product_id = insert_product(conn, brand_id, subcategory_id, product_name_norm, quantity, units, volume_weight)
-    supermarket_product_id = insert_supermarket_product(conn, supermarket_id, product_id, link, product_name)
-    price_table_data = [(supermarket_product_id, parse_date(row[0]), row[1]) for row in table_body_list]
-    insert_price(conn, price_table_data)
+# function to fetch, transform and load product pages as concurrent stages connected by bounded queues
+def run_pipeline(conn, root_url, frontier, crawl_state=None, output_dir=EXTRACTED_DIR, append=False, asynchronous=False,
+                 crawler_kwargs=None, fetch_workers=8, transform_workers=None, batch_size=50, queue_size=64,
+                 attribute_cache_path=None, attribute_cache_enabled=True, tables=None, unit_of_work=None):
+    crawl_state = crawl_state or {}
+    # Price tables of the loaded products, consolidated once by the caller
+    tables = tables if tables is not None else TableAccumulator(output_dir, append=append)
+    # Transactions grouping the loaded products, committed by the caller when given
+    own_unit_of_work = unit_of_work is None
+    unit_of_work = unit_of_work if unit_of_work is not None else UnitOfWork(conn)
 
-    # Save as CSV
-    save_to_csv(table_df, supermarket_name, category_name, product_name)
-    return table_df
+    # Fetch stage: threads sharing the product links, or the asynchronous crawler feeding a single thread
+    if asynchronous:
+        source = crawl_product_pages(root_url, frontier=frontier, **(crawler_kwargs or {}))
+        fetch_workers = 1
+        fetch_page = lambda page: (page[1], page[0], page[2], crawl_state.get(page[1]))
+    else:
+        expand_frontier_listings(frontier, root_url)
+        source = claim_frontier_products(frontier)
+        fetch_page = lambda product: (product[1], product[0], fetch(product[1]), crawl_state.get(product[1]))
+
+    failed_pages = []
+
+    # Load stage: a single writer inserting each batch of transformed pages
+    def load(batch):
+        product_pages = []
+        for (link, product_name, content, stored_state), result in batch:
+            if not content:
+                frontier.mark_failed(link, content.reason)
+                failed_pages.append(content)
+                continue
+            product_page, metrics = result
+            get_metrics().merge(metrics)
+            if product_page:
+                product_pages.append(product_page)
+        load_product_pages(conn, product_pages, append=append, output_dir=output_dir, output_format=tables.output_format,
+                           unit_of_work=unit_of_work)
+
+        for product_page in product_pages:
+            if product_page["link"] not in unit_of_work.failures:
+                tables.add(product_page["table_df"])
+        for (link, product_name, content, stored_state), _ in batch:
+            if not content:
+                continue
+            error = unit_of_work.failures.pop(link, None)
+            if error is not None:
+                frontier.mark_failed(link, error)
+            else:
+                # done once its rows are committed, so a resumed crawl loads it again otherwise
+                unit_of_work.after_commit(partial(frontier.mark_done, link))
+        unit_of_work.maybe_commit()
+
+    pipeline = Pipeline(fetch_workers=fetch_workers, transform_workers=transform_workers, queue_size=queue_size,
+                        batch_size=batch_size, initializer=init_transform_worker,
+                        initargs=(get_parser_backend(), attribute_cache_path, attribute_cache_enabled))
+    with tqdm(desc="Products") as progress:
+        def on_progress(count):
+            progress.update(count)
+            progress.set_postfix(fetched=pipeline.fetched.depth(), transformed=pipeline.transformed.depth())
+
+        # Transform stage: worker processes parsing pages, failed fetches go straight to the writer
+        try:
+            pipeline.run(source, fetch_page, transform_product_page_measured, load,
+                         skip=lambda page: not page[2], on_progress=on_progress)
+        finally:
+            if own_unit_of_work:
+                unit_of_work.close()
+
+    return tables, failed_pages, pipeline.stats()
+
+# function to print the calls, errors and latency of each stage of a run
+def print_stage_summary(metrics):
+    print(f"{'stage':<28} {'calls':>7} {'errors':>6} {'total s':>9} {'mean ms':>9} {'p95 ms':>9} {'MB':>8}")
+    for stage, stage_stats in metrics.summary().items():
+        print(f"{stage:<28} {stage_stats['count']:>7} {stage_stats['errors']:>6} {stage_stats['seconds']:>9.2f} "
+              f"{1000 * stage_stats['mean_seconds']:>9.2f} {1000 * stage_stats['p95_seconds']:>9.2f} "
+              f"{stage_stats['bytes'] / 1024 ** 2:>8.2f}")
 
 # Main function
-def main():
-    conn = connect_to_database("comparativa_supermercados", database_credentials)
+def main(root_url=ROOT_URL, database="comparativa_supermercados", output_dir=EXTRACTED_DIR,
+         asynchronous=False, max_in_flight=32, per_host=8, pool_size=16,
+         cache_dir=DEFAULT_CACHE_DIR, cache_ttl=0, offline=False, incremental=False, parser_backend=None,
+         rate=5.0, max_rate=50.0, frontier_path=DEFAULT_FRONTIER_PATH, resume=False,
+         pipeline=False, fetch_workers=8, transform_workers=None, batch_size=50, metrics_dir=DEFAULT_METRICS_DIR,
+         attribute_cache_path=DEFAULT_ATTRIBUTE_CACHE_PATH, attribute_cache=True, stream_output=False, keep_table=True,
+         output_format=None, dimension_cache=True, commit_every=100, commit_interval=5.0):
+    # Price tables of every product, consolidated once at the end. When streamed they are
+    # appended to the consolidated CSV as they come, and without keep_table memory stays flat.
+    # The parquet format streams them to a dataset partitioned by supermarket and category instead.
+    # Created first, so a format that cannot be written fails before the database is touched.
+    tables = TableAccumulator(output_dir, append=incremental or resume, stream=stream_output, keep=keep_table,
+                              output_format=output_format or default_output_format())
+
+    conn = connect_to_database(database, database_credentials)
     if not conn:
         print("Failed to connect to database.")
         return
     
-    # Create database structure
-    drop_all_tables(conn)
-    create_all_tables(conn)
+    # Work queue of the crawl, kept on disk to resume an interrupted run
+    frontier = CrawlFrontier(frontier_path)
+    if resume:
+        recovered, retried = frontier.recover(), frontier.retry_failed()
+        print(f"Resuming crawl: {recovered} interrupted and {retried} failed URLs queued again.")
+    else:
+        frontier.reset()
+
+    # Create database structure, keeping the stored history when loading incrementally or resuming.
+    # Products loaded before an interruption are then skipped by their content hash and dates.
+    if incremental or resume:
+        create_all_tables(conn)
+        crawl_state = get_crawl_state(conn)
+    else:
+        drop_all_tables(conn)
+        create_all_tables(conn)
+        crawl_state = None
 
-    # Measure elapsed time
+    # IDs of the brands, categories, supermarkets, subcategories and products already stored,
+    # so only new ones are looked up and written
+    dimension_cache = configure_dimension_cache(conn, enabled=dimension_cache)
+    # Load the products in transactions of `commit_every` products or `commit_interval` seconds,
+    # each product in a savepoint so that a failing one does not roll back the others
+    unit_of_work = UnitOfWork(conn, max_products=commit_every, max_seconds=commit_interval)
+
+    if parser_backend:
+        set_parser_backend(parser_backend)
+
+    # Reuse the attributes derived from product names seen in previous runs, unless the rules changed
+    attribute_cache = configure_attribute_cache(attribute_cache_path, enabled=attribute_cache)
+
+    # Share one pooled keep-alive session across every sequential request
+    configure_session(pool_size=pool_size)
+    # Serve unchanged pages from the on-disk cache, or only from it when offline. Pages without
+    # validators are downloaded again unless they are younger than `cache_ttl` seconds
+    cache = configure_cache(cache_dir, ttl=cache_ttl, offline=offline)
+    # Start at `rate` requests per second per host and adapt to the server's responses
+    rate_limiter = configure_rate_limiter(rate=rate, max_rate=max(rate, max_rate))
+
+    # Measure elapsed time, and the time spent in each stage
     start_time = time.time()
-    total_result_df = pd.DataFrame()
-
-    e = 0
-    # Fetch supermarket links
-    supermarket_links = get_supermarkets_links("https://super.facua.org/")
-    for supermarket_link in tqdm(supermarket_links, desc="Supermarkets"):
-
-        # Fetch category links for each supermarket
-        category_links = get_categories_links(supermarket_link)
-        for category_link in tqdm(category_links, desc="Categories", leave=False):
-            
-            # Fetch product names and links for each category
-            product_names, product_links = get_product_names_links(category_link)
-            for product_name, product_link in zip(product_names, product_links):
-  
+    metrics = get_metrics()
+    metrics.reset()
+    reset_price_load_stats()
+
+    # Walk supermarkets, categories and products, either one request at a time or concurrently
+    failed_pages = []
+    pipeline_stats = None
+    crawler_kwargs = {"max_in_flight": max_in_flight, "per_host": per_host, "cache": cache}
+    try:
+        if pipeline:
+            # Fetch, transform and load at the same time, each stage on its own workers
+            _, failed_pages, pipeline_stats = run_pipeline(
+                conn, root_url, frontier, crawl_state, output_dir, append=crawl_state is not None,
+                asynchronous=asynchronous, crawler_kwargs=crawler_kwargs, fetch_workers=fetch_workers,
+                transform_workers=transform_workers, batch_size=batch_size,
+                attribute_cache_path=attribute_cache_path, attribute_cache_enabled=attribute_cache is not None,
+                tables=tables, unit_of_work=unit_of_work
+            )
+        else:
+            if asynchronous:
+                product_pages = crawl_product_pages(root_url, frontier=frontier, **crawler_kwargs)
+            else:
+                product_pages = iter_product_pages_from_frontier(frontier, root_url)
+
+            for product_name, product_link, content in tqdm(product_pages, desc="Products"):
+                if not content:
+                    frontier.mark_failed(product_link, content.reason)
+                    failed_pages.append(content)
+                    continue
+
                 # Extract table and process data for each product
-                df = get_table_from_product_link_etl(conn, product_link, product_name)
-                if not df.empty:
-                    total_result_df = pd.concat([total_result_df, df])
-                e += 1
+                df = get_table_from_product_page_etl(conn, product_link, product_name, content, crawl_state, output_dir,
+                                                     tables.output_format, unit_of_work)
+                error = unit_of_work.failures.pop(product_link, None)
+                if error is not None:
+                    frontier.mark_failed(product_link, error)
+                    continue
+                tables.add(df)
+                unit_of_work.after_commit(partial(frontier.mark_done, product_link))
+                unit_of_work.maybe_commit()
+    except BaseException:
+        # keep the previous dataset rather than a partial one
+        tables.abort()
+        raise
+    finally:
+        # Commit the products loaded so far and save the progress of the crawl, also when it is interrupted
+        try:
+            unit_of_work.close()
+        finally:
+            frontier.checkpoint()
 
-    total_result_df.reset_index(drop=True, inplace=True)
-    save_to_csv(total_result_df, final=True)
+    # Consolidated table with the compact schema (categorical strings, date32, float32 prices)
+    tables.save()
+    total_result_df = tables.consolidate()
 
     # Print elapsed time
     end_time = time.time()
     elapsed_time = end_time - start_time
     print(f"Computation time: {elapsed_time:.2f} seconds")
+    session_stats = get_session_stats()
+    print(f"HTTP requests: {session_stats['requests']}, connections opened: {session_stats['connections']}, "
+          f"reused: {session_stats['reused_connections']}")
+    limiter_stats = rate_limiter.stats()
+    print(f"Failed product pages: {len(failed_pages)}, retries: {limiter_stats['retries']}, "
+          f"throttled: {limiter_stats['throttled']}, slowdowns: {limiter_stats['slowdowns']}, "
+          f"final rates: {limiter_stats['rates']}")
+    print(f"Crawl frontier: {frontier.counts()}")
+    table_bytes = table_memory_usage(total_result_df)["bytes"] if keep_table else tables.bytes
+    print(f"Extracted table: {tables.rows} rows, {table_bytes / 1024 ** 2:.1f} MB"
+          f"{' in memory' if keep_table else ' streamed to disk'}")
+    dataset_stats = tables.dataset_stats()
+    if dataset_stats:
+        print(f"Parquet dataset: {dataset_stats['files']} files, {dataset_stats['bytes'] / 1024 ** 2:.1f} MB written")
+    price_stats = get_price_load_stats()
+    print(f"Prices inserted: {price_stats['inserted']}, duplicates skipped: {price_stats['skipped']}, "
+          f"invalid skipped: {price_stats['invalid']}")
+    unit_of_work_stats = unit_of_work.stats()
+    print(f"Transactions committed: {unit_of_work_stats['commits']}, "
+          f"mean commit latency: {1000 * unit_of_work_stats['mean_commit_seconds']:.2f} ms, "
+          f"products loaded: {unit_of_work_stats['products']}, rolled back: {unit_of_work_stats['failed_products']}")
+    if pipeline_stats:
+        print(f"Pipeline batches loaded: {pipeline_stats['batches']}, fetched queue: {pipeline_stats['fetched']}, "
+              f"transformed queue: {pipeline_stats['transformed']}")
+    frontier.close()
+    if cache:
+        cache_stats = cache.stats()
+        print(f"HTTP cache hits: {cache_stats['hits']}, misses: {cache_stats['misses']}, "
+              f"revalidations: {cache_stats['revalidations']}, size: {cache_stats['size_bytes'] / 1024 ** 2:.1f} MB")
+        cache.close()
+    if attribute_cache:
+        # counted through the metrics, which include the lookups of pipeline workers
+        stage_summary = metrics.summary()
+        hits = stage_summary.get("attribute_cache_hit", {}).get("count", 0)
+        misses = stage_summary.get("attribute_cache_miss", {}).get("count", 0)
+        attribute_cache_stats = attribute_cache.stats()
+        print(f"Attribute cache hits: {hits}, misses: {misses}, "
+              f"hit rate: {hits / (hits + misses) if hits + misses else 0:.1%}, "
+              f"cached products: {attribute_cache_stats.get('stored_entries', attribute_cache_stats['entries'])}")
+        close_attribute_cache()
+    if dimension_cache:
+        dimension_cache_stats = dimension_cache.stats()
+        lookups = dimension_cache_stats["hits"] + dimension_cache_stats["misses"]
+        print(f"Dimension ID cache hits: {dimension_cache_stats['hits']}, misses: {dimension_cache_stats['misses']}, "
+              f"hit rate: {dimension_cache_stats['hits'] / lookups if lookups else 0:.1%}, "
+              f"cached rows: {dimension_cache_stats['entries']}")
+
+    print_stage_summary(metrics)
+    if metrics_dir:
+        json_path, prometheus_path = metrics.export(metrics_dir)
+        print(f"Metrics saved to {json_path} and {prometheus_path}")
 
     conn.close()
     return total_result_df
 
 # Run main function
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Extract, transform and load FACUA supermarket prices.")
+    parser.add_argument("--root-url", default=ROOT_URL, help="FACUA main page listing the supermarkets")
+    parser.add_argument("--database", default="comparativa_supermercados", help="PostgreSQL database to load into")
+    parser.add_argument("--output-dir", default=EXTRACTED_DIR, help="folder for the extracted CSV files")
+    parser.add_argument("--async", dest="asynchronous", action="store_true", help="fetch pages concurrently")
+    parser.add_argument("--max-in-flight", type=int, default=32, help="maximum concurrent requests")
+    parser.add_argument("--per-host", type=int, default=8, help="maximum concurrent requests per host")
+    parser.add_argument("--pool-size", type=int, default=16, help="keep-alive connections per host for sequential requests")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="directory of the on-disk HTTP cache")
+    parser.add_argument("--no-cache", action="store_true", help="always download every page")
+    parser.add_argument("--cache-ttl", type=float, default=0,
+                        help="seconds a cached page without ETag or Last-Modified is served without downloading it again (default: 0)")
+    parser.add_argument("--offline", action="store_true", help="only use pages already in the HTTP cache")
+    parser.add_argument("--incremental", action="store_true", help="keep the database and only load new prices")
+    parser.add_argument("--parser", dest="parser_backend", help="HTML parser backend: selectolax, lxml or html.parser")
+    parser.add_argument("--rate", type=float, default=5.0, help="initial requests per second per host")
+    parser.add_argument("--max-rate", type=float, default=50.0, help="maximum requests per second per host")
+    parser.add_argument("--frontier", dest="frontier_path", default=DEFAULT_FRONTIER_PATH, help="SQLite file of the crawl work queue")
+    parser.add_argument("--resume", action="store_true", help="resume the last crawl and retry its failed URLs")
+    parser.add_argument("--pipeline", action="store_true", help="fetch, transform and load in concurrent stages")
+    parser.add_argument("--fetch-workers", type=int, default=8, help="fetch threads of the pipeline")
+    parser.add_argument("--transform-workers", type=int, default=None, help="transformation processes of the pipeline (default: CPUs)")
+    parser.add_argument("--batch-size", type=int, default=50, help="product pages loaded per database batch in the pipeline")
+    parser.add_argument("--metrics-dir", default=DEFAULT_METRICS_DIR, help="folder of the JSON and Prometheus metrics of the run")
+    parser.add_argument("--no-metrics", action="store_true", help="do not export the metrics of the run")
+    parser.add_argument("--attribute-cache", dest="attribute_cache_path", default=DEFAULT_ATTRIBUTE_CACHE_PATH,
+                        help="SQLite file of the product attributes derived in previous runs")
+    parser.add_argument("--no-attribute-cache", action="store_true", help="derive the attributes of every product again")
+    parser.add_argument("--no-dimension-cache", action="store_true",
+                        help="look up every brand, category, supermarket and product ID in the database")
+    parser.add_argument("--commit-every", type=int, default=100, help="products loaded per database transaction")
+    parser.add_argument("--commit-interval", type=float, default=5.0, help="seconds after which a database transaction is committed")
+    parser.add_argument("--stream-output", action="store_true",
+                        help="write each product to the output as it is loaded instead of keeping the whole table in memory")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default=None,
+                        help="extracted data as a partitioned Parquet dataset or CSV files (default: parquet when pyarrow is installed)")
+    args = parser.parse_args()
+
+    main(root_url=args.root_url, database=args.database, output_dir=args.output_dir, asynchronous=args.asynchronous, max_in_flight=args.max_in_flight, per_host=args.per_host, pool_size=args.pool_size,
+         cache_dir=None if args.no_cache else args.cache_dir, cache_ttl=args.cache_ttl, offline=args.offline, incremental=args.incremental,
+         parser_backend=args.parser_backend, rate=args.rate, max_rate=args.max_rate,
+         frontier_path=args.frontier_path, resume=args.resume, pipeline=args.pipeline,
+         fetch_workers=args.fetch_workers, transform_workers=args.transform_workers, batch_size=args.batch_size,
+         metrics_dir=None if args.no_metrics else args.metrics_dir,
+         attribute_cache_path=args.attribute_cache_path, attribute_cache=not args.no_attribute_cache,
+         stream_output=args.stream_output, keep_table=not args.stream_output, output_format=args.output_format,
+         dimension_cache=not args.no_dimension_cache, commit_every=args.commit_every, commit_interval=args.commit_interval)
@@ -0,0 +1,266 @@
+# asynchronous requests
+import asyncio
+import aiohttp
+
+# background event loop
+import threading
+import queue
+from collections import deque
+from urllib.parse import urlsplit
+
+# functions typing
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+from .data_extraction_support import parse_supermarkets_links, parse_categories_links, parse_product_names_links
+from .data_extraction_support import FetchFailure, get_rate_limiter, expand_listing, claim_frontier_products, LISTING_CHILD_KINDS
+from .crawl_frontier_support import CrawlFrontier
+from .http_cache_support import HTTPCache
+from .rate_limit_support import AdaptiveRateLimiter, RETRYABLE_STATUSES
+from .metrics_support import get_metrics, labels_from_url
+
+
+class AsyncCrawler:
+    """
+    Asynchronous FACUA crawler with a bounded number of in-flight requests.
+
+    Parameters:
+    ----------
+    max_in_flight : int
+        Maximum number of requests running at the same time across all hosts.
+    per_host : int
+        Maximum number of requests running at the same time against a single host.
+    retries : int
+        Number of attempts per URL before giving up.
+    delay : float
+        Backoff in seconds of the first retry, doubled (with jitter) on each further retry.
+    timeout : float
+        Total timeout in seconds for a single request.
+    cache : Optional[HTTPCache]
+        On-disk response cache shared with the synchronous `fetch`.
+    rate_limiter : Optional[AdaptiveRateLimiter]
+        Per-host rate limiter, by default the one shared with the synchronous `fetch`.
+    """
+
+    def __init__(self, max_in_flight: int = 32, per_host: int = 8, retries: int = 3, delay: float = 5, timeout: float = 30,
+                 cache: Optional[HTTPCache] = None, rate_limiter: Optional[AdaptiveRateLimiter] = None) -> None:
+        self.max_in_flight = max_in_flight
+        self.per_host = per_host
+        self.retries = retries
+        self.delay = delay
+        self.timeout = timeout
+        self.cache = cache
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str) -> Union[str, FetchFailure]:
+        """
+        Fetches a URL honouring the concurrency limits and the per-host rate limiter.
+
+        Parameters:
+        ----------
+        session : aiohttp.ClientSession
+            Session used to perform the request.
+        url : str
+            URL to fetch.
+
+        Returns:
+        -------
+        str or FetchFailure
+            The page content, or a falsy `FetchFailure` if every attempt failed.
+        """
+        with get_metrics().timer("fetch", **labels_from_url(url)) as timer:
+            content = await self._fetch(session, url)
+            if content:
+                timer.bytes = len(content)
+            else:
+                timer.fail()
+        return content
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str) -> Union[str, FetchFailure]:
+        cache = self.cache
+        entry = cache.lookup(url) if cache else None
+        if cache:
+            if entry and cache.is_fresh(entry):
+                cache.record("hits")
+                return entry.content
+            if cache.offline:
+                cache.record("misses")
+                return FetchFailure(url, None, "not cached (offline)", 0)
+
+        limiter = self.rate_limiter
+        failure = FetchFailure(url, None, "no attempts made", 0)
+        for attempt in range(self.retries):
+            while (wait := limiter.acquire(url)) > 0:
+                await asyncio.sleep(wait)
+
+            try:
+                async with self._in_flight, self._host_semaphore(url):
+                    async with session.get(url, headers=HTTPCache.conditional_headers(entry)) as response:
+                        limiter.record(url, response.status, response.headers.get("Retry-After"))
+                        if response.status == 304 and entry:
+                            cache.revalidated(url, response.headers)
+                            return entry.content
+                        if response.status == 200:
+                            content = await response.text()
+                            if cache:
+                                cache.record("misses")
+                                cache.store(url, content, response.headers)
+                            return content
+
+                        print(f"Failed to fetch {url} (status: {response.status})")
+                        failure = FetchFailure(url, response.status, response.reason or "", attempt + 1)
+                        if response.status not in RETRYABLE_STATUSES:
+                            return failure
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Error fetching {url}: {e!r}")
+                limiter.record(url)
+                failure = FetchFailure(url, None, repr(e), attempt + 1)
+
+            if attempt < self.retries - 1:
+                print(f"Retrying... ({attempt + 1}/{self.retries})")
+                await asyncio.sleep(limiter.backoff(attempt, self.delay))
+            else:
+                print(f"Max retries reached for {url}")
+        return failure
+
+    async def fetch_ordered(self, session: aiohttp.ClientSession, urls: List[str]) -> List[Union[str, FetchFailure]]:
+        """
+        Fetches several URLs concurrently and returns the contents in the order of `urls`.
+        """
+        return await asyncio.gather(*(self.fetch(session, url) for url in urls))
+
+    async def _expand_frontier_listings(self, session: aiohttp.ClientSession, frontier: CrawlFrontier, link: str) -> None:
+        frontier.add(link, "root")
+        for kind in LISTING_CHILD_KINDS:
+            while items := frontier.claim(kind, self.max_in_flight * 4):
+                pages = await self.fetch_ordered(session, [item.url for item in items])
+                for item, content in zip(items, pages):
+                    if not content:
+                        frontier.mark_failed(item.url, content.reason)
+                        continue
+                    expand_listing(frontier, item, content)
+                    frontier.mark_done(item.url)
+            frontier.checkpoint()
+
+    async def iter_product_pages(self, link: str, frontier: Optional[CrawlFrontier] = None) -> AsyncIterator[Tuple[str, str, Union[str, FetchFailure]]]:
+        """
+        Walks supermarkets, categories and products concurrently.
+
+        Product pages are requested ahead of the consumer, but delivered in the
+        same order the sequential walk would produce them.
+
+        Parameters:
+        ----------
+        link : str
+            URL of the FACUA main page listing the supermarkets.
+        frontier : Optional[CrawlFrontier]
+            Frontier to resume the crawl from. Listing pages are marked as done here,
+            product pages must be marked by the caller once they are loaded.
+
+        Yields:
+        -------
+        tuple
+            A tuple containing the product name, the product link and the page content
+            (a falsy `FetchFailure` if the page could not be fetched).
+        """
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._hosts = {}
+
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            if frontier is not None:
+                await self._expand_frontier_listings(session, frontier, link)
+                products = claim_frontier_products(frontier, self.max_in_flight * 4)
+            else:
+                content = await self.fetch(session, link)
+                supermarket_links = parse_supermarkets_links(content) if content else []
+
+                supermarket_pages = await self.fetch_ordered(session, supermarket_links)
+                category_links = [category_link for page in supermarket_pages if page
+                                  for category_link in parse_categories_links(page)]
+
+                category_pages = await self.fetch_ordered(session, category_links)
+                products = [product for page in category_pages if page
+                            for product in zip(*parse_product_names_links(page))]
+
+            # keep a bounded window of product requests ahead of the consumer
+            window = deque()
+            for product_name, product_link in products:
+                window.append((product_name, product_link, asyncio.create_task(self.fetch(session, product_link))))
+                if len(window) >= self.max_in_flight * 4:
+                    product_name, product_link, task = window.popleft()
+                    yield product_name, product_link, await task
+
+            while window:
+                product_name, product_link, task = window.popleft()
+                yield product_name, product_link, await task
+
+
+def crawl_product_pages(link: str, buffer_size: int = 256, frontier: Optional[CrawlFrontier] = None, **crawler_kwargs) -> Iterator[Tuple[str, str, Union[str, FetchFailure]]]:
+    """
+    Runs an `AsyncCrawler` in a background event loop and yields its product pages
+    to synchronous code, in crawl order.
+
+    Parameters:
+    ----------
+    link : str
+        URL of the FACUA main page listing the supermarkets.
+    buffer_size : int
+        Maximum number of fetched pages waiting to be consumed.
+    frontier : Optional[CrawlFrontier]
+        Frontier to resume the crawl from.
+    **crawler_kwargs
+        Keyword arguments passed to `AsyncCrawler`.
+
+    Yields:
+    -------
+    tuple
+        A tuple containing the product name, the product link and the page content.
+    """
+    crawler = AsyncCrawler(**crawler_kwargs)
+    pages = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+    done = object()
+
+    async def produce():
+        async for page in crawler.iter_product_pages(link, frontier):
+            while not stop.is_set():
+                try:
+                    pages.put_nowait(page)
+                    break
+                except queue.Full:
+                    await asyncio.sleep(0.05)
+            if stop.is_set():
+                return
+
+    def run():
+        try:
+            asyncio.run(produce())
+            outcome = done
+        except BaseException as e:
+            outcome = e
+        # nobody is waiting for the outcome once the consumer has stopped
+        if not stop.is_set():
+            pages.put(outcome)
+
+    thread = threading.Thread(target=run, name="facua-crawler", daemon=True)
+    thread.start()
+    try:
+        while True:
+            page = pages.get()
+            if page is done:
+                break
+            if isinstance(page, BaseException):
+                raise page
+            yield page
+    finally:
+        stop.set()
+        thread.join(timeout=5)
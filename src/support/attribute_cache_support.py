@@ -0,0 +1,180 @@
+# local storage
+import os
+import json
+import sqlite3
+
+# system
+import threading
+from collections import OrderedDict
+
+# functions typing
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+DEFAULT_ATTRIBUTE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../data/cache/product_attributes.sqlite")
+
+# SQLite connections inherited from a parent process, kept referenced so they are never closed by the child
+_inherited_connections: List[sqlite3.Connection] = []
+
+
+class AttributeCache:
+    """
+    Memoization of the attributes derived from product names, keyed by (category, normalized name).
+
+    Recently used entries are kept in memory (LRU). With a path, entries are also stored in a
+    SQLite file, so the next runs find the attributes of the products they already saw. The
+    file records the version of the rules the attributes were derived with, and is emptied
+    when it is opened with a different version.
+
+    A cache inherited by a forked process belongs to its parent: closing it in the child drops
+    it without writing its pending entries or closing its SQLite connection.
+
+    Parameters:
+    ----------
+    path : Optional[str]
+        Path of the SQLite file. If None, entries are only kept in memory.
+    version : str
+        Version of the rules deriving the attributes.
+    max_entries : int
+        Maximum number of entries kept in memory.
+    flush_every : int
+        Number of new entries written to the SQLite file at once.
+    """
+
+    def __init__(self, path: Optional[str] = None, version: str = "", max_entries: int = 100_000, flush_every: int = 500) -> None:
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self.pid = os.getpid()
+
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._pending: List[Tuple[str, str, str]] = []
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open(path)
+
+    def _open(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # pipeline workers share the file, so wait for each other's writes
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS attributes (
+                category TEXT NOT NULL,
+                name TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (category, name)
+            ) WITHOUT ROWID
+            """
+        )
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != self.version:
+            # attributes derived with other rules are stale
+            self._db.execute("DELETE FROM attributes")
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (self.version,))
+            if row is not None:
+                self.counters["invalidations"] += 1
+        self._db.commit()
+
+    def get(self, category: str, name: str) -> Optional[tuple]:
+        """
+        Returns the cached attributes of a product, or None if they are not cached.
+        """
+        key = (category, name)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return value
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM attributes WHERE category = ? AND name = ?", (category, name)
+                ).fetchone()
+                if row:
+                    value = tuple(json.loads(row[0]))
+                    self._remember(key, value)
+                    self.counters["disk_hits"] += 1
+                    return value
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, category: str, name: str, value: tuple) -> None:
+        """
+        Caches the attributes of a product. Values must be JSON serializable.
+        """
+        with self._lock:
+            self._remember((category, name), value)
+            if self._db is not None:
+                self._pending.append((category, name, json.dumps(value)))
+                if len(self._pending) >= self.flush_every:
+                    self._flush()
+
+    def _remember(self, key: Hashable, value: tuple) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _flush(self) -> None:
+        if self._pending:
+            self._db.executemany("INSERT OR REPLACE INTO attributes (category, name, value) VALUES (?, ?, ?)", self._pending)
+            self._db.commit()
+            self._pending.clear()
+
+    def flush(self) -> None:
+        """
+        Writes the new entries to the SQLite file.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._flush()
+
+    def clear(self) -> None:
+        """
+        Removes every entry, in memory and on disk.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM attributes")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit, miss, eviction and invalidation counters with the number of entries.
+
+        Returns:
+        -------
+        dict
+            Cache counters, entries in memory and entries stored on disk.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._entries)
+            if self._db is not None:
+                self._flush()
+                stats["stored_entries"] = self._db.execute("SELECT COUNT(*) FROM attributes").fetchone()[0]
+        return stats
+
+    def close(self) -> None:
+        if self.pid != os.getpid():
+            # the lock may have been held by another thread of the parent at the fork, and a SQLite
+            # connection must not be used across a fork: its entries and connection are the parent's
+            if self._db is not None:
+                _inherited_connections.append(self._db)
+            self._db = None
+            self._pending = []
+            return
+        with self._lock:
+            if self._db is not None:
+                self._flush()
+                self._db.close()
+                self._db = None
@@ -0,0 +1,357 @@
+# regular expressions
+import re
+
+# data processing
+import numpy as np
+import pandas as pd
+
+# functions typing
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from .keyword_matching_support import KeywordMatcher
+
+
+# Rules of each category, as data. For a new category, add an entry here:
+#   quantity_pattern: regex whose single group captures the quantity, size and units of the product
+#   subcategory: keywords checked in order (the first one found gives the subcategory), the value
+#                when none is found, and keywords that exclude the product from the subcategories
+#   distinction: keywords checked in order for the base distinction, then suffixes added for each
+#                keyword found
+CATEGORY_RULES = {
+    "aceite_de_oliva": {
+        "quantity_pattern": r"(\d+(?:[.,]\d+)?\s?(?:l|litros?|ml|mililitros?))",
+        "subcategory": {
+            "keywords": [("virgen extra", "virgen extra"), ("virgen", "virgen"), ("intenso", "intenso")],
+            "default": "suave",
+            # products preserved in oil are not oils
+            "unless": ["en aceite", "con aceite"],
+        },
+    },
+    "aceite_de_girasol": {
+        "quantity_pattern": r"(\d+(?:[.,]\d+)?\s?(?:l|litros?|ml|mililitros?))",
+        "subcategory": {
+            "keywords": [("freir", "freir")],
+            "default": "normal",
+        },
+    },
+    "leche": {
+        "quantity_pattern": r"(\d+(?:[.,]\d+)?\s?(?:l|litros?|ml|g|gr|cl|g)|\d+\s?(?:uds\.?|botes|x)\s?\d+(?:[.,]\d+)?\s?(?:l|ml|g|gr|cl|g))",
+        "subcategory": {
+            "keywords": [("cabra", "cabra"), ("vaca", "vaca"), ("condensada", "condensada"), ("leche", "vaca")],
+            "default": "otras",
+        },
+        "distinction": {
+            "keywords": [("semidesnatada", "semidesnatada"), ("desnatada", "desnatada"), ("entera", "entera")],
+            "suffixes": [("lactosa", " sin lactosa"), ("calcio", " calcio"), ("proteinas", " proteinas"), ("fresca", " fresca")],
+        },
+    },
+}
+
+# subcategory of products of unknown categories or excluded by an 'unless' keyword
+DEFAULT_SUBCATEGORY = "otras"
+
+ECO_KEYWORDS = [" eco ", "ecologic"]
+
+NAME_REPLACEMENTS = {
+    " unidades de ": " x ",
+    " uds. x ": " x ",
+    " uds. ": " x ",
+    " briks de ": " x ",
+    " botellas de ": " x ",
+    "tabla de precios por dia para ": "",
+    "comparativa de precios por dia para ": ""
+}
+
+UNIT_ABBREVIATIONS = {
+    "gramos": "g",
+    "kilogramos": "kg",
+    "miligramo": "mg",
+    "miligramos": "mg",
+    "litros": "l",
+    "litro": "l",
+    "mililitro": "ml",
+    "mililitros": "ml",
+    "centilitro": "cl",
+    "centilitros": "cl"
+}
+
+UNIT_MAGNITUDES = {'g': 1, 'kg': 1000, 'mg': 0.001, 'l': 1, 'ml': 0.001, 'cl': 0.01}
+UNIT_BASES = {'g': 'g', 'kg': 'g', 'mg': 'g', 'l': 'l', 'ml': 'l', 'cl': 'l'}
+
+QUANTITY_COUNT_PATTERN = re.compile(r"(\d+)\s?x")
+UNITS_PATTERN = re.compile(r"\d\s?(\w{1,2})$")
+MAGNITUDE_PATTERN = re.compile(r"(?:\d\s?x\s?)?(\d?\.?\d+)\s?\w{1,2}?")
+
+
+@dataclass
+class ProductAttributes:
+    """
+    Attributes derived from a product name by the rules of its category.
+    """
+    quantity: Union[str, int]
+    volume_weight: float
+    units: Optional[str]
+    product_name: str
+    subcategory: str
+    distinction: str
+    eco: bool
+
+
+def normalize_product_name(product_name: str) -> str:
+    """
+    Lowercases a product name and writes its pack sizes as 'N x'.
+    """
+    product_name = product_name.lower()
+    for old, new in NAME_REPLACEMENTS.items():
+        product_name = product_name.replace(old, new)
+    return product_name
+
+
+def normalize_product_names(product_names: pd.Series) -> pd.Series:
+    """
+    Columnar version of `normalize_product_name`.
+    """
+    product_names = product_names.str.lower()
+    for old, new in NAME_REPLACEMENTS.items():
+        product_names = product_names.str.replace(old, new, regex=False)
+    return product_names
+
+
+def parse_quantity(quantity_magnitude_unit: Optional[str]) -> Tuple[Union[str, int], float, Optional[str]]:
+    """
+    Parses the quantity, the size in base units and the base unit of a matched quantity text.
+
+    Parameters:
+    ----------
+    quantity_magnitude_unit : Optional[str]
+        Text captured by a category's quantity pattern, or None if the pattern did not match.
+
+    Returns:
+    -------
+    tuple
+        The quantity (the matched number of units as a string, or 1), the magnitude
+        converted to grams or litres, and the base unit ('g', 'l' or None).
+    """
+    quantity, units, magnitude = 1, None, 1
+    if quantity_magnitude_unit is not None:
+        match = QUANTITY_COUNT_PATTERN.search(quantity_magnitude_unit)
+        if match:
+            quantity = match.group(1)
+        match = UNITS_PATTERN.search(quantity_magnitude_unit)
+        if match:
+            units = UNIT_ABBREVIATIONS.get(match.group(1), match.group(1))
+        match = MAGNITUDE_PATTERN.search(quantity_magnitude_unit.replace(",", "."))
+        if match:
+            magnitude = match.group(1)
+
+    magnitude = float(magnitude) * UNIT_MAGNITUDES.get(units, 1)
+    return quantity, magnitude, UNIT_BASES.get(units, None)
+
+
+def parse_quantities(quantity_magnitude_units: pd.Series) -> pd.DataFrame:
+    """
+    Columnar version of `parse_quantity`: the column is dictionary encoded and each distinct text
+    parsed once.
+
+    Parameters:
+    ----------
+    quantity_magnitude_units : pd.Series
+        Texts captured by a category's quantity pattern, missing where the pattern did not match.
+
+    Returns:
+    -------
+    pd.DataFrame
+        'quantity', 'volume_weight' and 'units' columns with the index of `quantity_magnitude_units`,
+        holding the values and types `parse_quantity` returns.
+    """
+    # a few sizes ('1 l', '500 ml') come back in most names: each distinct text is parsed once
+    codes, texts = pd.factorize(quantity_magnitude_units, use_na_sentinel=False)
+    parsed = [parse_quantity(None if pd.isna(text) else text) for text in texts]
+    quantities = pd.DataFrame({
+        # the matched number of units as a string, or the integer 1, and None for missing units
+        "quantity": pd.Series([quantity for quantity, _, _ in parsed], dtype=object),
+        "volume_weight": np.array([volume_weight for _, volume_weight, _ in parsed], dtype=float),
+        "units": pd.Series([units for _, _, units in parsed], dtype=object),
+    })
+    return quantities.take(codes).set_axis(quantity_magnitude_units.index)
+
+
+class CategoryRules:
+    """
+    Rules of one category compiled for fast matching: a precompiled quantity regex and a
+    single `KeywordMatcher` holding every keyword of the subcategory, distinction and eco rules,
+    so each keyword is searched once per name whatever the number of rules using it.
+
+    Parameters:
+    ----------
+    rules : dict
+        Rules of the category, in the format of `CATEGORY_RULES`.
+    """
+
+    def __init__(self, rules: Dict) -> None:
+        pattern = rules.get("quantity_pattern")
+        self.quantity_pattern = re.compile(pattern) if pattern else None
+
+        subcategory = rules.get("subcategory", {})
+        distinction = rules.get("distinction", {})
+        keywords: List[str] = []
+
+        def index(keyword):
+            if keyword not in keywords:
+                keywords.append(keyword)
+            return keywords.index(keyword)
+
+        self.subcategory_keywords = [(index(keyword), value) for keyword, value in subcategory.get("keywords", [])]
+        self.subcategory_default = subcategory.get("default", DEFAULT_SUBCATEGORY)
+        self.subcategory_unless = frozenset(index(keyword) for keyword in subcategory.get("unless", []))
+        self.distinction_keywords = [(index(keyword), value) for keyword, value in distinction.get("keywords", [])]
+        self.distinction_suffixes = [(index(keyword), suffix) for keyword, suffix in distinction.get("suffixes", [])]
+        self.eco_keywords = frozenset(index(keyword) for keyword in ECO_KEYWORDS)
+        self.matcher = KeywordMatcher(keywords)
+
+    def extract_quantity(self, product_name: str) -> Tuple[Union[str, int], float, Optional[str]]:
+        match = self.quantity_pattern.search(product_name) if self.quantity_pattern else None
+        return parse_quantity(match.group(1) if match else None)
+
+    def classify(self, product_name: str, found: Optional[frozenset] = None) -> Tuple[str, str, bool]:
+        """
+        Returns the subcategory, distinction and eco status of a normalized product name.
+
+        Parameters:
+        ----------
+        product_name : str
+            Normalized product name.
+        found : Optional[frozenset]
+            Keywords already found in the name by `matcher`, to avoid scanning it again.
+
+        Returns:
+        -------
+        tuple
+            The subcategory, the distinction ('' if none) and whether the product is eco.
+        """
+        if found is None:
+            found = self.matcher.find(product_name)
+
+        if found & self.subcategory_unless:
+            subcategory = DEFAULT_SUBCATEGORY
+        else:
+            subcategory = next((value for keyword, value in self.subcategory_keywords if keyword in found),
+                               self.subcategory_default)
+
+        distinction = ""
+        if self.distinction_keywords or self.distinction_suffixes:
+            distinction = next((value for keyword, value in self.distinction_keywords if keyword in found), "")
+            distinction += "".join(suffix for keyword, suffix in self.distinction_suffixes if keyword in found)
+
+        return subcategory, distinction, bool(found & self.eco_keywords)
+
+    def extract_quantities(self, product_names: pd.Series) -> pd.DataFrame:
+        """
+        Columnar version of `extract_quantity`, over normalized product names.
+        """
+        if self.quantity_pattern is None:
+            matches = pd.Series(None, index=product_names.index, dtype=object)
+        else:
+            matches = product_names.str.extract(self.quantity_pattern.pattern, expand=False)
+        return parse_quantities(matches)
+
+    def classify_many(self, product_names: pd.Series) -> pd.DataFrame:
+        """
+        Columnar version of `classify`: each keyword of `matcher` is searched once in the whole
+        column, and the rules combine the masks of the keywords found.
+
+        Parameters:
+        ----------
+        product_names : pd.Series
+            Normalized product names.
+
+        Returns:
+        -------
+        pd.DataFrame
+            'subcategory', 'distinction' and 'eco' columns with the index of `product_names`.
+        """
+        found = [product_names.str.contains(keyword, regex=False).to_numpy(dtype=bool) for keyword in self.matcher.keywords]
+        none = np.zeros(len(product_names), dtype=bool)
+
+        def any_found(keywords):
+            return np.logical_or.reduce([found[keyword] for keyword in keywords]) if keywords else none
+
+        def first_found(keywords, default):
+            values = np.full(len(product_names), default, dtype=object)
+            # the first keyword found wins, so the values are written from the last keyword to the first
+            for keyword, value in reversed(keywords):
+                values[found[keyword]] = value
+            return values
+
+        subcategories = first_found(self.subcategory_keywords, self.subcategory_default)
+        subcategories[any_found(self.subcategory_unless)] = DEFAULT_SUBCATEGORY
+
+        distinctions = first_found(self.distinction_keywords, "")
+        for keyword, suffix in self.distinction_suffixes:
+            distinctions[found[keyword]] += suffix
+
+        return pd.DataFrame({"subcategory": subcategories, "distinction": distinctions, "eco": any_found(self.eco_keywords)},
+                            index=product_names.index)
+
+    def apply_many(self, product_names: pd.Series) -> pd.DataFrame:
+        """
+        Columnar version of `apply`, deriving the attributes of a column of product names of the category.
+
+        Parameters:
+        ----------
+        product_names : pd.Series
+            Product names, as returned by `sanitize_filename(unidecode(name.lower()))`.
+
+        Returns:
+        -------
+        pd.DataFrame
+            The `ProductAttributes` fields as columns, in the order of the `get_product_info` tuple,
+            with the index of `product_names`.
+        """
+        product_names = normalize_product_names(product_names)
+        return pd.concat([product_names.astype(object).rename("product_name"), self.extract_quantities(product_names),
+                          self.classify_many(product_names)], axis=1)
+
+    def apply(self, product_name: str) -> ProductAttributes:
+        """
+        Derives every attribute of a product from its name with a single keyword scan.
+
+        Parameters:
+        ----------
+        product_name : str
+            Product name, as returned by `sanitize_filename(unidecode(name.lower()))`.
+
+        Returns:
+        -------
+        ProductAttributes
+            Quantity, volume or weight, units, normalized name, subcategory, distinction and eco status.
+        """
+        product_name = normalize_product_name(product_name)
+        quantity, volume_weight, units = self.extract_quantity(product_name)
+        subcategory, distinction, eco = self.classify(product_name)
+        return ProductAttributes(quantity, volume_weight, units, product_name, subcategory, distinction, eco)
+
+
+def compile_category_rules(rules: Dict[str, Dict] = CATEGORY_RULES) -> Dict[str, CategoryRules]:
+    """
+    Compiles the rules of every category.
+
+    Returns:
+    -------
+    dict
+        Mapping of category name to its `CategoryRules`.
+    """
+    return {category: CategoryRules(category_rules) for category, category_rules in rules.items()}
+
+
+_compiled_rules = compile_category_rules()
+# rules of categories without an entry in CATEGORY_RULES
+_default_rules = CategoryRules({})
+
+
+def get_category_rules(category: str) -> CategoryRules:
+    """
+    Returns the compiled rules of a category, or the default rules for unknown categories.
+    """
+    return _compiled_rules.get(category, _default_rules)
@@ -0,0 +1,216 @@
+# local storage
+import os
+import sqlite3
+
+# system
+import time
+import threading
+
+# functions typing
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+
+DEFAULT_FRONTIER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../data/cache/crawl_frontier.sqlite")
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class FrontierItem:
+    """
+    A URL of the crawl and its place in the site structure.
+    """
+    url: str
+    kind: str
+    name: Optional[str]
+    attempts: int
+
+
+class CrawlFrontier:
+    """
+    Persistent work queue of the crawl, stored in a SQLite file.
+
+    Every supermarket, category and product URL has a state: pending, in_flight, done or
+    failed. State changes are committed every `checkpoint_every` changes, so an interrupted
+    crawl can be resumed from its last checkpoint.
+
+    Parameters:
+    ----------
+    path : str
+        Path of the SQLite file.
+    checkpoint_every : int
+        Number of state changes between two commits.
+    max_attempts : int
+        Number of times a failed URL is retried before it is left as failed.
+    """
+
+    def __init__(self, path: str = DEFAULT_FRONTIER_PATH, checkpoint_every: int = 50, max_attempts: int = 3) -> None:
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.max_attempts = max_attempts
+        self._changes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS frontier (
+                position INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                parent TEXT,
+                name TEXT,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS frontier_kind_state ON frontier (kind, state, position)")
+        self._db.commit()
+
+    def _changed(self, count: int = 1) -> None:
+        self._changes += count
+        if self._changes >= self.checkpoint_every:
+            self._db.commit()
+            self._changes = 0
+
+    def add(self, url: str, kind: str, parent: Optional[str] = None, name: Optional[str] = None) -> None:
+        """
+        Adds a URL to the frontier as pending, unless it is already known.
+        """
+        self.add_many([(url, name)], kind, parent)
+
+    def add_many(self, urls: Iterable[tuple], kind: str, parent: Optional[str] = None) -> None:
+        """
+        Adds several (url, name) pairs of the same kind, keeping their order.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._db.executemany(
+                "INSERT OR IGNORE INTO frontier (url, kind, parent, name, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(url, kind, parent, name, now) for url, name in urls]
+            )
+            self._changed(max(cursor.rowcount, 0))
+
+    def claim(self, kind: str, limit: int = 100) -> List[FrontierItem]:
+        """
+        Marks the next pending URLs of a kind as in flight and returns them in crawl order.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT url, kind, name, attempts FROM frontier WHERE kind = ? AND state = ? ORDER BY position LIMIT ?",
+                (kind, PENDING, limit)
+            ).fetchall()
+            self._db.executemany(
+                "UPDATE frontier SET state = ?, updated_at = ? WHERE url = ?",
+                [(IN_FLIGHT, time.time(), url) for url, *_ in rows]
+            )
+            self._changed(len(rows))
+        return [FrontierItem(*row) for row in rows]
+
+    def mark_done(self, url: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE frontier SET state = ?, last_error = NULL, updated_at = ? WHERE url = ?",
+                (DONE, time.time(), url)
+            )
+            self._changed()
+
+    def mark_failed(self, url: str, error: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE frontier SET state = ?, attempts = attempts + 1, last_error = ?, updated_at = ? WHERE url = ?",
+                (FAILED, error, time.time(), url)
+            )
+            self._changed()
+
+    def recover(self) -> int:
+        """
+        Puts URLs left in flight by an interrupted run back to pending.
+
+        Returns:
+        -------
+        int
+            Number of recovered URLs.
+        """
+        with self._lock:
+            count = self._db.execute(
+                "UPDATE frontier SET state = ? WHERE state = ?", (PENDING, IN_FLIGHT)
+            ).rowcount
+            self._db.commit()
+        return count
+
+    def retry_failed(self) -> int:
+        """
+        Puts failed URLs that have not exhausted their attempts back to pending.
+
+        Returns:
+        -------
+        int
+            Number of URLs queued again.
+        """
+        with self._lock:
+            count = self._db.execute(
+                "UPDATE frontier SET state = ? WHERE state = ? AND attempts < ?",
+                (PENDING, FAILED, self.max_attempts)
+            ).rowcount
+            self._db.commit()
+        return count
+
+    def reset(self) -> None:
+        """
+        Forgets every URL, to start a new crawl.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM frontier")
+            self._db.commit()
+            self._changes = 0
+
+    def items(self, kind: str, state: Optional[str] = None) -> List[FrontierItem]:
+        """
+        Returns the URLs of a kind in crawl order, optionally only those in a state, without claiming them.
+        """
+        query = "SELECT url, kind, name, attempts FROM frontier WHERE kind = ?"
+        params = [kind]
+        if state is not None:
+            query += " AND state = ?"
+            params.append(state)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY position", params).fetchall()
+        return [FrontierItem(*row) for row in rows]
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns the number of URLs of each kind in each state.
+
+        Returns:
+        -------
+        dict
+            Mapping of kind to a mapping of state to count.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT kind, state, COUNT(*) FROM frontier GROUP BY kind, state").fetchall()
+        counts = {}
+        for kind, state, count in rows:
+            counts.setdefault(kind, {})[state] = count
+        return counts
+
+    def checkpoint(self) -> None:
+        """
+        Commits every pending state change to disk.
+        """
+        with self._lock:
+            self._db.commit()
+            self._changes = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.commit()
+            self._db.close()
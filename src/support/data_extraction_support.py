@@ -1,48 +1,416 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 import time
+import threading
 
-def fetch(url, retries=3, delay=5):
+from tqdm import tqdm
+
+# functions typing
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, Union
+
+from .http_cache_support import HTTPCache, DEFAULT_CACHE_DIR
+from .html_parsing_support import parse_cards_links, parse_product_cards
+from .rate_limit_support import AdaptiveRateLimiter, RETRYABLE_STATUSES
+from .crawl_frontier_support import CrawlFrontier, FrontierItem
+from .metrics_support import get_metrics, labels_from_url
+
+
+_session = None
+_session_lock = threading.Lock()
+_session_config = {"pool_size": 16, "timeout": (5, 30)}
+_session_stats = {"requests": 0, "connections": 0}
+_stats_lock = threading.Lock()
+_cache: Optional[HTTPCache] = None
+_rate_limiter = AdaptiveRateLimiter()
+
+
+@dataclass
+class FetchFailure:
+    """
+    Result of a fetch that did not return a page. It is falsy, so callers can keep
+    checking `if content:`.
+    """
+    url: str
+    status: Optional[int]
+    reason: str
+    attempts: int
+
+    def __bool__(self) -> bool:
+        return False
+
+
+def _count(counter: str) -> None:
+    with _stats_lock:
+        _session_stats[counter] += 1
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count("connections")
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count("connections")
+        return super()._new_conn()
+
+
+class _CountingAdapter(HTTPAdapter):
+    """
+    HTTP adapter whose connection pools count every new TCP connection they open.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+def configure_session(pool_size: int = 16, timeout: Union[float, Tuple[float, float]] = (5, 30)) -> None:
+    """
+    Configures the shared HTTP session used by `fetch`. The current session, if any,
+    is closed and a new one is created on the next request.
+
+    Parameters:
+    ----------
+    pool_size : int
+        Maximum number of keep-alive connections kept open per host.
+    timeout : float or tuple of float
+        Default timeout in seconds, either a single value or a (connect, read) tuple.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_config["pool_size"] = pool_size
+        _session_config["timeout"] = timeout
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the shared keep-alive HTTP session, creating it on first use.
+
+    Returns:
+    -------
+    requests.Session
+        Session with pooled connections and compressed transfer enabled.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = _CountingAdapter(
+                pool_connections=_session_config["pool_size"],
+                pool_maxsize=_session_config["pool_size"],
+                pool_block=True
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+            _session = session
+        return _session
+
+
+def get_session_stats() -> Dict[str, int]:
+    """
+    Returns the request and connection counters of the shared session.
+
+    Returns:
+    -------
+    dict
+        Number of requests sent, connections opened and requests served on a reused connection.
+    """
+    with _stats_lock:
+        stats = dict(_session_stats)
+    stats["reused_connections"] = max(stats["requests"] - stats["connections"], 0)
+    return stats
+
+
+def configure_cache(path: Optional[str] = DEFAULT_CACHE_DIR, max_size: int = 1024 ** 3, ttl: float = 0, offline: bool = False) -> Optional[HTTPCache]:
+    """
+    Configures the on-disk response cache used by `fetch`.
+
+    Parameters:
+    ----------
+    path : Optional[str]
+        Directory of the cache. If None, caching is disabled.
+    max_size : int
+        Maximum size in bytes of the cached bodies.
+    ttl : float
+        Seconds a response without ETag or Last-Modified is served from the cache. If 0, it is fetched again every time.
+    offline : bool
+        If True, only cached responses are returned and the network is never used.
+
+    Returns:
+    -------
+    Optional[HTTPCache]
+        The configured cache, or None if caching is disabled.
+    """
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = HTTPCache(path, max_size=max_size, ttl=ttl, offline=offline) if path else None
+    return _cache
+
+
+def get_cache() -> Optional[HTTPCache]:
+    """
+    Returns the response cache used by `fetch`, or None if caching is disabled.
+    """
+    return _cache
+
+
+def configure_rate_limiter(**limiter_kwargs) -> AdaptiveRateLimiter:
+    """
+    Replaces the per-host rate limiter shared by `fetch` and the asynchronous crawler.
+
+    Parameters:
+    ----------
+    **limiter_kwargs
+        Keyword arguments passed to `AdaptiveRateLimiter` (rate, burst, min_rate, max_rate...).
+
+    Returns:
+    -------
+    AdaptiveRateLimiter
+        The new rate limiter.
+    """
+    global _rate_limiter
+    _rate_limiter = AdaptiveRateLimiter(**limiter_kwargs)
+    return _rate_limiter
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """
+    Returns the per-host rate limiter shared by `fetch` and the asynchronous crawler.
+    """
+    return _rate_limiter
+
+
+def fetch(url, retries=3, delay=5, timeout=None):
+    """
+    Fetches a page through the shared session, cache and rate limiter.
+
+    Retryable failures (connection errors, timeouts, 429 and 5xx responses) are retried
+    with exponential backoff and jitter, starting at `delay` seconds.
+
+    Parameters:
+    ----------
+    url : str
+        URL to fetch.
+    retries : int
+        Maximum number of attempts.
+    delay : float
+        Backoff in seconds of the first retry.
+    timeout : float or tuple of float, optional
+        Timeout of each attempt, defaults to the session timeout.
+
+    Returns:
+    -------
+    str or FetchFailure
+        The page content, or a falsy `FetchFailure` describing why it could not be fetched.
+    """
+    with get_metrics().timer("fetch", **labels_from_url(url)) as timer:
+        content = _fetch(url, retries, delay, timeout)
+        if content:
+            timer.bytes = len(content)
+        else:
+            timer.fail()
+    return content
+
+def _fetch(url, retries, delay, timeout):
+    cache = _cache
+    entry = cache.lookup(url) if cache else None
+    if cache:
+        if entry and cache.is_fresh(entry):
+            cache.record("hits")
+            return entry.content
+        if cache.offline:
+            cache.record("misses")
+            print(f"Not cached, skipping {url} (offline)")
+            return FetchFailure(url, None, "not cached (offline)", 0)
+
+    session = get_session()
+    limiter = _rate_limiter
+    failure = FetchFailure(url, None, "no attempts made", 0)
     for attempt in range(retries):
+        while (wait := limiter.acquire(url)) > 0:
+            time.sleep(wait)
+
         try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                return response.text
-            else:
-                print(f"Failed to fetch {url} (status: {response.status_code})")
+            _count("requests")
+            response = session.get(url, headers=HTTPCache.conditional_headers(entry),
+                                   timeout=timeout or _session_config["timeout"])
         except (requests.RequestException, RuntimeError, AttributeError) as e:
             print(f"Error fetching {url}: {e}")
-            if attempt < retries - 1:
-                print(f"Retrying... ({attempt + 1}/{retries})")
-                time.sleep(delay)
-            else:
-                print(f"Max retries reached for {url}")
+            limiter.record(url)
+            failure = FetchFailure(url, None, str(e), attempt + 1)
+        else:
+            limiter.record(url, response.status_code, response.headers.get("Retry-After"))
+            if response.status_code == 304 and entry:
+                cache.revalidated(url, response.headers)
+                return entry.content
+            if response.status_code == 200:
+                if cache:
+                    cache.record("misses")
+                    cache.store(url, response.text, response.headers)
+                return response.text
+
+            print(f"Failed to fetch {url} (status: {response.status_code})")
+            failure = FetchFailure(url, response.status_code, response.reason, attempt + 1)
+            if response.status_code not in RETRYABLE_STATUSES:
+                return failure
+
+        if attempt < retries - 1:
+            print(f"Retrying... ({attempt + 1}/{retries})")
+            time.sleep(limiter.backoff(attempt, delay))
+        else:
+            print(f"Max retries reached for {url}")
+
+    return failure
+
+def parse_supermarkets_links(content):
+    return parse_cards_links(content)
+
+def parse_categories_links(content):
+    return parse_cards_links(content)
+
+def parse_product_names_links(content):
+    return parse_product_cards(content)
 
 def get_supermarkets_links(link):
     content = fetch(link)
     if content:
-        main_soup = BeautifulSoup(content, "html.parser")
-        supermarket_cards = main_soup.findAll("div", {"class": "card h-100"})
-        return [card.find("a")["href"] for card in supermarket_cards]
+        return parse_supermarkets_links(content)
     return []
 
 def get_categories_links(link):
     content = fetch(link)
     if content:
-        categories_soup = BeautifulSoup(content, "html.parser")
-        category_cards = categories_soup.findAll("div", {"class": "card h-100"})
-        return [card.find("a")["href"] for card in category_cards]
+        return parse_categories_links(content)
     return []
 
 def get_product_names_links(link):
     content = fetch(link)
     if content:
-        products_soup = BeautifulSoup(content, "html.parser")
-        product_cards_grid = products_soup.findAll(
-            "div", {"class", "row gx-4 gx-lg-5 row-cols-2 row-cols-md-3 row-cols-xl-4 justify-content-center"}
-        )[-1]
-        product_cards = product_cards_grid.findAll("div", {"class": "card h-100"})
-        product_names = [card.find("p").text.strip() for card in product_cards]
-        product_links = [card.find("a")["href"] for card in product_cards]
-        return product_names, product_links
+        return parse_product_names_links(content)
     return [], []
+
+def iter_product_pages(link):
+    """
+    Walks supermarkets, categories and products sequentially, fetching one page at a time.
+
+    Parameters:
+    ----------
+    link : str
+        URL of the FACUA main page listing the supermarkets.
+
+    Yields:
+    -------
+    tuple
+        A tuple containing the product name, the product link and the page content
+        (a falsy `FetchFailure` if the page could not be fetched).
+    """
+    supermarket_links = get_supermarkets_links(link)
+    for supermarket_link in tqdm(supermarket_links, desc="Supermarkets"):
+
+        # Fetch category links for each supermarket
+        category_links = get_categories_links(supermarket_link)
+        for category_link in tqdm(category_links, desc="Categories", leave=False):
+
+            # Fetch product names and links for each category
+            product_names, product_links = get_product_names_links(category_link)
+            for product_name, product_link in zip(product_names, product_links):
+                yield product_name, product_link, fetch(product_link)
+
+# kinds of listing pages in crawl order, and the kind of the links each one contains
+LISTING_CHILD_KINDS = {"root": "supermarket", "supermarket": "category", "category": "product"}
+
+def expand_listing(frontier: CrawlFrontier, item: FrontierItem, content: str) -> None:
+    """
+    Adds the links found in a listing page to the frontier as children of the page.
+
+    Parameters:
+    ----------
+    frontier : CrawlFrontier
+        Frontier of the crawl.
+    item : FrontierItem
+        The listing page (root, supermarket or category).
+    content : str
+        HTML content of the listing page.
+    """
+    child_kind = LISTING_CHILD_KINDS[item.kind]
+    if child_kind == "product":
+        product_names, product_links = parse_product_names_links(content)
+        frontier.add_many(zip(product_links, product_names), child_kind, item.url)
+    else:
+        frontier.add_many(((child_link, None) for child_link in parse_cards_links(content)), child_kind, item.url)
+
+def expand_frontier_listings(frontier, link, batch_size=100):
+    """
+    Fetches the pending root, supermarket and category pages of the frontier sequentially,
+    adding the links they contain until only product pages are left.
+
+    Parameters:
+    ----------
+    frontier : CrawlFrontier
+        Frontier of the crawl.
+    link : str
+        URL of the FACUA main page listing the supermarkets.
+    batch_size : int
+        Number of URLs claimed from the frontier at once.
+    """
+    frontier.add(link, "root")
+    for kind in LISTING_CHILD_KINDS:
+        while items := frontier.claim(kind, batch_size):
+            for item in tqdm(items, desc=f"Listing {kind} pages", leave=False):
+                content = fetch(item.url)
+                if not content:
+                    frontier.mark_failed(item.url, content.reason)
+                    continue
+                expand_listing(frontier, item, content)
+                frontier.mark_done(item.url)
+        frontier.checkpoint()
+
+def claim_frontier_products(frontier, batch_size=100):
+    """
+    Claims the pending product pages of the frontier in crawl order.
+
+    Yields:
+    -------
+    tuple
+        A tuple containing the product name and the product link.
+    """
+    while items := frontier.claim("product", batch_size):
+        for item in items:
+            yield item.name, item.url
+
+def iter_product_pages_from_frontier(frontier, link, batch_size=100):
+    """
+    Walks the crawl frontier sequentially, resuming from its saved state.
+
+    Listing pages are expanded and marked as done here. Product pages are only claimed:
+    the caller marks them as done or failed once they are loaded.
+
+    Parameters:
+    ----------
+    frontier : CrawlFrontier
+        Frontier of the crawl.
+    link : str
+        URL of the FACUA main page listing the supermarkets.
+    batch_size : int
+        Number of URLs claimed from the frontier at once.
+
+    Yields:
+    -------
+    tuple
+        A tuple containing the product name, the product link and the page content
+        (a falsy `FetchFailure` if the page could not be fetched).
+    """
+    expand_frontier_listings(frontier, link, batch_size)
+    for product_name, product_link in claim_frontier_products(frontier, batch_size):
+        yield product_name, product_link, fetch(product_link)
@@ -6,11 +6,152 @@ from psycopg2 import OperationalError, errorcodes, errors
 import pandas as pd
 
 # system
+import io
 import os
+import math
+import uuid
+import threading
+from datetime import date
+from functools import partial
 
 # functions typing
 from typing import Optional, Tuple, List, Union, Dict
 
+# instrumentation
+from .metrics_support import timed
+
+from .dimension_cache_support import DIMENSIONS, NULL_VALUES, cached_dimension, get_dimension_cache
+from .unit_of_work_support import active_unit_of_work
+from .data_transformation_support import apply_table_schema, concat_tables, table_memory_usage
+from .parquet_dataset_support import DATASET_NAME, ParquetDatasetWriter, parquet_available
+
+
+EXTRACTED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../data/extracted")
+OUTPUT_FORMATS = ("parquet", "csv")
+CSV_NAME = "facua_extracted_auto.csv"
+
+# natural keys of the tables, in unique indexes and ON CONFLICT targets. Nullable columns are
+# compared through a sentinel, so that a missing value matches another missing value
+UNIQUE_KEYS = {
+    "brands": "brand_name",
+    "categories": "category_name",
+    "supermarkets": "supermarket_name",
+    "subcategories": "subcategory_name, (COALESCE(category_id, 0)), (COALESCE(distinction, '')), (COALESCE(eco, FALSE))",
+    "products": "(COALESCE(brand_id, 0)), (COALESCE(subcategory_id, 0)), product_name_norm, "
+                "(COALESCE(quantity, -1)), (COALESCE(units, '')), (COALESCE(volume_weight, -1))",
+    "supermarkets_products": "(COALESCE(supermarket_id, 0)), (COALESCE(product_id, 0)), "
+                             "(COALESCE(facua_url, '')), (COALESCE(product_name_supermarket, ''))",
+    "prices": "supermarket_product_id, date",
+}
+
+_price_stats = {"inserted": 0, "skipped": 0, "invalid": 0}
+_price_stats_lock = threading.Lock()
+
+
+def default_output_format() -> str:
+    """
+    Returns the format of the extracted data: a Parquet dataset when pyarrow is installed, CSV files otherwise.
+    """
+    return "parquet" if parquet_available() else "csv"
+
+
+# ID column of each table, and the (table, column) references to it, in the order duplicates are merged:
+# merging a table can make rows of the tables referencing it duplicates too
+NATURAL_KEY_TABLES = {
+    "categories": ("category_id", [("subcategories", "category_id")]),
+    "brands": ("brand_id", [("products", "brand_id")]),
+    "supermarkets": ("supermarket_id", [("supermarkets_products", "supermarket_id")]),
+    "subcategories": ("subcategory_id", [("products", "subcategory_id")]),
+    "products": ("product_id", [("supermarkets_products", "product_id")]),
+    "supermarkets_products": ("supermarket_product_id", [("prices", "supermarket_product_id")]),
+    "prices": ("price_id", []),
+}
+
+
+def _ranked_duplicates(table: str) -> str:
+    # each row with the ID of the first row of its natural key, which is kept
+    id_column, _ = NATURAL_KEY_TABLES[table]
+    return f"SELECT {id_column} AS duplicate_id, MIN({id_column}) OVER (PARTITION BY {UNIQUE_KEYS[table]}) AS kept_id FROM {table}"
+
+def _count_duplicates(cursor: psycopg2.extensions.cursor, table: str) -> int:
+    cursor.execute(f"SELECT COUNT(*) FROM ({_ranked_duplicates(table)}) AS ranked WHERE duplicate_id <> kept_id")
+    return cursor.fetchone()[0]
+
+def _create_unique_index(cursor: psycopg2.extensions.cursor, table: str) -> None:
+    """
+    Creates the unique index of the natural key of a table, `<table>_natural_key`.
+
+    Rows loaded before the index existed may be duplicated: they are not merged here, the
+    table is left as it is and an error points to `merge_duplicate_rows`.
+    """
+    index_name = f"{table}_natural_key"
+    cursor.execute("SELECT to_regclass(%s)", (index_name,))
+    if cursor.fetchone()[0] is not None:
+        return
+    duplicates = _count_duplicates(cursor, table)
+    if duplicates:
+        cursor.connection.rollback()
+        raise RuntimeError(
+            f"{duplicates} rows of '{table}' repeat the natural key of an earlier row, so its unique index "
+            f"cannot be created. Run 'python data_deduplicate.py' to see the rows that would be merged, "
+            f"and 'python data_deduplicate.py --apply' to merge them."
+        )
+    cursor.execute(f"CREATE UNIQUE INDEX {index_name} ON {table} ({UNIQUE_KEYS[table]})")
+
+def merge_duplicate_rows(conn: psycopg2.extensions.connection, apply: bool = False) -> Dict[str, int]:
+    """
+    Merges the rows loaded before the natural key indexes existed that duplicate an earlier row,
+    and creates the indexes. The first row of each key is kept, the references to the other
+    ones are pointed to it, and they are deleted.
+
+    Parameters:
+    ----------
+    conn : psycopg2.extensions.connection
+        Connection to the PostgreSQL database.
+    apply : bool
+        If False, the merge is rolled back and only the number of rows it would delete is returned.
+
+    Returns:
+    -------
+    Dict[str, int]
+        Number of duplicated rows of each existing table, merged if `apply`.
+    """
+    merged = {}
+    try:
+        with conn.cursor() as cursor:
+            for table, (id_column, references) in NATURAL_KEY_TABLES.items():
+                cursor.execute("SELECT to_regclass(%s)", (table,))
+                if cursor.fetchone()[0] is None:
+                    continue
+                # counted after the tables it references are merged, so their duplicates are included
+                merged[table] = _count_duplicates(cursor, table)
+                if merged[table]:
+                    ranked = _ranked_duplicates(table)
+                    for reference_table, reference_column in references:
+                        cursor.execute("SELECT to_regclass(%s)", (reference_table,))
+                        if cursor.fetchone()[0] is None:
+                            continue
+                        cursor.execute(
+                            f"""
+                            UPDATE {reference_table} SET {reference_column} = ranked.kept_id FROM ({ranked}) AS ranked
+                            WHERE {reference_table}.{reference_column} = ranked.duplicate_id AND ranked.duplicate_id <> ranked.kept_id
+                            """
+                        )
+                    cursor.execute(f"DELETE FROM {table} WHERE {id_column} IN (SELECT duplicate_id FROM ({ranked}) AS ranked WHERE duplicate_id <> kept_id)")
+                _create_unique_index(cursor, table)
+    except BaseException:
+        conn.rollback()
+        raise
+    if apply:
+        conn.commit()
+    else:
+        conn.rollback()
+    return merged
+
+def _commit(conn: psycopg2.extensions.connection) -> None:
+    # inside a unit of work, the transaction is committed by it
+    if active_unit_of_work(conn) is None:
+        conn.commit()
 
 def drop_all_tables(conn: psycopg2.extensions.connection) -> None:
     """
@@ -26,10 +167,15 @@ def drop_all_tables(conn: psycopg2.extensions.connection) -> None:
             "DROP TABLE IF EXISTS products, categories, subcategories, prices, supermarkets, supermarkets_products, brands CASCADE;"
         )
         conn.commit()
+    # the cached IDs belong to the dropped rows
+    dimension_cache = get_dimension_cache()
+    if dimension_cache is not None:
+        dimension_cache.clear()
 
 def create_all_tables(conn: psycopg2.extensions.connection) -> None:
     """
     Creates all tables in the database by calling specific creation functions.
+    Tables that already exist are kept, so the function can be used before incremental loads.
 
     Parameters:
     ----------
@@ -56,12 +202,13 @@ def create_categories(conn: psycopg2.extensions.connection) -> None:
     with conn.cursor() as cursor:
         cursor.execute(
             """
-            CREATE TABLE categories (
+            CREATE TABLE IF NOT EXISTS categories (
                 category_id SERIAL PRIMARY KEY,
                 category_name VARCHAR(100) NOT NULL
             );
             """
         )
+        _create_unique_index(cursor, "categories")
         conn.commit()
 
 def create_subcategories(conn: psycopg2.extensions.connection) -> None:
@@ -76,7 +223,7 @@ def create_subcategories(conn: psycopg2.extensions.connection) -> None:
     with conn.cursor() as cursor:
         cursor.execute(
             """
-            CREATE TABLE subcategories (
+            CREATE TABLE IF NOT EXISTS subcategories (
                 subcategory_id SERIAL PRIMARY KEY,
                 category_id INT REFERENCES categories(category_id) ON DELETE CASCADE ON UPDATE CASCADE,
                 subcategory_name VARCHAR(100) NOT NULL,
@@ -85,6 +232,7 @@ def create_subcategories(conn: psycopg2.extensions.connection) -> None:
             );
             """
         )
+        _create_unique_index(cursor, "subcategories")
         conn.commit()
 
 def create_brands(conn: psycopg2.extensions.connection) -> None:
@@ -99,12 +247,13 @@ def create_brands(conn: psycopg2.extensions.connection) -> None:
     with conn.cursor() as cursor:
         cursor.execute(
             """
-            CREATE TABLE brands (
+            CREATE TABLE IF NOT EXISTS brands (
                 brand_id SERIAL PRIMARY KEY,
                 brand_name VARCHAR(100) NOT NULL
             );
             """
         )
+        _create_unique_index(cursor, "brands")
         conn.commit()
 
 def create_products(conn: psycopg2.extensions.connection) -> None:
@@ -119,7 +268,7 @@ def create_products(conn: psycopg2.extensions.connection) -> None:
     with conn.cursor() as cursor:
         cursor.execute(
             """
-            CREATE TABLE products (
+            CREATE TABLE IF NOT EXISTS products (
                 product_id SERIAL PRIMARY KEY,
                 brand_id INT REFERENCES brands(brand_id) ON DELETE SET NULL ON UPDATE CASCADE,
                 subcategory_id INT REFERENCES subcategories(subcategory_id) ON DELETE SET NULL ON UPDATE CASCADE,
@@ -130,6 +279,7 @@ def create_products(conn: psycopg2.extensions.connection) -> None:
             );
             """
         )
+        _create_unique_index(cursor, "products")
         conn.commit()
 
 def create_supermarkets(conn: psycopg2.extensions.connection) -> None:
@@ -144,12 +294,13 @@ def create_supermarkets(conn: psycopg2.extensions.connection) -> None:
     with conn.cursor() as cursor:
         cursor.execute(
             """
-            CREATE TABLE supermarkets (
+            CREATE TABLE IF NOT EXISTS supermarkets (
                 supermarket_id SERIAL PRIMARY KEY,
                 supermarket_name VARCHAR(100) NOT NULL
             );
             """
         )
+        _create_unique_index(cursor, "supermarkets")
         conn.commit()
 
 def create_supermarkets_products(conn: psycopg2.extensions.connection) -> None:
@@ -164,15 +315,19 @@ def create_supermarkets_products(conn: psycopg2.extensions.connection) -> None:
     with conn.cursor() as cursor:
         cursor.execute(
             """
-            CREATE TABLE supermarkets_products (
+            CREATE TABLE IF NOT EXISTS supermarkets_products (
                 supermarket_product_id SERIAL PRIMARY KEY,
                 supermarket_id INT REFERENCES supermarkets(supermarket_id) ON DELETE CASCADE ON UPDATE CASCADE,
                 product_id INT REFERENCES products(product_id) ON DELETE CASCADE ON UPDATE CASCADE,
                 facua_url VARCHAR(255),
-                product_name_supermarket VARCHAR(200)
+                product_name_supermarket VARCHAR(200),
+                content_hash CHAR(64)
             );
             """
         )
+        # databases created before incremental loads lack the page hash column
+        cursor.execute("ALTER TABLE supermarkets_products ADD COLUMN IF NOT EXISTS content_hash CHAR(64);")
+        _create_unique_index(cursor, "supermarkets_products")
         conn.commit()
 
 def create_prices(conn: psycopg2.extensions.connection) -> None:
@@ -187,7 +342,7 @@ def create_prices(conn: psycopg2.extensions.connection) -> None:
     with conn.cursor() as cursor:
         cursor.execute(
             """
-            CREATE TABLE prices (
+            CREATE TABLE IF NOT EXISTS prices (
                 price_id SERIAL PRIMARY KEY,
                 supermarket_product_id INT REFERENCES supermarkets_products(supermarket_product_id) ON DELETE CASCADE ON UPDATE CASCADE,
                 date DATE NOT NULL,
@@ -195,8 +350,46 @@ def create_prices(conn: psycopg2.extensions.connection) -> None:
             );
             """
         )
+        # replaced by the unique index of the product and date
+        cursor.execute("DROP INDEX IF EXISTS prices_product_date_idx;")
+        _create_unique_index(cursor, "prices")
         conn.commit()
 
+def _insert_or_select_id(conn: psycopg2.extensions.connection, table: str, values: Tuple) -> int:
+    """
+    Inserts a row of a dimension table and returns its ID, or the ID of the row with the same natural key.
+
+    `ON CONFLICT DO NOTHING` leaves an existing row untouched, without the new row version and
+    WAL record an update to itself would write; its ID is then read by a second statement.
+    """
+    id_column, columns = DIMENSIONS[table]
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})
+            ON CONFLICT ({UNIQUE_KEYS[table]}) DO NOTHING
+            RETURNING {id_column}
+            """,
+            values
+        )
+        row = cursor.fetchone()
+        if row is None:
+            # missing values compared through the sentinels of the unique index
+            conditions, parameters = [], []
+            for column, value in zip(columns, values):
+                if column in NULL_VALUES:
+                    conditions.append(f"COALESCE({column}, %s) = COALESCE(%s, %s)")
+                    parameters += [NULL_VALUES[column], value, NULL_VALUES[column]]
+                else:
+                    conditions.append(f"{column} = %s")
+                    parameters.append(value)
+            cursor.execute(f"SELECT {id_column} FROM {table} WHERE {' AND '.join(conditions)}", parameters)
+            row = cursor.fetchone()
+        _commit(conn)
+    return row[0]
+
+@timed("insert_brand")
+@cached_dimension("brands")
 def insert_brand(conn: psycopg2.extensions.connection, brand_name: str) -> int:
     """
     Inserts a new brand or returns an existing brand ID.
@@ -213,22 +406,10 @@ def insert_brand(conn: psycopg2.extensions.connection, brand_name: str) -> int:
     int
         The ID of the brand.
     """
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT brand_id FROM brands WHERE brand_name = %s", (brand_name,))
-        brand_id = cursor.fetchone()
-        
-        if not brand_id:
-            cursor.execute(
-                "INSERT INTO brands (brand_name) VALUES (%s) RETURNING brand_id",
-                (brand_name,)
-            )
-            brand_id = cursor.fetchone()[0]
-            conn.commit()
-        else:
-            brand_id = brand_id[0]
-    
-    return brand_id
+    return _insert_or_select_id(conn, "brands", (brand_name,))
 
+@timed("insert_category")
+@cached_dimension("categories")
 def insert_category(conn: psycopg2.extensions.connection, category_name: str) -> int:
     """
     Inserts a new category or returns an existing category ID.
@@ -245,22 +426,10 @@ def insert_category(conn: psycopg2.extensions.connection, category_name: str) ->
     int
         The ID of the category.
     """
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT category_id FROM categories WHERE category_name = %s", (category_name,))
-        category_id = cursor.fetchone()
-        
-        if not category_id:
-            cursor.execute(
-                "INSERT INTO categories (category_name) VALUES (%s) RETURNING category_id",
-                (category_name,)
-            )
-            category_id = cursor.fetchone()[0]
-            conn.commit()
-        else:
-            category_id = category_id[0]
-    
-    return category_id
+    return _insert_or_select_id(conn, "categories", (category_name,))
 
+@timed("insert_subcategory")
+@cached_dimension("subcategories")
 def insert_subcategory(conn: psycopg2.extensions.connection, subcategory_name: str, category_id: int, distinction: Optional[str] = None, eco: bool = False) -> int:
     """
     Inserts a new subcategory or returns an existing subcategory ID.
@@ -283,31 +452,10 @@ def insert_subcategory(conn: psycopg2.extensions.connection, subcategory_name: s
     int
         The ID of the subcategory.
     """
-    with conn.cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT subcategory_id FROM subcategories 
-            WHERE subcategory_name = %s AND category_id = %s AND distinction = %s AND eco = %s
-            """,
-            (subcategory_name, category_id, distinction, eco)
-        )
-        subcategory_id = cursor.fetchone()
-        
-        if not subcategory_id:
-            cursor.execute(
-                """
-                INSERT INTO subcategories (subcategory_name, category_id, distinction, eco)
-                VALUES (%s, %s, %s, %s) RETURNING subcategory_id
-                """,
-                (subcategory_name, category_id, distinction, eco)
-            )
-            subcategory_id = cursor.fetchone()[0]
-            conn.commit()
-        else:
-            subcategory_id = subcategory_id[0]
-    
-    return subcategory_id
+    return _insert_or_select_id(conn, "subcategories", (subcategory_name, category_id, distinction, eco))
 
+@timed("insert_supermarket")
+@cached_dimension("supermarkets")
 def insert_supermarket(conn: psycopg2.extensions.connection, supermarket_name: str) -> int:
     """
     Inserts a new supermarket or returns an existing supermarket ID.
@@ -324,22 +472,10 @@ def insert_supermarket(conn: psycopg2.extensions.connection, supermarket_name: s
     int
         The ID of the supermarket.
     """
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT supermarket_id FROM supermarkets WHERE supermarket_name = %s", (supermarket_name,))
-        supermarket_id = cursor.fetchone()
-        
-        if not supermarket_id:
-            cursor.execute(
-                "INSERT INTO supermarkets (supermarket_name) VALUES (%s) RETURNING supermarket_id",
-                (supermarket_name,)
-            )
-            supermarket_id = cursor.fetchone()[0]
-            conn.commit()
-        else:
-            supermarket_id = supermarket_id[0]
-    
-    return supermarket_id
+    return _insert_or_select_id(conn, "supermarkets", (supermarket_name,))
 
+@timed("insert_product")
+@cached_dimension("products")
 def insert_product(conn: psycopg2.extensions.connection, brand_id: Optional[int], subcategory_id: Optional[int], product_name_norm: str, quantity: Optional[float], units: Optional[str], volume_weight: Optional[float]) -> int:
     """
     Inserts a new product or returns an existing product ID.
@@ -366,32 +502,10 @@ def insert_product(conn: psycopg2.extensions.connection, brand_id: Optional[int]
     int
         The ID of the product.
     """
-    with conn.cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT product_id FROM products 
-            WHERE product_name_norm = %s AND brand_id = %s AND subcategory_id = %s 
-            AND quantity = %s AND units = %s AND volume_weight = %s
-            """, 
-            (product_name_norm, brand_id, subcategory_id, quantity, units, volume_weight)
-        )
-        product_id = cursor.fetchone()
-        
-        if not product_id:
-            cursor.execute(
-                """
-                INSERT INTO products (brand_id, subcategory_id, product_name_norm, quantity, units, volume_weight)
-                VALUES (%s, %s, %s, %s, %s, %s) RETURNING product_id
-                """,
-                (brand_id, subcategory_id, product_name_norm, quantity, units, volume_weight)
-            )
-            product_id = cursor.fetchone()[0]
-            conn.commit()
-        else:
-            product_id = product_id[0]
-    
-    return product_id
+    return _insert_or_select_id(conn, "products", (brand_id, subcategory_id, product_name_norm, quantity, units, volume_weight))
 
+@timed("insert_supermarket_product")
+@cached_dimension("supermarkets_products")
 def insert_supermarket_product(conn: psycopg2.extensions.connection, supermarket_id: int, product_id: int, facua_url: str, product_name_supermarket: str) -> int:
     """
     Inserts a new supermarket-product or returns an existing ID.
@@ -414,65 +528,152 @@ def insert_supermarket_product(conn: psycopg2.extensions.connection, supermarket
     int
         The ID of the supermarket-product.
     """
+    return _insert_or_select_id(conn, "supermarkets_products", (supermarket_id, product_id, facua_url, product_name_supermarket))
+
+@timed("insert_price")
+def insert_price(conn: psycopg2.extensions.connection, price_table_data: List[Tuple[int, str, float]]) -> Tuple[int, int]:
+    """
+    Inserts prices into the 'prices' table, avoiding duplicates.
+
+    The rows are streamed with COPY to a temporary staging table, and moved to 'prices' by a
+    single INSERT that skips, on the server, the (supermarket_product_id, date) pairs already
+    stored or repeated in the batch. The first price of a repeated pair is kept.
+
+    Parameters:
+    ----------
+    conn : psycopg2.extensions.connection
+        Connection to the PostgreSQL database.
+    price_table_data : List[Tuple[int, str, float]]
+        List of tuples containing supermarket_product_id, date, and price_amount. Missing,
+        NaN and infinite prices are not inserted, and counted as invalid in `get_price_load_stats`.
+
+    Returns:
+    -------
+    Tuple[int, int]
+        Number of prices inserted and number of duplicates skipped.
+    """
+    # tab separated rows in the COPY text format; a missing, NaN or infinite price would be
+    # stored as NaN or Infinity, or break the NOT NULL constraint, so it is left out
+    rows = io.StringIO()
+    written = 0
+    for position, (supermarket_product_id, date, price_amount) in enumerate(price_table_data):
+        if price_amount is None or not math.isfinite(price_amount):
+            continue
+        rows.write(f"{position}\t{supermarket_product_id}\t{date}\t{float(price_amount)!r}\n")
+        written += 1
+    invalid = len(price_table_data) - written
+    if not written:
+        _count_prices(conn, 0, 0, invalid)
+        return 0, 0
+    rows.seek(0)
+
     with conn.cursor() as cursor:
         cursor.execute(
             """
-            SELECT supermarket_product_id FROM supermarkets_products 
-            WHERE supermarket_id = %s AND product_id = %s 
-            AND facua_url = %s AND product_name_supermarket = %s
-            """,
-            (supermarket_id, product_id, facua_url, product_name_supermarket)
+            CREATE TEMP TABLE IF NOT EXISTS prices_staging (
+                position INT,
+                supermarket_product_id INT,
+                date DATE,
+                price_amount NUMERIC(10, 2)
+            ) ON COMMIT DELETE ROWS;
+            """
+        )
+        # rows of a previous batch of the same transaction
+        cursor.execute("TRUNCATE prices_staging;")
+        cursor.copy_expert("COPY prices_staging (position, supermarket_product_id, date, price_amount) FROM STDIN", rows)
+        cursor.execute(
+            f"""
+            INSERT INTO prices (supermarket_product_id, date, price_amount)
+            SELECT supermarket_product_id, date, price_amount
+            FROM prices_staging
+            ORDER BY position
+            ON CONFLICT ({UNIQUE_KEYS['prices']}) DO NOTHING
+            """
         )
-        supermarket_product_id = cursor.fetchone()
-        
-        if not supermarket_product_id:
-            cursor.execute(
-                """
-                INSERT INTO supermarkets_products (supermarket_id, product_id, facua_url, product_name_supermarket)
-                VALUES (%s, %s, %s, %s) RETURNING supermarket_product_id
-                """,
-                (supermarket_id, product_id, facua_url, product_name_supermarket)
-            )
-            supermarket_product_id = cursor.fetchone()[0]
-            conn.commit()
-        else:
-            supermarket_product_id = supermarket_product_id[0]
-    
-    return supermarket_product_id
-
-def insert_price(conn: psycopg2.extensions.connection, price_table_data: List[Tuple[int, str, float]]) -> None:
+        inserted = cursor.rowcount
+        _commit(conn)
+
+    skipped = written - inserted
+    _count_prices(conn, inserted, skipped, invalid)
+    return inserted, skipped
+
+def _count_prices(conn: psycopg2.extensions.connection, inserted: int, skipped: int, invalid: int) -> None:
+    # inside a unit of work, the prices are counted once committed: a rolled back savepoint drops them with its rows
+    unit_of_work = active_unit_of_work(conn)
+    if unit_of_work is not None:
+        unit_of_work.after_commit(partial(_add_price_stats, inserted, skipped, invalid))
+    else:
+        _add_price_stats(inserted, skipped, invalid)
+
+def _add_price_stats(inserted: int, skipped: int, invalid: int) -> None:
+    with _price_stats_lock:
+        _price_stats["inserted"] += inserted
+        _price_stats["skipped"] += skipped
+        _price_stats["invalid"] += invalid
+
+def get_price_load_stats() -> Dict[str, int]:
     """
-    Inserts prices into the 'prices' table, avoiding duplicates.
+    Returns the number of prices inserted, of duplicates skipped and of invalid prices left out since the last reset.
+    Inside a unit of work, only the committed prices are counted.
+    """
+    with _price_stats_lock:
+        return dict(_price_stats)
+
+def reset_price_load_stats() -> None:
+    """
+    Sets the price load counters back to zero, at the start of a run.
+    """
+    with _price_stats_lock:
+        _price_stats.update(inserted=0, skipped=0, invalid=0)
+
+def get_crawl_state(conn: psycopg2.extensions.connection) -> Dict[str, Tuple[Optional[date], Optional[str]]]:
+    """
+    Retrieves the latest stored price date and the last seen page hash for each product URL.
 
     Parameters:
     ----------
     conn : psycopg2.extensions.connection
         Connection to the PostgreSQL database.
-    price_table_data : List[Tuple[int, str, float]]
-        List of tuples containing supermarket_product_id, date, and price_amount.
+
+    Returns:
+    -------
+    Dict[str, Tuple[Optional[date], Optional[str]]]
+        Mapping of facua_url to a tuple of latest price date and page content hash.
     """
     with conn.cursor() as cursor:
-        for supermarket_product_id, date, price_amount in price_table_data:
-            cursor.execute(
-                """
-                SELECT price_id FROM prices 
-                WHERE supermarket_product_id = %s AND date = %s
-                """,
-                (supermarket_product_id, date)
-            )
-            price_id = cursor.fetchone()
-            
-            if not price_id:
-                cursor.execute(
-                    """
-                    INSERT INTO prices (supermarket_product_id, date, price_amount)
-                    VALUES (%s, %s, %s)
-                    """,
-                    (supermarket_product_id, date, price_amount)
-                )
-        conn.commit()
+        cursor.execute(
+            """
+            SELECT sp.facua_url, MAX(p.date), MAX(sp.content_hash)
+            FROM supermarkets_products sp
+            LEFT JOIN prices p ON p.supermarket_product_id = sp.supermarket_product_id
+            GROUP BY sp.facua_url
+            """
+        )
+        return {facua_url: (latest_date, content_hash) for facua_url, latest_date, content_hash in cursor.fetchall()}
+
+@timed("update_content_hash")
+def update_content_hash(conn: psycopg2.extensions.connection, supermarket_product_id: int, content_hash: str) -> None:
+    """
+    Stores the hash of the last loaded page of a supermarket-product.
 
-def save_to_csv(df: pd.DataFrame, supermarket_name: Optional[str] = None, category_name: Optional[str] = None, product_name: Optional[str] = None, final: bool = False) -> None:
+    Parameters:
+    ----------
+    conn : psycopg2.extensions.connection
+        Connection to the PostgreSQL database.
+    supermarket_product_id : int
+        ID of the supermarket-product.
+    content_hash : str
+        SHA-256 hex digest of the page content.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "UPDATE supermarkets_products SET content_hash = %s WHERE supermarket_product_id = %s",
+            (content_hash, supermarket_product_id)
+        )
+        _commit(conn)
+
+@timed("save_to_csv")
+def save_to_csv(df: pd.DataFrame, supermarket_name: Optional[str] = None, category_name: Optional[str] = None, product_name: Optional[str] = None, final: bool = False, append: bool = False, output_dir: str = EXTRACTED_DIR, file_name: str = CSV_NAME) -> None:
     """
     Saves a DataFrame to a CSV file in a structured path.
 
@@ -488,12 +689,143 @@ def save_to_csv(df: pd.DataFrame, supermarket_name: Optional[str] = None, catego
         Product name (for file name).
     final : bool
         If True, saves to the final consolidated path.
+    append : bool
+        If True, appends the rows to an existing file instead of overwriting it.
+    output_dir : str
+        Root folder of the extracted data.
+    file_name : str
+        Name of the consolidated file, if final.
     """
-    base_path = os.path.dirname(os.path.abspath(__file__))
-    
     if not final:
-        dir_path = os.path.join(base_path, '../../data/extracted/', supermarket_name, category_name)
+        dir_path = os.path.join(output_dir, supermarket_name, category_name)
         os.makedirs(dir_path, exist_ok=True)
-        df.to_csv(f'{dir_path}/{product_name}.csv', index=False)
+        file_path = f'{dir_path}/{product_name}.csv'
     else:
-        df.to_csv(f'{base_path}/../../data/extracted/facua_extracted_auto.csv', index=False)
+        os.makedirs(output_dir, exist_ok=True)
+        file_path = f'{output_dir}/{file_name}'
+
+    # dates keep the 'dd/mm/yyyy' format of FACUA, so appended rows match the ones already saved
+    # (date_format does not apply to date32 columns, so they are formatted here)
+    date_columns = [column for column in df.columns if df[column].dtype.kind == "M"]
+    if date_columns:
+        df = df.assign(**{column: df[column].dt.strftime("%d/%m/%Y") for column in date_columns})
+
+    if append and os.path.exists(file_path):
+        df.to_csv(file_path, mode="a", header=False, index=False)
+    else:
+        df.to_csv(file_path, index=False)
+
+
+class TableAccumulator:
+    """
+    Collects the price table of each product and consolidates them once at the end,
+    instead of concatenating every new table to everything collected so far.
+
+    With `stream` the tables are also appended to the consolidated CSV file as they
+    arrive, so with `keep=False` memory stays flat however large the catalogue is. Unless
+    appending, they are streamed to a temporary file that replaces the previous one on `save`
+    and is deleted by `abort`, so an interrupted run keeps the previous file.
+    With the parquet output format, the tables are always streamed to a Parquet dataset
+    partitioned by supermarket and category, which replaces the CSV files.
+
+    Parameters:
+    ----------
+    output_dir : str
+        Root folder of the extracted data, where the consolidated CSV file is written.
+    append : bool
+        If True, rows are appended to the existing consolidated file instead of replacing it.
+    stream : bool
+        If True, each table is written to the consolidated file when it is added.
+    keep : bool
+        If True, the tables are kept in memory to be returned by `consolidate`.
+    output_format : str
+        'csv' or 'parquet'.
+    """
+
+    def __init__(self, output_dir: str = EXTRACTED_DIR, append: bool = False, stream: bool = False, keep: bool = True,
+                 output_format: str = "csv") -> None:
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {output_format!r}, expected one of {OUTPUT_FORMATS}")
+        if output_format == "parquet" and not parquet_available():
+            raise ImportError("pyarrow is required for the parquet output format, install it or use the csv format")
+        self.output_dir = output_dir
+        self.append = append
+        self.stream = stream
+        self.keep = keep
+        self.output_format = output_format
+        self.rows = 0
+        self.bytes = 0
+        self._tables: List[pd.DataFrame] = []
+        self._written = False
+        self._csv_name = CSV_NAME if append else f"{CSV_NAME}.tmp-{uuid.uuid4().hex[:12]}"
+        self._dataset: Optional[ParquetDatasetWriter] = None
+
+    def add(self, df: pd.DataFrame) -> None:
+        """
+        Adds the price table of a product.
+        """
+        if df.empty:
+            return
+        self.rows += len(df)
+        self.bytes += table_memory_usage(df)["bytes"]
+        if self.output_format == "parquet":
+            self.dataset.write(df)
+        elif self.stream:
+            save_to_csv(df, final=True, append=self.append or self._written, output_dir=self.output_dir,
+                        file_name=self._csv_name)
+            self._written = True
+        if self.keep:
+            self._tables.append(df)
+
+    @property
+    def dataset(self) -> ParquetDatasetWriter:
+        """
+        Writer of the Parquet dataset, created with the first table.
+        """
+        if self._dataset is None:
+            self._dataset = ParquetDatasetWriter(os.path.join(self.output_dir, DATASET_NAME), append=self.append)
+        return self._dataset
+
+    def consolidate(self) -> pd.DataFrame:
+        """
+        Returns every kept table as one DataFrame with the compact schema, concatenated once.
+        """
+        df = apply_table_schema(concat_tables(self._tables))
+        self._tables = [df] if len(df.columns) else []
+        return df
+
+    def save(self) -> None:
+        """
+        Writes the consolidated CSV file, unless the tables were streamed to it, or completes
+        the Parquet dataset. An incremental load without new rows leaves the existing output untouched.
+        """
+        if self.output_format == "parquet":
+            if self._dataset is not None or not self.append:
+                self.dataset.close()
+            return
+        if self.stream:
+            if not self.append:
+                if not self._written:
+                    save_to_csv(pd.DataFrame(), final=True, output_dir=self.output_dir, file_name=self._csv_name)
+                os.replace(os.path.join(self.output_dir, self._csv_name), os.path.join(self.output_dir, CSV_NAME))
+                self._written = False
+            return
+        df = self.consolidate()
+        if not (self.append and df.empty):
+            save_to_csv(df, final=True, append=self.append, output_dir=self.output_dir)
+
+    def dataset_stats(self) -> Dict[str, int]:
+        """
+        Returns the rows, files and bytes written to the Parquet dataset, or an empty dict if none was written.
+        """
+        return self._dataset.stats() if self._dataset is not None else {}
+
+    def abort(self) -> None:
+        """
+        Discards a Parquet dataset or a consolidated CSV file being built, leaving the previous one in place.
+        """
+        if self._dataset is not None:
+            self._dataset.abort()
+        if self._written and not self.append:
+            os.remove(os.path.join(self.output_dir, self._csv_name))
+            self._written = False
@@ -5,10 +5,42 @@ import numpy as np
 # regular expressions
 import re 
 
+import json
+import time
+import hashlib
+
 from unidecode import unidecode
 
 from datetime import datetime
 
+# functions typing
+from typing import Dict, List, Sequence, Tuple, Union
+
+# optional: dates stored as 4-byte date32 instead of 8-byte datetime64
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from .keyword_matching_support import BrandMatcher
+from .attribute_cache_support import AttributeCache
+from .metrics_support import get_metrics
+from .category_rules_support import (
+    CATEGORY_RULES, DEFAULT_SUBCATEGORY, ECO_KEYWORDS, NAME_REPLACEMENTS, UNIT_ABBREVIATIONS, UNIT_BASES, UNIT_MAGNITUDES,
+    get_category_rules, normalize_product_name
+)
+
+
+# quantity patterns of each category, kept for callers of the previous module constants
+QUANTITY_PATTERNS = {category: rules["quantity_pattern"] for category, rules in CATEGORY_RULES.items()}
+
+# columns returned by get_products_info, in the order of the get_product_info tuple
+PRODUCT_INFO_COLUMNS = [
+    "product_name", "brand_name", "quantity", "volume_weight", "units", "subcategory",
+    "distinction", "eco", "category_name", "supermarket_name"
+]
+
+
 def sanitize_filename(filename):
     """
     Sanitizes a string by removing invalid characters, so it can be used inside a filename.
@@ -43,85 +75,13 @@ def extract_quantity_from_product_name(product_name, category_name):
     tuple
         A tuple containing the quantity, magnitude, units, and the modified product name.
     """
-    patterns = {
-        "aceite_de_oliva" : r"(\d+(?:[.,]\d+)?\s?(?:l|litros?|ml|mililitros?))",
-        "aceite_de_girasol": r"(\d+(?:[.,]\d+)?\s?(?:l|litros?|ml|mililitros?))",
-        "leche" : r"(\d+(?:[.,]\d+)?\s?(?:l|litros?|ml|g|gr|cl|g)|\d+\s?(?:uds\.?|botes|x)\s?\d+(?:[.,]\d+)?\s?(?:l|ml|g|gr|cl|g))"
-    }
-
-    replacements = {
-        " unidades de ": " x ",
-        " uds. x ": " x ",
-        " uds. ": " x ",
-        " briks de ": " x ",
-        " botellas de ": " x ",
-        "tabla de precios por dia para ": "",
-        "comparativa de precios por dia para ": ""
-    }
-
-    product_name = product_name.lower()
-
-
-    for old, new in replacements.items():
-        product_name = product_name.replace(old, new)
-
-
-
-    conversions_abbr = {
-        "gramos": "g",
-        "kilogramos": "kg",
-        "miligramo": "mg",
-        "miligramos": "mg",
-        "litros": "l",
-        "litro": "l",
-        "mililitro": "ml",
-        "mililitros": "ml",
-        "centilitro": "cl",
-        "centilitros": "cl"
-        }
-
-    conversions_magnitude = {'g': 1, 'kg': 1000, 'mg': 0.001, 'l': 1, 'ml': 0.001, 'cl': 0.01}
-    conversions_unit = {'g': 'g', 'kg': 'g', 'mg': 'g', 'l': 'l', 'ml': 'l', 'cl': 'l'}
-
-    try:
-        quantity_magnitude_unit = re.findall(patterns[category_name], product_name)[0]
-        quantity = re.findall(r"(\d+)\s?x", quantity_magnitude_unit)[0]
-    except:
-        quantity = 1
-
-    try:
-        units = re.findall(r"\d\s?(\w{1,2})$", quantity_magnitude_unit)[0]
-        units = conversions_abbr.get(units,units)
-    except:
-        units = None
-
-    try:
-        magnitude = re.findall(r"(?:\d\s?x\s?)?(\d?\.?\d+)\s?\w{1,2}?", quantity_magnitude_unit.replace(",","."))[0]
-    except:
-        magnitude = 1
-
-    magnitude = float(magnitude) * conversions_magnitude.get(units, 1)
-    units = conversions_unit.get(units, None)
+    product_name = normalize_product_name(product_name)
+    quantity, magnitude, units = get_category_rules(category_name).extract_quantity(product_name)
 
     return quantity, magnitude, units, product_name
 
 
-def extract_brand(product_name):
-    """
-    Extracts the brand name from a product name using predefined brand 
-    and normalization lists.
-
-    Parameters:
-    ----------
-    product_name : str
-        The name of the product to extract the brand from.
-
-    Returns:
-    -------
-    str
-        The extracted and normalized brand name, or 'otras' if no brand is identified.
-    """
-    brands = ['primer dia de cosecha', 'mendia',
+BRANDS = ['primer dia de cosecha', 'mendia',
     'natursoy', 'l.r.', 'nunez de prado', 'laban', 'ram', 'hojiblanca', 'oleodiel', "l'estornell", 'president', 
     'la masia', 'la laguna', 'aromas del sur', 'carbonel', 'feiraco', 'carrefour', 'kaiku', 'suroliva', 'ferrarini', 
     'el buen pastor', 'de nuestra tierra', 'aceites de ardales', 'priegola', 'montbelle', 'alhema de queiles', 
@@ -145,29 +105,60 @@ def extract_brand(product_name):
     'la redonda', 'olibeas', 'abaco', 'nivea', 'letona', 'santa gadea', 'monegros', 'asturiana', 'rio', 'llet nostra', 
     'danone', 'la espanola', 'castillo de canena', 'valles unidos', 'unio', 'oleaurum', 'senorio de segura', 'ultzama', 
     'el castillo', 'dia'
-    ]
-
-    brands = sorted(brands, key=len, reverse=True)
-
-    normalizations = {
-        "k arginano": "karlos arguinano",
-        "k. arguinano": "karlos arguinano",
-        "karlos arguinano": "karlos arguinano",
-        "carbonel": "carbonell",
-        "el molino d gines": "el molino de gines",
-        "la española": "la espanola",
-        "oleo cazorla": "oleocazorla",
-        "coop": "dcoop",
-        "arrolan": "arrolan",
-        "oleaestepa": "oleoestepa",
-        "bailén": "oro bailen"
-    }
-
-    for brand in brands:
-        if brand in product_name:
-            return normalizations.get(brand,brand)
-    else:
-        return "otras"
+]
+
+BRAND_NORMALIZATIONS = {
+    "k arginano": "karlos arguinano",
+    "k. arguinano": "karlos arguinano",
+    "karlos arguinano": "karlos arguinano",
+    "carbonel": "carbonell",
+    "el molino d gines": "el molino de gines",
+    "la española": "la espanola",
+    "oleo cazorla": "oleocazorla",
+    "coop": "dcoop",
+    "arrolan": "arrolan",
+    "oleaestepa": "oleoestepa",
+    "bailén": "oro bailen"
+}
+
+# built once: matching cost depends on the length of the name, not on the number of brands
+_brand_matcher = BrandMatcher(BRANDS, BRAND_NORMALIZATIONS)
+
+
+def extract_brand(product_name):
+    """
+    Extracts the brand name from a product name using predefined brand 
+    and normalization lists.
+
+    Parameters:
+    ----------
+    product_name : str
+        The name of the product to extract the brand from.
+
+    Returns:
+    -------
+    str
+        The extracted and normalized brand name, or 'otras' if no brand is identified.
+    """
+    return _brand_matcher.match(product_name)
+
+
+def extract_brands(product_names):
+    """
+    Extracts the brand names of a whole column of product names in one pass.
+
+    Parameters:
+    ----------
+    product_names : pd.Series or iterable of str
+        The names of the products to extract the brands from.
+
+    Returns:
+    -------
+    pd.Series or list of str
+        The brand of each product name, as `extract_brand` would return it.
+    """
+    return _brand_matcher.match_many(product_names)
+
 
 # Parent function, children below
 def get_subcategory_distinction(product_name, category):
@@ -187,10 +178,7 @@ def get_subcategory_distinction(product_name, category):
     tuple
         A tuple containing subcategory, distinction, and eco status.
     """
-    distinction, eco = extract_distinction_eco(product_name, category)
-    subcategory = extract_subcategory(product_name, category, distinction)
-
-    return subcategory, distinction, eco
+    return get_category_rules(category).classify(product_name)
 
 
 def extract_distinction_eco(product_name, category):
@@ -210,35 +198,12 @@ def extract_distinction_eco(product_name, category):
     tuple
         A tuple containing the distinction string and a boolean indicating eco status.
     """
-    # cannot be inserted as np.nan so start blank
-    distinction = ""
-
-    if category == "leche":
-        if "semidesnatada" in product_name:
-            distinction = "semidesnatada"
-        elif "desnatada" in product_name:
-            distinction = "desnatada"
-        elif "entera" in product_name:
-            distinction = "entera"
-
-        if not pd.isna(distinction) and "lactosa" in product_name:
-            distinction += " sin lactosa"
-        if not pd.isna(distinction) and "calcio" in product_name:
-            distinction += " calcio"       
-        if not pd.isna(distinction) and "proteinas" in product_name:
-            distinction += " proteinas"
-        if not pd.isna(distinction) and "fresca" in product_name:
-            distinction += " fresca"
-
-    if " eco " in product_name or "ecologic" in product_name:
-        eco = True
-    else:
-        eco = False
-
+    # cannot be inserted as np.nan, so products without distinction get a blank one
+    _, distinction, eco = get_category_rules(category).classify(product_name)
     return distinction, eco
 
 
-def extract_subcategory(product_name, category):
+def extract_subcategory(product_name, category, distinction=None):
     """
     Determines the subcategory of a product based on its name and category.
 
@@ -248,51 +213,110 @@ def extract_subcategory(product_name, category):
         The name of the product.
     category : str
         The category of the product.
-    distinction : str
-        Any distinction found for the product.
+    distinction : str, optional
+        Any distinction found for the product. Currently not used to decide the subcategory.
 
     Returns:
     -------
     str
         The subcategory of the product.
     """
-    if category == "aceite_de_girasol":
-        if "freir" in product_name:
-            subcategory = "freir"
-        else:
-            subcategory = "normal"
-
-
-    elif category == "aceite_de_oliva" and "en aceite" not in product_name and "con aceite" not in product_name:
-        if "virgen extra" in product_name:
-            subcategory = "virgen extra"
-        elif "virgen"  in product_name:
-            subcategory = "virgen"
-        elif "intenso"  in product_name:
-            subcategory = "intenso"
-        else:
-            subcategory = "suave"
-
-    elif category == "leche": # leche
-        if "cabra" in product_name:
-            subcategory = "cabra"
-        elif "vaca" in product_name:
-            subcategory = "vaca"
-        elif "condensada" in product_name:
-            subcategory = "condensada"
-        elif "leche" in product_name:
-            subcategory = "vaca"
-        else: 
-            subcategory = "otras"
-
-    else:
-        subcategory = "otras"
-
+    subcategory, _, _ = get_category_rules(category).classify(product_name)
     return subcategory
 
-from typing import List, Tuple, Union
-import pandas as pd
-from datetime import datetime
+# columns added to the price table of each product, in the order of the get_product_info tuple plus the link
+TABLE_INFO_COLUMNS = [
+    "product_name", "brand", "quantity", "volume_weight",
+    "units", "subcategory", "distinction", "eco",
+    "category_name", "supermarket_name", "url"
+]
+
+
+# schema of the price tables: repeated strings are categoricals, prices float32 and eco a bool;
+# the date and price columns are the first two, named after the headers of the FACUA table
+TABLE_CATEGORY_COLUMNS = [
+    "product_name", "brand", "units", "subcategory", "distinction",
+    "category_name", "supermarket_name", "url"
+]
+TABLE_PRICE_DTYPE = np.float32
+
+
+def split_price_rows(table_body_list: List[Sequence[str]]) -> Tuple[List[str], List[str]]:
+    """
+    Splits the rows of a price table into its date and price columns.
+
+    Parameters:
+    ----------
+    table_body_list : list of tuples
+        Rows of the price table, each starting with its date and price.
+
+    Returns:
+    -------
+    tuple of lists
+        The date strings and the price strings.
+    """
+    if not table_body_list:
+        return [], []
+    dates, prices = zip(*((row[0], row[1]) for row in table_body_list))
+    return list(dates), list(prices)
+
+
+def parse_dates(date_strs: Sequence[str]) -> pd.DatetimeIndex:
+    """
+    Parses date strings in 'dd/mm/yyyy' format with a single vectorized call.
+
+    Parameters:
+    ----------
+    date_strs : sequence of str
+        Date strings in 'dd/mm/yyyy' format.
+
+    Returns:
+    -------
+    pd.DatetimeIndex
+        Parsed dates.
+    """
+    # the fixed 'dd/mm/yyyy' layout is decoded from the character codes with numpy, which is
+    # much faster than parsing each string with a format
+    chars = np.asarray(date_strs, dtype=str)
+    if len(chars) and chars.dtype.itemsize == 10 * 4:
+        codes = chars.reshape(-1).view(np.uint32).reshape(-1, 10).astype(np.int64)
+        digits = codes[:, [0, 1, 3, 4, 6, 7, 8, 9]] - ord("0")
+        if (codes[:, 2] == ord("/")).all() and (codes[:, 5] == ord("/")).all() and ((digits >= 0) & (digits <= 9)).all():
+            day = digits[:, 0] * 10 + digits[:, 1]
+            month = digits[:, 2] * 10 + digits[:, 3]
+            year = digits[:, 4] * 1000 + digits[:, 5] * 100 + digits[:, 6] * 10 + digits[:, 7]
+            months = (year - 1970) * 12 + month - 1
+            dates = months.astype("datetime64[M]").astype("datetime64[D]") + (day - 1)
+            # days out of their month would roll over into the next one
+            if ((month >= 1) & (month <= 12) & (day >= 1)).all() and (dates.astype("datetime64[M]").astype(np.int64) == months).all():
+                return pd.DatetimeIndex(dates.astype("datetime64[ns]"))
+
+    # other layouts, or invalid dates that must raise like strptime
+    # same resolution whatever the pandas version or the input, so product tables concatenate without casts
+    return pd.DatetimeIndex(pd.to_datetime(pd.Index(date_strs, dtype=object), format="%d/%m/%Y")).as_unit("ns")
+
+
+def parse_prices(price_strs: Sequence[str]) -> np.ndarray:
+    """
+    Converts price strings, with a decimal point or comma, to floats with a single vectorized call.
+
+    Parameters:
+    ----------
+    price_strs : sequence of str
+        Price strings, e.g. '1.45' or '1,45'.
+
+    Returns:
+    -------
+    np.ndarray
+        Prices as float64. Strings such as 'nan' or 'inf' give non-finite prices, to be dropped
+        with `np.isfinite` before loading.
+    """
+    try:
+        return np.fromiter(map(float, price_strs), dtype=np.float64, count=len(price_strs))
+    except ValueError:
+        # decimal commas
+        return np.fromiter((float(price.replace(",", ".")) for price in price_strs), dtype=np.float64, count=len(price_strs))
+
 
 def create_table_df(
     table_head_list: List[str], table_body_list: List[Tuple[str, str]], 
@@ -307,7 +331,7 @@ def create_table_df(
     Parameters:
     ----------
     table_head_list : list of str
-        List of table headers.
+        List of table headers. It is not modified.
     table_body_list : list of tuples
         List of tuples representing rows in the table body.
     product_name : str
@@ -338,21 +362,256 @@ def create_table_df(
     pd.DataFrame
         DataFrame containing the product information.
     """
-    # concatenate prices with extracted information from product_name
-    table_body_list_filled = [(row[0], row[1].replace(",", "."), product_name, brand_name, quantity, 
-        volume_weight, units, subcategory, distinction, eco, category_name, 
-        supermarket_name, link) for row in table_body_list]
-    
-    # create headers
-    table_head_list.extend([
-        "product_name", "brand", "quantity", "volume_weight", 
-        "units", "subcategory", "distinction", "eco", 
-        "category_name", "supermarket_name", "url"
-    ])
-    
-    table_df = pd.DataFrame(table_body_list_filled, columns=table_head_list)
+    dates, prices = split_price_rows(table_body_list)
+    return create_table_df_from_columns(
+        table_head_list, parse_dates(dates), parse_prices(prices), product_name, brand_name, quantity,
+        volume_weight, units, subcategory, distinction, eco, category_name, supermarket_name, link
+    )
+
+
+def create_table_df_from_columns(
+    table_head_list: List[str], dates: pd.DatetimeIndex, prices: np.ndarray,
+    product_name: str, brand_name: str, quantity: Union[str, int],
+    volume_weight: float, units: str, subcategory: str,
+    distinction: str, eco: bool, category_name: str,
+    supermarket_name: str, link: str
+) -> pd.DataFrame:
+    """
+    Column-oriented version of `create_table_df`, taking the already parsed date and price
+    columns. The product information is the same on every row, so it is broadcast from
+    scalars instead of being copied into each row.
+
+    Parameters:
+    ----------
+    table_head_list : list of str
+        Names of the date and price columns. It is not modified.
+    dates : pd.DatetimeIndex
+        Date of each price, as returned by `parse_dates`.
+    prices : np.ndarray
+        Prices, as returned by `parse_prices`.
+    product_name, brand_name, quantity, volume_weight, units, subcategory, distinction, eco, category_name, supermarket_name :
+        Product information, as returned by `get_product_info`.
+    link : str
+        URL to the product page.
+
+    Returns:
+    -------
+    pd.DataFrame
+        DataFrame with one row per price, with the date, price and product information columns.
+    """
+    date_column, price_column = table_head_list[:2]
+    info = (product_name, brand_name, quantity, volume_weight, units, subcategory,
+            distinction, eco, category_name, supermarket_name, link)
+    columns = {date_column: _table_dates(dates), price_column: np.asarray(prices, dtype=TABLE_PRICE_DTYPE)}
+    for column, value in zip(TABLE_INFO_COLUMNS, info):
+        columns[column] = _broadcast_category(value, len(prices)) if column in TABLE_CATEGORY_COLUMNS else value
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(prices)))
+
+
+def _broadcast_category(value, length):
+    # one category repeated through 1-byte codes, instead of one object pointer per row
+    if value is None:
+        return pd.Categorical.from_codes(np.full(length, -1, dtype=np.int8), categories=pd.Index([], dtype=object))
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), categories=pd.Index([value], dtype=object))
+
+
+def _table_dates(dates):
+    # date32 when pyarrow is installed, datetime64 otherwise
+    if pa is None:
+        return dates
+    return pd.arrays.ArrowExtensionArray(pa.array(np.asarray(dates, dtype="datetime64[D]"), type=pa.date32()))
+
+
+def _object_categories(values: pd.Series) -> pd.Categorical:
+    # categoricals only combine when their categories have the same dtype
+    values = values.astype("category").array
+    return values.set_categories(values.categories.astype(object))
+
+
+def apply_table_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts a price table, e.g. one read back from a CSV file, to the compact schema of `create_table_df`:
+    categorical strings, date32 (or datetime64) dates, float32 prices and bool eco.
+
+    Parameters:
+    ----------
+    df : pd.DataFrame
+        Price table with the date and price columns first, followed by `TABLE_INFO_COLUMNS`.
+
+    Returns:
+    -------
+    pd.DataFrame
+        The table with the compact dtypes.
+    """
+    if len(df.columns) < 2:
+        return df
+    date_column, price_column = df.columns[:2]
+    columns = {price_column: df[price_column].astype(TABLE_PRICE_DTYPE)}
+    if not isinstance(df[date_column].dtype, pd.ArrowDtype):
+        dates = df[date_column]
+        if pd.api.types.infer_dtype(dates, skipna=True) == "string":
+            try:
+                # 'dd/mm/yyyy' strings, as saved by save_to_csv
+                dates = parse_dates(dates.tolist())
+            except ValueError:
+                dates = pd.to_datetime(dates, format="ISO8601")
+        elif not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates)
+        columns[date_column] = _table_dates(pd.DatetimeIndex(dates).as_unit("ns"))
+    for column in TABLE_CATEGORY_COLUMNS:
+        if column in df.columns:
+            columns[column] = _object_categories(df[column])
+    if "eco" in df.columns:
+        columns["eco"] = df["eco"].astype(bool)
+    return df.assign(**{column: pd.Series(values, index=df.index) for column, values in columns.items()})
+
+
+def concat_tables(tables: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenates price tables keeping their compact schema: the categories of each
+    categorical column are merged instead of falling back to Python strings.
+
+    Parameters:
+    ----------
+    tables : sequence of pd.DataFrame
+        Price tables built by `create_table_df`.
+
+    Returns:
+    -------
+    pd.DataFrame
+        All the rows, with a new RangeIndex.
+    """
+    tables = [table for table in tables if len(table.columns)]
+    if not tables:
+        return pd.DataFrame()
+    if len(tables) == 1:
+        return tables[0].reset_index(drop=True)
+
+    category_columns = [column for column in TABLE_CATEGORY_COLUMNS
+                        if all(column in table.columns for table in tables)]
+    categoricals = {column: _union_categoricals([table[column] for table in tables]) for column in category_columns}
+    df = pd.concat([table.drop(columns=category_columns) for table in tables], ignore_index=True)
+    df = df.assign(**{column: pd.Series(values, index=df.index) for column, values in categoricals.items()})
+    return df[list(tables[0].columns)]
+
+
+def _union_categoricals(columns: Sequence[pd.Series]) -> pd.Categorical:
+    # union_categoricals recodes every input through pandas, which dominates with thousands of
+    # one-product tables, so the codes of each table are remapped to the merged categories here
+    positions: Dict[object, int] = {}
+    codes = []
+    for column in columns:
+        values = column.array if isinstance(column.dtype, pd.CategoricalDtype) else pd.Categorical(column)
+        # the extra -1 keeps missing values (code -1) missing
+        mapping = np.array([positions.setdefault(category, len(positions)) for category in values.categories] + [-1])
+        codes.append(mapping[values.codes])
+    categories = pd.Index(list(positions), dtype=object)
+    codes = np.concatenate(codes).astype(np.min_scalar_type(-max(len(categories), 1)))
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def table_memory_usage(df: pd.DataFrame) -> Dict[str, object]:
+    """
+    Reports the memory used by a price table.
+
+    Parameters:
+    ----------
+    df : pd.DataFrame
+        Price table.
+
+    Returns:
+    -------
+    dict
+        Number of rows, total bytes and bytes of each column, counting the Python strings.
+    """
+    usage = df.memory_usage(deep=True, index=True)
+    return {"rows": len(df), "bytes": int(usage.sum()), "columns": {str(column): int(size) for column, size in usage.items()}}
 
-    return table_df
+
+# bump when the code deriving the attributes changes, so cached attributes are derived again
+ATTRIBUTE_RULES_REVISION = 1
+
+
+def rules_version():
+    """
+    Returns a fingerprint of the rules deriving product attributes: category rules, name
+    replacements, unit tables, brands and `ATTRIBUTE_RULES_REVISION`.
+
+    Returns:
+    -------
+    str
+        Hexadecimal digest, changing whenever a rule changes.
+    """
+    rules = [ATTRIBUTE_RULES_REVISION, CATEGORY_RULES, DEFAULT_SUBCATEGORY, ECO_KEYWORDS, NAME_REPLACEMENTS,
+             UNIT_ABBREVIATIONS, UNIT_MAGNITUDES, UNIT_BASES, BRANDS, BRAND_NORMALIZATIONS]
+    return hashlib.sha256(json.dumps(rules, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+# in memory only until configure_attribute_cache is called with a path
+_attribute_cache = AttributeCache(version=rules_version())
+
+
+def configure_attribute_cache(path=None, max_entries=100_000, enabled=True):
+    """
+    Configures the memoization of the attributes `get_product_info` derives from product names.
+
+    Parameters:
+    ----------
+    path : str, optional
+        SQLite file keeping the attributes across runs. If None, they are only kept in memory.
+    max_entries : int
+        Maximum number of attributes kept in memory.
+    enabled : bool
+        If False, attributes are derived again for every call.
+
+    Returns:
+    -------
+    AttributeCache or None
+        The configured cache, or None if it is disabled.
+    """
+    global _attribute_cache
+    if _attribute_cache is not None:
+        # in a forked worker the parent's cache is dropped untouched, see `AttributeCache.close`
+        _attribute_cache.close()
+    _attribute_cache = AttributeCache(path, version=rules_version(), max_entries=max_entries) if enabled else None
+    return _attribute_cache
+
+
+def get_attribute_cache():
+    """
+    Returns the attribute cache used by `get_product_info`, or None if it is disabled.
+    """
+    return _attribute_cache
+
+
+def close_attribute_cache():
+    """
+    Writes the pending attributes of the cache to disk and closes it.
+    """
+    if _attribute_cache is not None:
+        _attribute_cache.close()
+
+
+def _product_attributes(category_name: str, product_name: str) -> Tuple:
+    # the same products come back every run and in every supermarket: derive their attributes once
+    start = time.perf_counter()
+    product_attributes = _attribute_cache.get(category_name, product_name) if _attribute_cache else None
+    if product_attributes is not None:
+        get_metrics().observe("attribute_cache_hit", time.perf_counter() - start)
+        return product_attributes
+
+    # extract informations
+    brand_name = extract_brand(product_name)
+
+    # quantity, subcategory, distinction and eco status from one scan of the name by the category rules
+    attributes = get_category_rules(category_name).apply(product_name)
+
+    product_attributes = (attributes.product_name, brand_name, attributes.quantity, attributes.volume_weight,
+                          attributes.units, attributes.subcategory, attributes.distinction, attributes.eco)
+    if _attribute_cache:
+        _attribute_cache.put(category_name, product_name, product_attributes)
+        get_metrics().observe("attribute_cache_miss", time.perf_counter() - start)
+    return product_attributes
 
 
 def get_product_info(
@@ -384,14 +643,100 @@ def get_product_info(
     supermarket_name = link.split("/")[3]
     product_name = sanitize_filename(unidecode(product_name.lower()))
 
-    # extract informations
-    brand_name = extract_brand(product_name)
+    product_attributes = _product_attributes(category_name, product_name)
+    return product_attributes + (category_name, supermarket_name)
 
-    quantity, volume_weight, units, product_name = extract_quantity_from_product_name(product_name, category_name)
 
-    subcategory, distinction, eco = get_subcategory_distinction(product_name, category_name)
+def _products_attributes(category_names: pd.Series, product_names: pd.Series) -> pd.DataFrame:
+    # columnar _product_attributes, over distinct (category, name) pairs
+    pieces = []
+    derive = np.ones(len(product_names), dtype=bool)
+    if _attribute_cache:
+        cached = [_attribute_cache.get(category_name, product_name) for category_name, product_name in zip(category_names, product_names)]
+        derive = np.array([product_attributes is None for product_attributes in cached])
+        if not derive.all():
+            pieces.append(pd.DataFrame.from_records([product_attributes for product_attributes in cached if product_attributes is not None],
+                                                    columns=PRODUCT_INFO_COLUMNS[:8], index=product_names.index[~derive]))
 
-    return product_name, brand_name, quantity, volume_weight, units, subcategory, distinction, eco, category_name, supermarket_name
+    # each category's rules run once over all its names
+    names_to_derive = product_names[derive]
+    for category_name, category_product_names in names_to_derive.groupby(category_names[derive], sort=False):
+        category_attributes = get_category_rules(category_name).apply_many(category_product_names)
+        category_attributes.insert(1, "brand_name", extract_brands(category_product_names).astype(object))
+        pieces.append(category_attributes)
+        if _attribute_cache:
+            for product_name, product_attributes in zip(category_product_names, category_attributes.itertuples(index=False, name=None)):
+                _attribute_cache.put(category_name, product_name, product_attributes)
+
+    return pd.concat(pieces).reindex(product_names.index)
+
+
+def get_products_info(df: pd.DataFrame, link_column: str = "link", name_column: str = "product_name") -> pd.DataFrame:
+    """
+    Columnar version of `get_product_info`, extracting the product information of
+    many products at once.
+
+    Each distinct product is transformed once and copied back to its rows, so price tables
+    repeating every product on each of their rows are transformed many times faster than row
+    by row. The names of each category are normalized, and their quantities, subcategories,
+    distinctions and eco status derived, with pandas string methods over the whole column
+    (`CategoryRules.apply_many`); attributes found in the attribute cache of `get_product_info`
+    are not derived again. On distinct names the string methods cost about as much as the
+    scalar path, and pandas' fixed cost per call makes batches of a few thousand names or
+    less slower than calling `get_product_info` on each.
+
+    Parameters:
+    ----------
+    df : pd.DataFrame
+        DataFrame with the product links and names.
+    link_column : str
+        Column with the URL of each product.
+    name_column : str
+        Column with the name of each product.
+
+    Returns:
+    -------
+    pd.DataFrame
+        DataFrame with the index of `df` and the `PRODUCT_INFO_COLUMNS`, whose rows
+        are the tuples `get_product_info` returns for each product.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=PRODUCT_INFO_COLUMNS, index=df.index)
+
+    # catalogues repeat each product on every price row: each distinct (link, name) pair is
+    # transformed once and its result copied back to its rows
+    products = {}
+    codes = np.fromiter(
+        (products.setdefault(product, len(products))
+         for product in zip(df[link_column].astype(str).tolist(), df[name_column].astype(str).tolist())),
+        dtype=np.intp, count=len(df)
+    )
+    links, names = map(list, zip(*products))
+
+    link_parts = [link.split("/") for link in links]
+    category_names = [parts[4].replace("-", "_") for parts in link_parts]
+    supermarket_names = [parts[3] for parts in link_parts]
+
+    # unidecode replaces each character independently, so its replacements can be
+    # computed once per distinct non-ASCII character and applied with str.translate
+    names = [name.lower() for name in names]
+    characters = set().union(*map(set, names))
+    replacements = {ord(char): unidecode(char) for char in characters if not char.isascii()}
+    names = [sanitize_filename(name if name.isascii() else name.translate(replacements)) for name in names]
+
+    # the same name is sold in every supermarket: derive its attributes once per category
+    keys = {}
+    key_codes = np.fromiter((keys.setdefault(key, len(keys)) for key in zip(category_names, names)), dtype=np.intp, count=len(names))
+    key_category_names, key_names = (pd.Series(values) for values in zip(*keys))
+    product_attributes = _products_attributes(key_category_names, key_names)
+
+    products_info = product_attributes.take(key_codes).reset_index(drop=True)
+    products_info["category_name"] = category_names
+    products_info["supermarket_name"] = supermarket_names
+    # quantities mix the matched strings and the integer 1, and missing units stay None, as in the scalar function
+    products_info["quantity"] = products_info["quantity"].astype(object)
+    products_info["units"] = products_info["units"].astype(object).where(products_info["units"].notna(), None)
+    return products_info.take(codes).set_axis(df.index)
 
 
 def parse_date(date_str: str) -> datetime.date:
@@ -1,17 +1,277 @@
 # database agent
 import psycopg2
 from psycopg2 import OperationalError, errorcodes, errors
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 
 # data processing
 import pandas as pd
 
+# system
+import os
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
 # functions typing
-from typing import Optional, Tuple, List, Union, Dict
+from typing import Optional, Tuple, List, Union, Dict, Iterator
+
+
+def database_config() -> Dict[str, Union[str, int, float]]:
+    """
+    Returns the server and pool settings, read from the environment (or the .env file):
+    DB_HOST, DB_PORT, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT and DB_POOL_CHECK_INTERVAL.
+
+    Returns:
+    -------
+    dict
+        Host, port, minimum and maximum number of pooled connections per database, seconds to
+        wait for a free connection, and seconds a connection can stay idle before it is checked.
+    """
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": os.getenv("DB_PORT", "5432"),
+        "min_connections": int(os.getenv("DB_POOL_MIN", "1")),
+        "max_connections": int(os.getenv("DB_POOL_MAX", "10")),
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "check_interval": float(os.getenv("DB_POOL_CHECK_INTERVAL", "30")),
+    }
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """
+    Connection of a `ConnectionPool`: `close` gives it back to the pool instead of closing it,
+    so code written for plain connections reuses them without changes.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.pool: Optional["ConnectionPool"] = None
+        self.released_at = time.monotonic()
+        self._releasing = False
+
+    def close(self) -> None:
+        if self.pool is None or self._releasing or self.closed:
+            super().close()
+            return
+        self._releasing = True
+        try:
+            self.pool.release(self)
+        finally:
+            self._releasing = False
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of connections to a database, opened `min_connections` at first and at
+    most `max_connections` at once. A caller finding every connection in use waits up to
+    `timeout` seconds for one.
+
+    On checkout, a broken connection is replaced, and a connection idle for more than
+    `check_interval` seconds is checked with `SELECT 1` first. On return, a transaction left
+    open is rolled back.
+
+    Parameters:
+    ----------
+    database : str
+        Name of the database.
+    credentials_dict : dict
+        Dictionary containing 'username' and 'password' for authentication, and optionally 'host' and 'port'.
+    config : Optional[dict]
+        Server and pool settings, `database_config()` if None.
+    """
+
+    def __init__(self, database: str, credentials_dict: Dict[str, str], config: Optional[Dict] = None) -> None:
+        config = {**database_config(), **(config or {})}
+        self.database = database
+        self.timeout = config["timeout"]
+        self.check_interval = config["check_interval"]
+        self.max_connections = max(config["max_connections"], 1)
+        self.counters = {"checkouts": 0, "health_checks": 0, "replaced": 0, "waits": 0}
+        self.pid = os.getpid()
+        self._in_use: Dict[int, PooledConnection] = {}
+
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._lock = threading.Lock()
+        self._pool = ThreadedConnectionPool(
+            min(config["min_connections"], self.max_connections), self.max_connections,
+            database=database,
+            user=credentials_dict.get("username") or os.getenv("DB_USERNAME"),
+            password=credentials_dict.get("password") or os.getenv("DB_PASSWORD"),
+            host=credentials_dict.get("host") or config["host"],
+            port=credentials_dict.get("port") or config["port"],
+            connection_factory=PooledConnection
+        )
+
+    def _healthy(self, conn: PooledConnection) -> bool:
+        if conn.closed or conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - conn.released_at < self.check_interval:
+            return True
+        self.counters["health_checks"] += 1
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        """
+        Checks a healthy connection out of the pool.
+
+        Returns:
+        -------
+        PooledConnection
+            A connection, given back by `release` or by closing it.
+        """
+        if not self._slots.acquire(blocking=False):
+            self.counters["waits"] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                raise PoolError(f"No free connection to {self.database} after {self.timeout} seconds")
+        try:
+            with self._lock:
+                conn = self._pool.getconn()
+                # a connection dropped by the server or the network is replaced by a new one
+                while not self._healthy(conn):
+                    self.counters["replaced"] += 1
+                    self._pool.putconn(conn, close=True)
+                    conn = self._pool.getconn()
+                self.counters["checkouts"] += 1
+                self._in_use[id(conn)] = conn
+        except BaseException:
+            self._slots.release()
+            raise
+        conn.pool = self
+        return conn
+
+    def release(self, conn: PooledConnection, discard: bool = False) -> None:
+        """
+        Gives a connection back to the pool, rolling back its open transaction, or closes it if `discard`.
+        """
+        if conn.pool is not self:
+            return
+        conn.pool = None
+        conn.released_at = time.monotonic()
+        with self._lock:
+            self._in_use.pop(id(conn), None)
+            if self._pool.closed:
+                conn.close()
+            else:
+                self._pool.putconn(conn, close=discard or conn.closed)
+        self._slots.release()
+
+    def close(self) -> None:
+        """
+        Closes every connection of the pool.
+        """
+        with self._lock:
+            # connections still checked out are closed for good
+            for conn in self._in_use.values():
+                conn.pool = None
+            self._in_use.clear()
+            if not self._pool.closed:
+                self._pool.closeall()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the number of checkouts, idle connections checked, connections replaced,
+        checkouts that waited for a free connection, and connections in use.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats["in_use"] = len(self._in_use)
+        return stats
+
+
+_pools: Dict[Tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(database: str, credentials_dict: Dict[str, str]) -> ConnectionPool:
+    """
+    Returns the pool of connections to a database, created the first time it is needed.
+
+    Parameters:
+    ----------
+    database : str
+        Name of the database.
+    credentials_dict : dict
+        Dictionary containing 'username' and 'password' for authentication, and optionally 'host' and 'port'.
+
+    Returns:
+    -------
+    ConnectionPool
+        The shared pool of this process for the database, user, host and port.
+    """
+    config = database_config()
+    key = (database, credentials_dict.get("username"), credentials_dict.get("host") or config["host"],
+           credentials_dict.get("port") or config["port"])
+    with _pools_lock:
+        pool = _pools.get(key)
+        # connections inherited from a parent process must not be shared with it
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[key] = ConnectionPool(database, credentials_dict, config)
+        return pool
+
+
+def close_connection_pools() -> None:
+    """
+    Closes every connection pool of the process.
+    """
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == os.getpid()]
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_connection_pools)
+
+
+@contextmanager
+def pooled_connection(database: str, credentials_dict: Dict[str, str]) -> Iterator[PooledConnection]:
+    """
+    Checks a connection out of the pool of a database for the block, and gives it back at the end.
+    A transaction the block leaves open is rolled back, and a connection it breaks is replaced.
+
+    Parameters:
+    ----------
+    database : str
+        Name of the database to connect to.
+    credentials_dict : dict
+        Dictionary containing 'username' and 'password' for authentication.
+
+    Yields:
+    -------
+    PooledConnection
+        A connection to the database.
+    """
+    pool = get_connection_pool(database, credentials_dict)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def _report_connection_error(e: OperationalError) -> None:
+    if e.pgcode == errorcodes.INVALID_PASSWORD:
+        print("Invalid password.")
+    elif e.pgcode == errorcodes.CONNECTION_EXCEPTION:
+        print("Connection error.")
+    else:
+        print(f"Error occurred: {e}", e.pgcode)
+
 
 def connect_to_database(database: str, credentials_dict: Dict[str, str]) -> Optional[psycopg2.extensions.connection]:
     """
     Connects to a PostgreSQL database using provided credentials.
 
+    The connection comes from the shared pool of the database: closing it gives it back to
+    the pool, to be reused by the next call.
+
     Parameters:
     ----------
     database : str
@@ -25,21 +285,12 @@ def connect_to_database(database: str, credentials_dict: Dict[str, str]) -> Opti
         A PostgreSQL database connection if successful, None otherwise.
     """
     try:
-        connection = psycopg2.connect(
-            database=database,
-            user=credentials_dict["username"],
-            password=credentials_dict["password"],
-            host="localhost",
-            port="5432"
-        )
-        return connection
+        return get_connection_pool(database, credentials_dict).acquire()
     except OperationalError as e:
-        if e.pgcode == errorcodes.INVALID_PASSWORD:
-            print("Invalid password.")
-        elif e.pgcode == errorcodes.CONNECTION_EXCEPTION:
-            print("Connection error.")
-        else:
-            print(f"Error occurred: {e}", e.pgcode)
+        _report_connection_error(e)
+        return None
+    except PoolError as e:
+        print(f"Error occurred: {e}")
         return None
 
 def connect_and_query(database: str, credentials_dict: Dict[str, str], query: str, columns: Union[str, list] = "query") -> pd.DataFrame:
@@ -63,23 +314,24 @@ def connect_and_query(database: str, credentials_dict: Dict[str, str], query: st
         DataFrame containing the query results.
     """
     connection = connect_to_database(database=database, credentials_dict=credentials_dict)
-    
+
     if not connection:
         return pd.DataFrame()  # Return an empty DataFrame if connection fails
-    
-    cursor = connection.cursor()
-    cursor.execute(query)
-    
-    if columns == "query":
-        columns = [desc[0] for desc in cursor.description]
-    elif not isinstance(columns, list):
-        columns = None
-    
-    result_df = pd.DataFrame(cursor.fetchall(), columns=columns)
-    
-    cursor.close()
-    connection.close()
-    
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+
+            if columns == "query":
+                columns = [desc[0] for desc in cursor.description]
+            elif not isinstance(columns, list):
+                columns = None
+
+            result_df = pd.DataFrame(cursor.fetchall(), columns=columns)
+    finally:
+        # back to the pool, with the read transaction rolled back
+        connection.close()
+
     return result_df
 
 def alter_update_query(database: str, credentials_dict: Dict[str, str], alter_update_query: str) -> None:
@@ -96,15 +348,13 @@ def alter_update_query(database: str, credentials_dict: Dict[str, str], alter_up
         SQL query for ALTER or UPDATE operations.
     """
     connection = connect_to_database(database=database, credentials_dict=credentials_dict)
-    
+
     if not connection:
         return  # If connection fails, exit function
-    
-    cursor = connection.cursor()
-    
-    with cursor:
-        cursor.execute(alter_update_query)
-        connection.commit()
-    
-    cursor.close()
-    connection.close()
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(alter_update_query)
+            connection.commit()
+    finally:
+        connection.close()
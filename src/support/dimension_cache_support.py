@@ -0,0 +1,222 @@
+# database agent
+import psycopg2
+
+# system
+import threading
+from decimal import Decimal, InvalidOperation
+from functools import wraps
+import inspect
+
+# functions typing
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+# table of each dimension, its ID column and the columns identifying a row, in the order of
+# the arguments of its insert function
+DIMENSIONS = {
+    "brands": ("brand_id", ("brand_name",)),
+    "categories": ("category_id", ("category_name",)),
+    "supermarkets": ("supermarket_id", ("supermarket_name",)),
+    "subcategories": ("subcategory_id", ("subcategory_name", "category_id", "distinction", "eco")),
+    "products": ("product_id", ("brand_id", "subcategory_id", "product_name_norm", "quantity", "units", "volume_weight")),
+    "supermarkets_products": ("supermarket_product_id", ("supermarket_id", "product_id", "facua_url", "product_name_supermarket")),
+}
+NUMERIC_COLUMNS = {"quantity", "volume_weight"}
+# value a missing column is compared as, like in the unique indexes of `data_load_support.UNIQUE_KEYS`
+NULL_VALUES = {
+    "category_id": 0, "distinction": "", "eco": False, "brand_id": 0, "subcategory_id": 0, "quantity": -1,
+    "units": "", "volume_weight": -1, "supermarket_id": 0, "product_id": 0, "facua_url": "", "product_name_supermarket": "",
+}
+
+
+def _numeric_key(value) -> Hashable:
+    # the same number, whether it is sent as an int, a float or a string, or read back as a Decimal
+    try:
+        number = Decimal(repr(value)) if isinstance(value, float) else Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return value
+    # NaN equals NaN in PostgreSQL numeric columns, but Decimal('NaN') cannot be hashed
+    return "NaN" if number.is_nan() else number
+
+
+class DimensionCache:
+    """
+    In-process cache of the IDs of the dimension tables (brands, categories, supermarkets,
+    subcategories, products and supermarket-products), keyed by the columns their insert
+    functions look them up by.
+
+    Warmed once from the database, it returns the ID of a known row without a round trip, so
+    only the rows that are new are written. Missing values match each other, as in the unique
+    indexes of the tables.
+
+    IDs cached since the last `commit` are journaled, so that they can be forgotten with
+    `rollback` when the rows they belong to are rolled back.
+    """
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, Dict[Tuple, int]] = {dimension: {} for dimension in DIMENSIONS}
+        self._journal: List[Tuple[str, Tuple]] = []
+        self.counters = {dimension: {"hits": 0, "misses": 0} for dimension in DIMENSIONS}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(dimension: str, values: Tuple) -> Tuple:
+        """
+        Returns the cache key of a row.
+        """
+        _, columns = DIMENSIONS[dimension]
+        values = [NULL_VALUES.get(column) if value is None else value for column, value in zip(columns, values)]
+        return tuple(
+            _numeric_key(value) if column in NUMERIC_COLUMNS else bool(value) if column == "eco" else value
+            for column, value in zip(columns, values)
+        )
+
+    def warm(self, conn: psycopg2.extensions.connection) -> int:
+        """
+        Loads the IDs of every row of the dimension tables.
+
+        Parameters:
+        ----------
+        conn : psycopg2.extensions.connection
+            Connection to the PostgreSQL database.
+
+        Returns:
+        -------
+        int
+            Number of cached rows.
+        """
+        ids = {}
+        with conn.cursor() as cursor:
+            for dimension, (id_column, columns) in DIMENSIONS.items():
+                cursor.execute(f"SELECT {id_column}, {', '.join(columns)} FROM {dimension} ORDER BY {id_column}")
+                ids[dimension] = {self.key(dimension, tuple(values)): row_id for row_id, *values in cursor.fetchall()}
+        with self._lock:
+            self._ids = ids
+            self._journal = []
+        return sum(len(dimension_ids) for dimension_ids in ids.values())
+
+    def get(self, dimension: str, values: Tuple) -> Optional[int]:
+        """
+        Returns the cached ID of a row, or None if it has to be looked up in the database.
+        """
+        key = self.key(dimension, values)
+        with self._lock:
+            row_id = self._ids[dimension].get(key)
+            self.counters[dimension]["hits" if row_id is not None else "misses"] += 1
+        return row_id
+
+    def put(self, dimension: str, values: Tuple, row_id: int) -> None:
+        """
+        Caches the ID of a row found or inserted in the database.
+        """
+        key = self.key(dimension, values)
+        with self._lock:
+            if key not in self._ids[dimension]:
+                self._journal.append((dimension, key))
+            self._ids[dimension][key] = row_id
+
+    def mark(self) -> int:
+        """
+        Returns the position of the journal, to roll the cache back to it.
+        """
+        with self._lock:
+            return len(self._journal)
+
+    def rollback(self, mark: int = 0) -> None:
+        """
+        Forgets the IDs cached after `mark`, whose rows were rolled back.
+        """
+        with self._lock:
+            for dimension, key in self._journal[mark:]:
+                self._ids[dimension].pop(key, None)
+            del self._journal[mark:]
+
+    def commit(self) -> None:
+        """
+        Empties the journal once the cached rows are committed.
+        """
+        with self._lock:
+            self._journal = []
+
+    def clear(self) -> None:
+        """
+        Forgets every cached ID, e.g. when the tables are dropped.
+        """
+        with self._lock:
+            self._ids = {dimension: {} for dimension in DIMENSIONS}
+            self._journal = []
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the number of hits, misses and cached rows, in total and for each dimension
+        (e.g. 'brands_hits').
+        """
+        with self._lock:
+            stats = {"hits": 0, "misses": 0, "entries": 0}
+            for dimension, counters in self.counters.items():
+                entries = len(self._ids[dimension])
+                stats.update({f"{dimension}_hits": counters["hits"], f"{dimension}_misses": counters["misses"],
+                              f"{dimension}_entries": entries})
+                stats["hits"] += counters["hits"]
+                stats["misses"] += counters["misses"]
+                stats["entries"] += entries
+        return stats
+
+
+# disabled until configure_dimension_cache is called
+_dimension_cache: Optional[DimensionCache] = None
+
+
+def configure_dimension_cache(conn: Optional[psycopg2.extensions.connection] = None, enabled: bool = True) -> Optional[DimensionCache]:
+    """
+    Configures the cache of dimension IDs used by the insert functions of `data_load_support`.
+
+    Parameters:
+    ----------
+    conn : Optional[psycopg2.extensions.connection]
+        Connection the cache is warmed from, with the rows already stored. If None, it starts empty.
+    enabled : bool
+        If False, every insert function looks its row up in the database.
+
+    Returns:
+    -------
+    Optional[DimensionCache]
+        The configured cache, or None if it is disabled.
+    """
+    global _dimension_cache
+    _dimension_cache = DimensionCache() if enabled else None
+    if _dimension_cache is not None and conn is not None:
+        _dimension_cache.warm(conn)
+    return _dimension_cache
+
+
+def get_dimension_cache() -> Optional[DimensionCache]:
+    """
+    Returns the cache of dimension IDs, or None if it is disabled.
+    """
+    return _dimension_cache
+
+
+def cached_dimension(dimension: str) -> Callable:
+    """
+    Decorator returning the cached ID of a dimension row before the decorated insert function
+    looks it up, and caching the ID it returns. The arguments after the connection are the
+    values identifying the row.
+    """
+    def decorator(function: Callable) -> Callable:
+        signature = inspect.signature(function)
+
+        @wraps(function)
+        def wrapper(conn, *args, **kwargs):
+            if _dimension_cache is None:
+                return function(conn, *args, **kwargs)
+            arguments = signature.bind(conn, *args, **kwargs)
+            arguments.apply_defaults()
+            values = tuple(arguments.arguments.values())[1:]
+            row_id = _dimension_cache.get(dimension, values)
+            if row_id is None:
+                row_id = function(conn, *args, **kwargs)
+                _dimension_cache.put(dimension, values, row_id)
+            return row_id
+        return wrapper
+    return decorator
@@ -0,0 +1,195 @@
+# html parsing
+from bs4 import BeautifulSoup, SoupStrainer
+
+# functions typing
+from typing import Callable, Dict, List, Optional, Tuple
+
+# optional faster parsers, html.parser is always available as fallback
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+
+CARD_CLASS = "card h-100"
+PRODUCT_GRID_CLASS = "row gx-4 gx-lg-5 row-cols-2 row-cols-md-3 row-cols-xl-4 justify-content-center"
+PRICE_TABLE_CLASS = "table table-striped table-responsive text-center"
+
+ProductPage = Tuple[List[str], List[List[str]], Optional[str]]
+
+
+# html.parser backend: BeautifulSoup restricted to the target elements
+def _cards_links_bs4(content: str) -> List[str]:
+    soup = BeautifulSoup(content, "html.parser", parse_only=SoupStrainer("div", {"class": CARD_CLASS}))
+    return [card.find("a")["href"] for card in soup.find_all("div", {"class": CARD_CLASS})]
+
+def _product_cards_bs4(content: str) -> Tuple[List[str], List[str]]:
+    soup = BeautifulSoup(content, "html.parser", parse_only=SoupStrainer("div", {"class": PRODUCT_GRID_CLASS}))
+    product_cards = soup.find_all("div", {"class": PRODUCT_GRID_CLASS})[-1].find_all("div", {"class": CARD_CLASS})
+    return [card.find("p").text.strip() for card in product_cards], [card.find("a")["href"] for card in product_cards]
+
+def _product_page_bs4(content: str) -> Optional[ProductPage]:
+    soup = BeautifulSoup(content, "html.parser", parse_only=SoupStrainer(["table", "h2"]))
+    table = soup.find("table", {"class": PRICE_TABLE_CLASS})
+    if not table or not table.find("thead") or not table.find("tbody"):
+        return None
+    table_head_list = [element.text.strip() for element in table.find("thead").find_all("th")][:2]
+    table_body_list = [[element.text.strip().replace(",", ".") for element in row.find_all("td")][:2]
+                       for row in table.find("tbody").find_all("tr")]
+    title = soup.find("h2")
+    return table_head_list, table_body_list, title.text.strip() if title else None
+
+
+# selectolax backend
+def _cards_links_selectolax(content: str) -> List[str]:
+    tree = LexborHTMLParser(content)
+    return [card.css_first("a").attributes.get("href") for card in tree.css(f'div[class="{CARD_CLASS}"]')]
+
+def _product_cards_selectolax(content: str) -> Tuple[List[str], List[str]]:
+    tree = LexborHTMLParser(content)
+    product_cards = tree.css(f'div[class="{PRODUCT_GRID_CLASS}"]')[-1].css(f'div[class="{CARD_CLASS}"]')
+    return ([card.css_first("p").text(deep=True).strip() for card in product_cards],
+            [card.css_first("a").attributes.get("href") for card in product_cards])
+
+def _product_page_selectolax(content: str) -> Optional[ProductPage]:
+    tree = LexborHTMLParser(content)
+    table = tree.css_first(f'table[class="{PRICE_TABLE_CLASS}"]')
+    if table is None or table.css_first("thead") is None or table.css_first("tbody") is None:
+        return None
+    table_head_list = [element.text(deep=True).strip() for element in table.css_first("thead").css("th")][:2]
+    table_body_list = [[element.text(deep=True).strip().replace(",", ".") for element in row.css("td")][:2]
+                       for row in table.css_first("tbody").css("tr")]
+    title = tree.css_first("h2")
+    return table_head_list, table_body_list, title.text(deep=True).strip() if title else None
+
+
+# lxml backend
+def _cards_links_lxml(content: str) -> List[str]:
+    tree = lxml.html.fromstring(content)
+    return [card.xpath(".//a")[0].get("href") for card in tree.xpath(f'//div[@class="{CARD_CLASS}"]')]
+
+def _product_cards_lxml(content: str) -> Tuple[List[str], List[str]]:
+    tree = lxml.html.fromstring(content)
+    product_cards = tree.xpath(f'//div[@class="{PRODUCT_GRID_CLASS}"]')[-1].xpath(f'.//div[@class="{CARD_CLASS}"]')
+    return ([card.xpath(".//p")[0].text_content().strip() for card in product_cards],
+            [card.xpath(".//a")[0].get("href") for card in product_cards])
+
+def _product_page_lxml(content: str) -> Optional[ProductPage]:
+    tree = lxml.html.fromstring(content)
+    tables = tree.xpath(f'//table[@class="{PRICE_TABLE_CLASS}"]')
+    if not tables or not tables[0].xpath(".//thead") or not tables[0].xpath(".//tbody"):
+        return None
+    table = tables[0]
+    table_head_list = [element.text_content().strip() for element in table.xpath(".//thead")[0].xpath(".//th")][:2]
+    table_body_list = [[element.text_content().strip().replace(",", ".") for element in row.xpath(".//td")][:2]
+                       for row in table.xpath(".//tbody")[0].xpath(".//tr")]
+    titles = tree.xpath("//h2")
+    return table_head_list, table_body_list, titles[0].text_content().strip() if titles else None
+
+
+BACKENDS: Dict[str, Dict[str, Callable]] = {
+    "html.parser": {"cards": _cards_links_bs4, "products": _product_cards_bs4, "page": _product_page_bs4},
+}
+if LexborHTMLParser is not None:
+    BACKENDS["selectolax"] = {"cards": _cards_links_selectolax, "products": _product_cards_selectolax, "page": _product_page_selectolax}
+if lxml is not None:
+    BACKENDS["lxml"] = {"cards": _cards_links_lxml, "products": _product_cards_lxml, "page": _product_page_lxml}
+
+# fastest available backend first
+_backend = next(name for name in ("selectolax", "lxml", "html.parser") if name in BACKENDS)
+
+
+def set_parser_backend(name: str) -> None:
+    """
+    Selects the HTML parser backend used by the parsing functions.
+
+    Parameters:
+    ----------
+    name : str
+        One of 'selectolax', 'lxml' or 'html.parser'.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Parser backend '{name}' is not available. Available backends: {', '.join(BACKENDS)}")
+    global _backend
+    _backend = name
+
+
+def get_parser_backend() -> str:
+    """
+    Returns the name of the HTML parser backend in use.
+    """
+    return _backend
+
+
+def _parse(kind: str, content: str, backend: Optional[str]):
+    backend = backend or _backend
+    try:
+        return BACKENDS[backend][kind](content)
+    except (IndexError, AttributeError, TypeError, ValueError):
+        if backend == "html.parser":
+            raise
+        # fall back to BeautifulSoup on markup the fast backend could not handle
+        return BACKENDS["html.parser"][kind](content)
+
+
+def parse_cards_links(content: str, backend: Optional[str] = None) -> List[str]:
+    """
+    Extracts the links of the supermarket or category cards of a listing page.
+
+    Parameters:
+    ----------
+    content : str
+        HTML content of the page.
+    backend : Optional[str]
+        Parser backend to use instead of the selected one.
+
+    Returns:
+    -------
+    List[str]
+        The link of each card.
+    """
+    return _parse("cards", content, backend)
+
+
+def parse_product_cards(content: str, backend: Optional[str] = None) -> Tuple[List[str], List[str]]:
+    """
+    Extracts product names and links from the last product grid of a category page.
+
+    Parameters:
+    ----------
+    content : str
+        HTML content of the page.
+    backend : Optional[str]
+        Parser backend to use instead of the selected one.
+
+    Returns:
+    -------
+    tuple
+        A tuple containing the list of product names and the list of product links.
+    """
+    return _parse("products", content, backend)
+
+
+def parse_product_page(content: str, backend: Optional[str] = None) -> Optional[ProductPage]:
+    """
+    Extracts the price table and the title of a product page.
+
+    Parameters:
+    ----------
+    content : str
+        HTML content of the page.
+    backend : Optional[str]
+        Parser backend to use instead of the selected one.
+
+    Returns:
+    -------
+    Optional[tuple]
+        A tuple containing the first two table headers, the first two cells of each row
+        (with decimal commas replaced by dots) and the page title, or None if the page has no price table.
+    """
+    return _parse("page", content, backend)
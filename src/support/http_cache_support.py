@@ -0,0 +1,250 @@
+# local storage
+import os
+import gzip
+import sqlite3
+import hashlib
+
+# system
+import time
+import threading
+
+# functions typing
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../data/cache/http")
+
+
+@dataclass
+class CacheEntry:
+    """
+    A cached HTTP response.
+    """
+    url: str
+    content: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+
+    @property
+    def has_validators(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+
+class HTTPCache:
+    """
+    Persistent on-disk cache of HTTP responses, keyed by URL.
+
+    Bodies are stored gzip-compressed on disk and indexed in a SQLite file that keeps
+    the validators (ETag and Last-Modified) and the access times used for LRU eviction.
+    Access times are written in batches of `access_batch` reads rather than on every read.
+
+    Parameters:
+    ----------
+    path : str
+        Directory where the cache is stored.
+    max_size : int
+        Maximum total size in bytes of the stored bodies before the least recently used
+        entries are evicted.
+    ttl : float
+        Seconds a response without validators is served from the cache before it is fetched again.
+        0 fetches it again every time, so that prices are never a day old.
+    offline : bool
+        If True, entries are always served from the cache and the network is never used.
+    access_batch : int
+        Number of reads whose access times are kept in memory before they are written.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_DIR, max_size: int = 1024 ** 3, ttl: float = 0, offline: bool = False,
+                 access_batch: int = 256) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.offline = offline
+        self.access_batch = access_batch
+        self.counters = {"hits": 0, "misses": 0, "revalidations": 0, "stores": 0, "evictions": 0}
+
+        os.makedirs(os.path.join(path, "bodies"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._db.commit()
+        # total size of the bodies, kept up to date by store and eviction instead of summed on every store
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self._accessed: Dict[str, float] = {}
+        self._closed = False
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.path, "bodies", key[:2], f"{key}.html.gz")
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """
+        Returns the cached response for a URL, or None if it is not cached.
+        """
+        key = self._key(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, stored_at, size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            try:
+                with gzip.open(self._body_path(key), "rt", encoding="utf-8") as f:
+                    content = f.read()
+            except OSError:
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._db.commit()
+                self._size -= row[3]
+                self._accessed.pop(key, None)
+                return None
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= self.access_batch:
+                self._flush_access_times()
+                self._db.commit()
+
+        etag, last_modified, stored_at, _ = row
+        return CacheEntry(url, content, etag, last_modified, stored_at)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """
+        Checks whether an entry can be served without contacting the server.
+
+        Entries with validators are always revalidated; entries without them are
+        served until they are older than the TTL.
+        """
+        if self.offline:
+            return True
+        if entry.has_validators:
+            return False
+        return time.time() - entry.stored_at < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        """
+        Builds the If-None-Match / If-Modified-Since headers to revalidate an entry.
+        """
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def store(self, url: str, content: str, headers: Mapping[str, str]) -> None:
+        """
+        Stores a response body and its validators, evicting old entries if the cache is full.
+        """
+        key = self._key(url)
+        body_path = self._body_path(key)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+
+        # write to a temporary file first so readers never see a half written body
+        tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, body_path)
+
+        now = time.time()
+        size = os.path.getsize(body_path)
+        with self._lock:
+            previous = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO entries (key, url, etag, last_modified, stored_at, last_access, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, url, headers.get("ETag"), headers.get("Last-Modified"), now, now, size)
+            )
+            self._accessed.pop(key, None)
+            self._size += size - (previous[0] if previous else 0)
+            self.counters["stores"] += 1
+            self._evict()
+            self._db.commit()
+
+    def revalidated(self, url: str, headers: Mapping[str, str]) -> None:
+        """
+        Marks an entry as confirmed by the server (304 Not Modified), refreshing its validators.
+        """
+        with self._lock:
+            self._db.execute(
+                """
+                UPDATE entries SET stored_at = ?,
+                    etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified)
+                WHERE key = ?
+                """,
+                (time.time(), headers.get("ETag"), headers.get("Last-Modified"), self._key(url))
+            )
+            self._db.commit()
+            self.counters["revalidations"] += 1
+
+    def record(self, counter: str) -> None:
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _flush_access_times(self) -> None:
+        if self._accessed:
+            self._db.executemany("UPDATE entries SET last_access = ? WHERE key = ?",
+                                 [(accessed_at, key) for key, accessed_at in self._accessed.items()])
+            self._accessed.clear()
+
+    def _evict(self) -> None:
+        if self._size <= self.max_size:
+            return
+
+        # the least recently used entries, with the reads not written yet
+        self._flush_access_times()
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if self._size <= self.max_size:
+                break
+            try:
+                os.remove(self._body_path(key))
+            except OSError:
+                pass
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._size -= size
+            self.counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit, miss, revalidation, store and eviction counters with the cache size.
+
+        Returns:
+        -------
+        dict
+            Cache counters, number of entries and total size in bytes.
+        """
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            stats = dict(self.counters)
+            stats["size_bytes"] = self._size
+        stats["entries"] = entries
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_access_times()
+            self._db.commit()
+            self._db.close()
+            self._closed = True
@@ -0,0 +1,163 @@
+# data processing
+import pandas as pd
+
+# functions typing
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple, Union
+
+
+# below this number of keywords, one substring search per keyword (done in C) is faster
+# than walking the automaton character by character in Python
+SCAN_MAX_KEYWORDS = 48
+
+
+def build_keyword_automaton(keywords: Sequence[str]) -> Tuple[List[Dict[str, int]], List[Tuple[int, ...]]]:
+    """
+    Builds an Aho-Corasick automaton finding every keyword contained in a text in a single pass.
+
+    Every transition is precomputed, so scanning a text is one dictionary lookup per
+    character, whatever the number of keywords.
+
+    Parameters:
+    ----------
+    keywords : Sequence[str]
+        Keywords to look for.
+
+    Returns:
+    -------
+    tuple
+        The transitions of each state (state 0 is the start) and the indices of the
+        keywords ending at each state, including the ones that are suffixes of others.
+    """
+    goto: List[Dict[str, int]] = [{}]
+    outputs: List[Tuple[int, ...]] = [()]
+    for index, keyword in enumerate(keywords):
+        state = 0
+        for char in keyword:
+            if char not in goto[state]:
+                goto.append({})
+                outputs.append(())
+                goto[state][char] = len(goto) - 1
+            state = goto[state][char]
+        outputs[state] += (index,)
+
+    # breadth-first pass: each state gets the transitions and outputs of its failure state,
+    # which is shallower and already complete
+    children = [dict(transitions) for transitions in goto]
+    fail = [0] * len(goto)
+    queue = deque([0])
+    while queue:
+        state = queue.popleft()
+        if state:
+            outputs[state] += outputs[fail[state]]
+            for char, target in goto[fail[state]].items():
+                goto[state].setdefault(char, target)
+        for char, child in children[state].items():
+            fail[child] = goto[fail[state]].get(char, 0) if state else 0
+            queue.append(child)
+    return goto, outputs
+
+
+class KeywordMatcher:
+    """
+    Finds which of a fixed set of keywords a text contains, in a single pass over the text.
+    Small keyword sets are searched one keyword at a time instead, which is faster in CPython.
+
+    Parameters:
+    ----------
+    keywords : Sequence[str]
+        Keywords to look for.
+    """
+
+    def __init__(self, keywords: Sequence[str]) -> None:
+        self.keywords = list(keywords)
+        self._indexed_keywords = list(enumerate(self.keywords))
+        self._goto = None
+        if len(self.keywords) > SCAN_MAX_KEYWORDS:
+            self._goto, outputs = build_keyword_automaton(self.keywords)
+            self._outputs = [frozenset(output) for output in outputs]
+
+    def find(self, text: str) -> FrozenSet[int]:
+        """
+        Returns the indices of the keywords contained in `text`.
+        """
+        if self._goto is None:
+            return frozenset([index for index, keyword in self._indexed_keywords if keyword in text])
+        goto, outputs = self._goto, self._outputs
+        state, found = 0, frozenset()
+        for char in text:
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return found
+
+
+class BrandMatcher:
+    """
+    Aho-Corasick automaton finding, in a single pass over a product name, the brand
+    `extract_brand` would pick: the longest brand contained in the name, ties going
+    to the brand listed first.
+
+    Parameters:
+    ----------
+    brands : Iterable[str]
+        Brand names to look for, in priority order for brands of the same length.
+    normalizations : Optional[Dict[str, str]]
+        Mapping of matched brand to the brand name returned.
+    default : str
+        Value returned when no brand is found.
+    """
+
+    def __init__(self, brands: Iterable[str], normalizations: Optional[Dict[str, str]] = None, default: str = "otras") -> None:
+        # rank 0 is the best brand: longest first, then in list order
+        self.brands = sorted(dict.fromkeys(brands), key=len, reverse=True)
+        normalizations = normalizations or {}
+        self.results = [normalizations.get(brand, brand) for brand in self.brands]
+        self.default = default
+        self._goto, outputs = build_keyword_automaton(self.brands)
+        # only the best brand ending at each state matters
+        self._best = [min(output) if output else None for output in outputs]
+
+    def match(self, product_name: str) -> str:
+        """
+        Returns the (normalized) brand contained in a product name, or the default value.
+
+        Parameters:
+        ----------
+        product_name : str
+            Lowercase product name.
+
+        Returns:
+        -------
+        str
+            Brand name, or `default` if no brand is found.
+        """
+        goto, best = self._goto, self._best
+        state, found = 0, None
+        for char in product_name:
+            state = goto[state].get(char, 0)
+            rank = best[state]
+            if rank is not None and (found is None or rank < found):
+                found = rank
+        return self.default if found is None else self.results[found]
+
+    def match_many(self, product_names: Union[Iterable[str], pd.Series]) -> Union[List[str], pd.Series]:
+        """
+        Tags a whole column of product names, matching each distinct name once.
+
+        Parameters:
+        ----------
+        product_names : Iterable[str] or pd.Series
+            Lowercase product names.
+
+        Returns:
+        -------
+        list of str or pd.Series
+            Brand of each product name, as a Series with the same index if a Series was given.
+        """
+        if isinstance(product_names, pd.Series):
+            brands = {name: self.match(name) for name in product_names.unique()}
+            return product_names.map(brands)
+        brands: Dict[str, str] = {}
+        match = self.match
+        return [brands[name] if name in brands else brands.setdefault(name, match(name)) for name in product_names]
@@ -0,0 +1,347 @@
+# local storage
+import os
+import json
+
+# system
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlsplit
+
+# functions typing
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+DEFAULT_METRICS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../data/metrics")
+
+# upper bounds in seconds of the latency histogram buckets, from a cached parse to a slow retried request
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_PREFIX = "facua_etl"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def labels_from_url(url: str) -> Dict[str, str]:
+    """
+    Returns the supermarket and category of a FACUA URL, named as in `get_product_info`.
+
+    Parameters:
+    ----------
+    url : str
+        URL of a supermarket, category or product page.
+
+    Returns:
+    -------
+    dict
+        'supermarket' and 'category' labels, for the parts the URL contains.
+    """
+    parts = [part for part in urlsplit(url).path.split("/") if part]
+    labels = {}
+    if parts:
+        labels["supermarket"] = parts[0]
+    if len(parts) > 1:
+        labels["category"] = parts[1].replace("-", "_")
+    return labels
+
+
+class StageMetrics:
+    """
+    Latency histogram, byte and error counters of one stage for one set of labels.
+    """
+    __slots__ = ("buckets", "bucket_counts", "count", "sum", "bytes", "errors")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        # the last count is the +Inf bucket
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.bytes = 0
+        self.errors = 0
+
+    def observe(self, seconds: float, nbytes: int = 0, error: bool = False) -> None:
+        self.bucket_counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.bytes += nbytes
+        self.errors += error
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a latency quantile by linear interpolation inside its bucket, like Prometheus' histogram_quantile.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.bucket_counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+
+class _Timer:
+    """
+    Context manager measuring one call of a stage. Set `bytes` to the size of the
+    processed data and call `fail` when the call did not succeed; exceptions count as errors.
+    """
+    __slots__ = ("registry", "stage", "labels", "bytes", "failed", "start")
+
+    def __init__(self, registry: "MetricsRegistry", stage: str, labels: Dict[str, str]) -> None:
+        self.registry = registry
+        self.stage = stage
+        self.labels = labels
+        self.bytes = 0
+        self.failed = False
+
+    def fail(self) -> None:
+        self.failed = True
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.registry.observe(self.stage, time.perf_counter() - self.start, self.labels,
+                              nbytes=self.bytes, error=self.failed or exc_type is not None)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe collection of per-stage ETL metrics, grouped by stage and labels
+    (supermarket and category).
+
+    Parameters:
+    ----------
+    buckets : tuple of float
+        Upper bounds in seconds of the latency histogram buckets.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self._stages: Dict[Tuple[str, Labels], StageMetrics] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, labels: Optional[Dict[str, str]] = None,
+                nbytes: int = 0, error: bool = False) -> None:
+        """
+        Records one call of a stage.
+
+        Parameters:
+        ----------
+        stage : str
+            Name of the stage (e.g. 'fetch', 'parse', 'insert_price').
+        seconds : float
+            Duration of the call.
+        labels : Optional[Dict[str, str]]
+            Labels of the call, added to the labels of the current `metric_labels` block.
+        nbytes : int
+            Size of the data processed by the call.
+        error : bool
+            Whether the call failed.
+        """
+        merged = dict(getattr(_context, "labels", ()))
+        if labels:
+            merged.update(labels)
+        key = (stage, tuple(sorted(merged.items())))
+        with self._lock:
+            metrics = self._stages.get(key)
+            if metrics is None:
+                metrics = self._stages[key] = StageMetrics(self.buckets)
+            metrics.observe(seconds, nbytes, error)
+
+    def timer(self, stage: str, **labels: str) -> _Timer:
+        """
+        Returns a context manager recording the duration of the block as a call of `stage`.
+        """
+        return _Timer(self, stage, labels)
+
+    def snapshot(self) -> List[dict]:
+        """
+        Returns the raw metrics as picklable records, to be merged into another registry.
+
+        Returns:
+        -------
+        list of dict
+            One record per stage and labels, with non-cumulative bucket counts.
+        """
+        with self._lock:
+            return [
+                {"stage": stage, "labels": dict(labels), "bucket_counts": list(metrics.bucket_counts),
+                 "count": metrics.count, "sum": metrics.sum, "bytes": metrics.bytes, "errors": metrics.errors}
+                for (stage, labels), metrics in self._stages.items()
+            ]
+
+    def merge(self, records: List[dict]) -> None:
+        """
+        Adds the records of another registry's `snapshot`, e.g. one filled in a worker process.
+        """
+        with self._lock:
+            for record in records:
+                key = (record["stage"], tuple(sorted(record["labels"].items())))
+                metrics = self._stages.get(key)
+                if metrics is None:
+                    metrics = self._stages[key] = StageMetrics(self.buckets)
+                metrics.bucket_counts = [a + b for a, b in zip(metrics.bucket_counts, record["bucket_counts"])]
+                metrics.count += record["count"]
+                metrics.sum += record["sum"]
+                metrics.bytes += record["bytes"]
+                metrics.errors += record["errors"]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Aggregates the metrics of each stage over all labels.
+
+        Returns:
+        -------
+        dict
+            Mapping of stage to its count, errors, bytes, total and mean seconds and p50/p95/p99 estimates.
+        """
+        with self._lock:
+            totals: Dict[str, StageMetrics] = {}
+            for (stage, _), metrics in self._stages.items():
+                total = totals.setdefault(stage, StageMetrics(self.buckets))
+                total.bucket_counts = [a + b for a, b in zip(total.bucket_counts, metrics.bucket_counts)]
+                total.count += metrics.count
+                total.sum += metrics.sum
+                total.bytes += metrics.bytes
+                total.errors += metrics.errors
+        return {
+            stage: {
+                "count": total.count, "errors": total.errors, "bytes": total.bytes,
+                "seconds": total.sum, "mean_seconds": total.sum / total.count if total.count else 0.0,
+                "p50_seconds": total.quantile(0.5), "p95_seconds": total.quantile(0.95), "p99_seconds": total.quantile(0.99)
+            }
+            for stage, total in sorted(totals.items())
+        }
+
+    def to_dict(self) -> dict:
+        """
+        Returns every metric with cumulative histogram buckets, ready to be saved as JSON.
+        """
+        records = []
+        for record in sorted(self.snapshot(), key=lambda record: (record["stage"], sorted(record["labels"].items()))):
+            cumulative, buckets = 0, {}
+            for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], record.pop("bucket_counts")):
+                cumulative += bucket_count
+                buckets[str(bound)] = cumulative
+            record["buckets"] = buckets
+            records.append(record)
+        return {"generated_at": time.time(), "stages": records, "summary": self.summary()}
+
+    def to_prometheus(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        def format_labels(labels, **extra):
+            items = list(labels.items()) + list(extra.items())
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in items)
+            return "{" + ",".join(f'{label}="{value}"' for (label, _), value in zip(items, escaped)) + "}"
+
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [f"# HELP {name} Latency of each ETL stage in seconds.", f"# TYPE {name} histogram"]
+        data = self.to_dict()["stages"]
+        for record in data:
+            labels = {"stage": record["stage"], **record["labels"]}
+            for bound, cumulative in record["buckets"].items():
+                lines.append(f"{name}_bucket{format_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {record['sum']:.6f}")
+            lines.append(f"{name}_count{format_labels(labels)} {record['count']}")
+
+        for counter, help_text in (("bytes", "Bytes processed by each ETL stage."),
+                                   ("errors", "Failed calls of each ETL stage.")):
+            counter_name = f"{METRIC_PREFIX}_stage_{counter}_total"
+            lines += [f"# HELP {counter_name} {help_text}", f"# TYPE {counter_name} counter"]
+            for record in data:
+                labels = {"stage": record["stage"], **record["labels"]}
+                lines.append(f"{counter_name}{format_labels(labels)} {record[counter]}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory: str = DEFAULT_METRICS_DIR, name: str = "etl_metrics") -> Tuple[str, str]:
+        """
+        Saves the metrics as `<name>.json` and as a Prometheus textfile `<name>.prom`.
+        Files are replaced atomically, so a collector never reads a partial file.
+
+        Parameters:
+        ----------
+        directory : str
+            Folder of the exported files.
+        name : str
+            File name without extension.
+
+        Returns:
+        -------
+        tuple of str
+            Paths of the JSON and Prometheus files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = (os.path.join(directory, f"{name}.json"), os.path.join(directory, f"{name}.prom"))
+        contents = (json.dumps(self.to_dict(), indent=2), self.to_prometheus())
+        for path, content in zip(paths, contents):
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(path + ".tmp", path)
+        return paths
+
+
+_metrics = MetricsRegistry()
+# per-thread labels of the current `metric_labels` block and registry of the current `collect_metrics` block
+_context = threading.local()
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Returns the registry of the current `collect_metrics` block, or the process-wide registry.
+    """
+    return getattr(_context, "registry", None) or _metrics
+
+
+@contextmanager
+def metric_labels(**labels: str) -> Iterator[None]:
+    """
+    Adds labels (e.g. supermarket and category) to every metric recorded in the block by the current thread.
+    """
+    previous = getattr(_context, "labels", {})
+    _context.labels = {**previous, **labels}
+    try:
+        yield
+    finally:
+        _context.labels = previous
+
+
+@contextmanager
+def collect_metrics() -> Iterator[MetricsRegistry]:
+    """
+    Records the metrics of the block in a new registry instead of the process-wide one,
+    so work done in another process can send them back with `snapshot`.
+    """
+    previous = getattr(_context, "registry", None)
+    _context.registry = registry = MetricsRegistry()
+    try:
+        yield registry
+    finally:
+        _context.registry = previous
+
+
+def timed(stage: str) -> Callable:
+    """
+    Decorator recording every call of the function as a call of `stage`.
+    """
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with get_metrics().timer(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,254 @@
+# data processing
+import numpy as np
+import pandas as pd
+
+# optional columnar storage
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+# system
+import os
+import uuid
+import shutil
+from collections import defaultdict
+from urllib.parse import quote
+
+# functions typing
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from .data_transformation_support import TABLE_CATEGORY_COLUMNS, TABLE_INFO_COLUMNS
+
+
+DATASET_NAME = "facua_extracted_auto.parquet"
+PARTITION_COLUMNS = ("supermarket_name", "category_name")
+# value of a missing partition key, as in Hive
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def parquet_available() -> bool:
+    """
+    Returns whether pyarrow is installed, so that price tables can be written as Parquet datasets.
+    """
+    return pa is not None
+
+
+def price_table_to_arrow(df: pd.DataFrame, exclude: Sequence[str] = ()) -> "pa.Table":
+    """
+    Converts a price table to an Arrow table with a fixed schema, so that the files of a dataset
+    can be read together: date32 dates, float32 prices, dictionary encoded strings, string
+    quantities, float64 volumes and bool eco.
+
+    Parameters:
+    ----------
+    df : pd.DataFrame
+        Price table built by `create_table_df`, with the date and price columns first.
+    exclude : sequence of str
+        Columns left out, e.g. the partition columns, which are stored in the folder names.
+
+    Returns:
+    -------
+    pa.Table
+        The price table as Arrow columns.
+    """
+    date_column, price_column = df.columns[:2]
+    columns = {date_column: _arrow_dates(df[date_column]),
+               price_column: pa.array(df[price_column].to_numpy(dtype=np.float32), type=pa.float32())}
+    for column in TABLE_INFO_COLUMNS:
+        if column not in df.columns or column in exclude:
+            continue
+        values = df[column]
+        if column in TABLE_CATEGORY_COLUMNS:
+            columns[column] = _arrow_dictionary(values)
+        elif column == "quantity":
+            columns[column] = pa.array([None if value is None else str(value) for value in values.to_numpy(dtype=object)], type=pa.string())
+        elif column == "eco":
+            columns[column] = pa.array(values.to_numpy(dtype=bool), type=pa.bool_())
+        else:
+            columns[column] = pa.array(values.to_numpy(dtype=np.float64, na_value=np.nan), type=pa.float64(), from_pandas=True)
+    return pa.table(columns)
+
+
+def _arrow_dates(dates: pd.Series) -> "pa.Array":
+    if isinstance(dates.dtype, pd.ArrowDtype):
+        return pa.array(dates.array).cast(pa.date32())
+    return pa.array(pd.to_datetime(dates).to_numpy(dtype="datetime64[D]"), type=pa.date32())
+
+
+def _arrow_dictionary(values: pd.Series) -> "pa.DictionaryArray":
+    # same index and value types in every file, whatever the number of categories
+    values = values.array if isinstance(values.dtype, pd.CategoricalDtype) else pd.Categorical(values)
+    codes = values.codes.astype(np.int32)
+    return pa.DictionaryArray.from_arrays(
+        pa.array(codes, mask=codes < 0, type=pa.int32()),
+        pa.array([str(category) for category in values.categories], type=pa.string())
+    )
+
+
+def _is_constant(values: pd.Series) -> bool:
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.array.codes
+        return bool((codes == codes[0]).all())
+    return values.nunique(dropna=False) == 1
+
+
+class ParquetDatasetWriter:
+    """
+    Writes price tables to a Parquet dataset partitioned by supermarket and category,
+    `<path>/supermarket_name=<supermarket>/category_name=<category>/part-*.parquet`.
+
+    Tables are buffered per partition and written `rows_per_file` rows at a time, instead of
+    one file per product. Each file is written under a hidden temporary name and renamed
+    when complete, so readers never see a partial file. Unless appending, the dataset is
+    built next to the existing one and replaces it on `close`.
+
+    Parameters:
+    ----------
+    path : str
+        Folder of the dataset.
+    append : bool
+        If True, new files are added to the existing dataset instead of replacing it.
+    partition_columns : sequence of str
+        Columns the dataset is partitioned by.
+    rows_per_file : int
+        Number of rows buffered for a partition before they are written to a file.
+    compression : str
+        Parquet compression codec.
+    """
+
+    def __init__(self, path: str, append: bool = False, partition_columns: Sequence[str] = PARTITION_COLUMNS,
+                 rows_per_file: int = 250_000, compression: str = "zstd") -> None:
+        if pa is None:
+            raise ImportError("pyarrow is required to write Parquet datasets")
+        self.path = path
+        self.append = append
+        self.partition_columns = list(partition_columns)
+        self.rows_per_file = rows_per_file
+        self.compression = compression
+        self.counters = {"rows": 0, "files": 0, "bytes": 0}
+
+        self._run_id = uuid.uuid4().hex[:12]
+        self._target = path if append else f"{path}.tmp-{self._run_id}"
+        self._buffers: Dict[Tuple, List["pa.Table"]] = defaultdict(list)
+        self._buffered_rows: Dict[Tuple, int] = defaultdict(int)
+        self._closed = False
+        os.makedirs(self._target, exist_ok=True)
+
+    def write(self, df: pd.DataFrame) -> None:
+        """
+        Adds a price table to the dataset.
+        """
+        if df.empty:
+            return
+        for key, part in self._split_partitions(df):
+            self._buffers[key].append(price_table_to_arrow(part, exclude=self.partition_columns))
+            self._buffered_rows[key] += len(part)
+            if self._buffered_rows[key] >= self.rows_per_file:
+                self._flush(key)
+
+    def _split_partitions(self, df: pd.DataFrame):
+        keys = [df[column] for column in self.partition_columns]
+        if all(_is_constant(key) for key in keys):
+            # the table of a single product
+            yield tuple(key.iloc[0] for key in keys), df
+            return
+        for key, part in df.groupby(keys, observed=True, dropna=False, sort=False):
+            yield key, part
+
+    def _flush(self, key: Tuple) -> None:
+        parts = self._buffers.pop(key, None)
+        self._buffered_rows.pop(key, None)
+        if not parts:
+            return
+        # each product keeps its own dictionaries, unified when the file is read
+        table = pa.concat_tables(parts)
+        folder = os.path.join(self._target, *(
+            f"{column}={NULL_PARTITION if pd.isna(value) else quote(str(value), safe='')}"
+            for column, value in zip(self.partition_columns, key)
+        ))
+        os.makedirs(folder, exist_ok=True)
+        file_name = f"part-{self._run_id}-{self.counters['files']:05d}.parquet"
+        # files starting with '.' are ignored by dataset readers until they are renamed
+        temporary_path = os.path.join(folder, f".{file_name}.tmp")
+        pq.write_table(table, temporary_path, compression=self.compression)
+        os.replace(temporary_path, os.path.join(folder, file_name))
+        self.counters["rows"] += table.num_rows
+        self.counters["files"] += 1
+        self.counters["bytes"] += os.path.getsize(os.path.join(folder, file_name))
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows of every partition.
+        """
+        for key in list(self._buffers):
+            self._flush(key)
+
+    def close(self) -> None:
+        """
+        Writes the buffered rows and, unless appending, replaces the previous dataset with the new one.
+        """
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        if not self.append:
+            previous = f"{self.path}.old-{self._run_id}"
+            if os.path.exists(self.path):
+                os.replace(self.path, previous)
+            os.replace(self._target, self.path)
+            shutil.rmtree(previous, ignore_errors=True)
+
+    def abort(self) -> None:
+        """
+        Discards the buffered rows and, unless appending, the dataset being built.
+        """
+        self._buffers.clear()
+        self._buffered_rows.clear()
+        self._closed = True
+        if not self.append:
+            shutil.rmtree(self._target, ignore_errors=True)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the number of rows and files written, and their size on disk in bytes.
+        """
+        return dict(self.counters)
+
+
+def read_price_dataset(path: str, columns: Optional[List[str]] = None,
+                       filters: Union[None, list, "ds.Expression"] = None) -> pd.DataFrame:
+    """
+    Reads a price table from a Parquet dataset written by `ParquetDatasetWriter`. Only the
+    requested columns are read, and filters skip the partitions and row groups that cannot match.
+
+    Parameters:
+    ----------
+    path : str
+        Folder of the dataset.
+    columns : Optional[List[str]]
+        Columns to read, all of them if None.
+    filters : list of tuples or pyarrow.dataset.Expression, optional
+        Row filter, e.g. `[("supermarket_name", "==", "dia"), ("Precio", "<", 2)]`.
+
+    Returns:
+    -------
+    pd.DataFrame
+        The matching rows, with categorical strings and date32 dates.
+    """
+    if pa is None:
+        raise ImportError("pyarrow is required to read Parquet datasets")
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=columns)
+    dataset = ds.dataset(path, format="parquet", partitioning=ds.HivePartitioning.discover(infer_dictionary=True))
+    if filters is not None and not isinstance(filters, ds.Expression):
+        filters = pq.filters_to_expression(filters)
+    table = dataset.to_table(columns=columns, filter=filters)
+    df = table.to_pandas(types_mapper=lambda arrow_type: pd.ArrowDtype(arrow_type) if arrow_type == pa.date32() else None)
+    if columns is not None:
+        return df[columns]
+    # partition columns come last: restore the column order of `create_table_df`
+    first_columns = [column for column in df.columns if column not in TABLE_INFO_COLUMNS]
+    return df[first_columns + [column for column in TABLE_INFO_COLUMNS if column in df.columns]]
@@ -0,0 +1,286 @@
+# concurrency
+import os
+import queue
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# system
+import time
+
+# functions typing
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# marks the end of the items of a stage
+_DONE = object()
+
+# transformation processes are started from a clean process instead of forking the pipeline, whose
+# fetch and crawler threads may hold locks (HTTP cache, frontier, logging) at that moment
+TRANSFORM_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class StageQueue:
+    """
+    Bounded queue between two pipeline stages.
+
+    A full queue blocks its producers (backpressure) until the next stage catches up.
+    The depth of the queue and the time producers spent blocked are recorded, to show
+    which stage is the bottleneck.
+
+    Parameters:
+    ----------
+    name : str
+        Name of the queue in the reports.
+    maxsize : int
+        Maximum number of items waiting in the queue.
+    stop : threading.Event
+        Event set when the pipeline is aborted, which unblocks waiting producers.
+    """
+
+    def __init__(self, name: str, maxsize: int, stop: threading.Event) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize)
+        self._stop = stop
+        self._lock = threading.Lock()
+        self.puts = 0
+        self.max_depth = 0
+        self._depth_sum = 0
+        self.blocked_seconds = 0.0
+
+    def put(self, item: Any) -> bool:
+        """
+        Adds an item, waiting while the queue is full.
+
+        Returns:
+        -------
+        bool
+            False if the pipeline was aborted before the item could be added.
+        """
+        start = None
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                start = start or time.perf_counter()
+        else:
+            return False
+
+        depth = self._queue.qsize()
+        with self._lock:
+            self.puts += 1
+            self._depth_sum += depth
+            self.max_depth = max(self.max_depth, depth)
+            if start:
+                self.blocked_seconds += time.perf_counter() - start
+        return True
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        return self._queue.get(timeout=timeout)
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def empty(self) -> bool:
+        return self._queue.empty()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the current, mean and maximum depth of the queue and the time its producers were blocked.
+
+        Returns:
+        -------
+        dict
+            Depth and backpressure statistics of the queue.
+        """
+        with self._lock:
+            return {
+                "depth": self.depth(),
+                "mean_depth": round(self._depth_sum / self.puts, 1) if self.puts else 0.0,
+                "max_depth": self.max_depth,
+                "capacity": self.maxsize,
+                "blocked_seconds": round(self.blocked_seconds, 2)
+            }
+
+
+class Pipeline:
+    """
+    Three-stage producer/consumer pipeline: fetch, transform and load.
+
+    Fetch workers are threads, since fetching waits on the network. Transformation runs in
+    a process pool so parsing uses every core; its processes are not forked from the pipeline
+    (`TRANSFORM_START_METHOD`), so `initializer` must set up their state, and `transform`,
+    `initializer` and `initargs` must be picklable. Loading runs in the calling thread, in
+    batches, so a single database connection is used. Stages are connected by bounded
+    `StageQueue`s and run at the same time.
+
+    Parameters:
+    ----------
+    fetch_workers : int
+        Number of fetch threads.
+    transform_workers : Optional[int]
+        Number of transformation processes (default: number of CPUs). With 0 pages are
+        transformed in a thread of the current process.
+    queue_size : int
+        Capacity of each queue between two stages.
+    batch_size : int
+        Maximum number of transformed pages loaded at once.
+    initializer : Optional[Callable]
+        Function run at the start of each transformation process.
+    initargs : tuple
+        Arguments of `initializer`.
+    """
+
+    def __init__(self, fetch_workers: int = 8, transform_workers: Optional[int] = None, queue_size: int = 64,
+                 batch_size: int = 50, initializer: Optional[Callable] = None, initargs: tuple = ()) -> None:
+        self.fetch_workers = fetch_workers
+        self.transform_workers = (os.cpu_count() or 1) if transform_workers is None else transform_workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.initializer = initializer
+        self.initargs = initargs
+
+        self._stop = threading.Event()
+        self.fetched = StageQueue("fetched", queue_size, self._stop)
+        self.transformed = StageQueue("transformed", queue_size, self._stop)
+        self.batches = 0
+        self._errors: List[BaseException] = []
+
+    def _fetch_worker(self, items: Iterable, items_lock: threading.Lock, fetch: Callable) -> None:
+        try:
+            while not self._stop.is_set():
+                with items_lock:
+                    item = next(items, _DONE)
+                if item is _DONE:
+                    break
+                if not self.fetched.put(fetch(item)):
+                    break
+        except BaseException as error:
+            self._abort(error)
+
+    def _fetch_stage(self, source: Iterable, fetch: Callable) -> None:
+        items, items_lock = iter(source), threading.Lock()
+        workers = [threading.Thread(target=self._fetch_worker, args=(items, items_lock, fetch), daemon=True)
+                   for _ in range(self.fetch_workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.fetched.put(_DONE)
+
+    def _transform_stage(self, transform: Callable, skip: Callable) -> None:
+        if self.transform_workers:
+            executor = ProcessPoolExecutor(self.transform_workers, mp_context=multiprocessing.get_context(TRANSFORM_START_METHOD),
+                                           initializer=self.initializer, initargs=self.initargs)
+        else:
+            executor = None
+        # results are delivered in submission order, with at most `queue_size` pages in the pool
+        pending = deque()
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = self.fetched.get(timeout=0.1)
+                except queue.Empty:
+                    item = None
+                if item is _DONE:
+                    break
+                if item is not None:
+                    if skip(item):
+                        future = Future()
+                        future.set_result(None)
+                    elif executor:
+                        future = executor.submit(transform, *item)
+                    else:
+                        future = Future()
+                        future.set_result(transform(*item))
+                    pending.append((item, future))
+                while pending and (pending[0][1].done() or len(pending) >= self.queue_size):
+                    item, future = pending.popleft()
+                    if not self.transformed.put((item, future.result())):
+                        return
+            for item, future in pending:
+                if not self.transformed.put((item, future.result())):
+                    return
+            self.transformed.put(_DONE)
+        except BaseException as error:
+            self._abort(error)
+        finally:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def _abort(self, error: BaseException) -> None:
+        self._errors.append(error)
+        self._stop.set()
+
+    def run(self, source: Iterable, fetch: Callable, transform: Callable, load: Callable,
+            skip: Callable = lambda item: False, on_progress: Optional[Callable] = None) -> None:
+        """
+        Runs the three stages until every item of `source` is loaded.
+
+        Parameters:
+        ----------
+        source : Iterable
+            Items to fetch, shared by the fetch workers.
+        fetch : Callable
+            Function returning the tuple of arguments of `transform` for an item.
+        transform : Callable
+            Picklable function transforming a fetched item.
+        load : Callable
+            Function called with a list of (fetched item, transform result) pairs.
+        skip : Callable
+            Function telling whether a fetched item must not be transformed (its result is None).
+        on_progress : Optional[Callable]
+            Function called with the number of pages of each loaded batch.
+        """
+        stages = [
+            threading.Thread(target=self._fetch_stage, args=(source, fetch), name="fetch-stage", daemon=True),
+            threading.Thread(target=self._transform_stage, args=(transform, skip), name="transform-stage", daemon=True)
+        ]
+        for stage in stages:
+            stage.start()
+
+        try:
+            finished = False
+            while not finished and not self._stop.is_set():
+                batch = []
+                # fill the batch while pages are ready, so a slow database gets larger batches
+                while len(batch) < self.batch_size:
+                    try:
+                        result = self.transformed.get(timeout=0.01 if batch else 0.1)
+                    except queue.Empty:
+                        if batch or self._stop.is_set():
+                            break
+                        continue
+                    if result is _DONE:
+                        finished = True
+                        break
+                    batch.append(result)
+                if batch:
+                    load(batch)
+                    self.batches += 1
+                    if on_progress:
+                        on_progress(len(batch))
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            self._stop.set()
+            for stage in stages:
+                stage.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Returns the depth statistics of each queue and the number of loaded batches.
+
+        Returns:
+        -------
+        dict
+            Statistics of the 'fetched' and 'transformed' queues and the 'batches' counter.
+        """
+        return {"fetched": self.fetched.stats(), "transformed": self.transformed.stats(), "batches": self.batches}
@@ -0,0 +1,240 @@
+# system
+import time
+import random
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# functions typing
+from typing import Dict, Optional
+
+
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+THROTTLING_STATUSES = {429, 503}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+
+    Parameters:
+    ----------
+    value : Optional[str]
+        Value of the header.
+
+    Returns:
+    -------
+    Optional[float]
+        Seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket allowing `rate` requests per second with bursts of up to `capacity` requests.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def acquire(self, now: float) -> float:
+        """
+        Takes a token if one is available.
+
+        Returns:
+        -------
+        float
+            0 if a token was taken, otherwise the seconds until the next token is available.
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdaptiveRateLimiter:
+    """
+    Per-host token bucket rate limiter that adapts to the responses of each host.
+
+    The rate of a host grows additively after each success and is cut multiplicatively
+    after a throttling response (429/503) or when the recent error rate exceeds a threshold.
+    Retry-After headers pause the host for the requested time.
+
+    Parameters:
+    ----------
+    rate : float
+        Initial requests per second per host.
+    burst : float
+        Maximum number of requests sent at once to a host.
+    min_rate : float
+        Lowest rate the limiter slows down to.
+    max_rate : float
+        Highest rate the limiter speeds up to.
+    increase : float
+        Requests per second added after each successful response.
+    decrease : float
+        Factor applied to the rate when the host throttles or fails too often.
+    error_threshold : float
+        Fraction of errors among the last `window` responses that triggers a slowdown.
+    window : int
+        Number of recent responses used to compute the error rate.
+    backoff_cap : float
+        Maximum seconds waited between two attempts of the same request.
+    """
+
+    def __init__(self, rate: float = 5.0, burst: float = 5.0, min_rate: float = 0.2, max_rate: float = 50.0,
+                 increase: float = 0.2, decrease: float = 0.5, error_threshold: float = 0.1, window: int = 50,
+                 backoff_cap: float = 60.0) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.error_threshold = error_threshold
+        self.window = window
+        self.backoff_cap = backoff_cap
+
+        self.counters = {
+            "requests": 0, "successes": 0, "errors": 0, "retries": 0, "throttled": 0,
+            "retry_after": 0, "slowdowns": 0, "waits": 0, "backoff_seconds": 0.0
+        }
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._outcomes: Dict[str, deque] = {}
+        self._paused_until: Dict[str, float] = {}
+        self._last_slowdown: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urlsplit(url).netloc
+
+    def _bucket(self, host: str) -> TokenBucket:
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+            self._outcomes[host] = deque(maxlen=self.window)
+        return self._buckets[host]
+
+    def acquire(self, url: str) -> float:
+        """
+        Tries to take a request slot for the host of `url`.
+
+        Callers wait for the returned time and try again until it is 0, so rate
+        changes made in the meantime apply to requests that are already waiting.
+
+        Returns:
+        -------
+        float
+            0 if the request can be sent now, otherwise the seconds to wait before trying again.
+        """
+        host = self._host(url)
+        with self._lock:
+            now = time.monotonic()
+            paused = self._paused_until.get(host, 0.0) - now
+            wait = paused if paused > 0 else self._bucket(host).acquire(now)
+            if wait > 0:
+                self.counters["waits"] += 1
+            else:
+                self.counters["requests"] += 1
+        return wait
+
+    def _slow_down(self, host: str, now: float) -> None:
+        # a single slowdown per second, so a burst of failures does not collapse the rate
+        if now - self._last_slowdown.get(host, 0.0) < 1.0:
+            return
+        bucket = self._bucket(host)
+        bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+        self._last_slowdown[host] = now
+        # the error rate is measured again from scratch at the new rate
+        self._outcomes[host].clear()
+        self.counters["slowdowns"] += 1
+
+    def record(self, url: str, status: Optional[int] = None, retry_after: Optional[str] = None) -> None:
+        """
+        Records the outcome of a request.
+
+        Parameters:
+        ----------
+        url : str
+            Requested URL.
+        status : Optional[int]
+            HTTP status of the response, or None if the request raised an exception.
+        retry_after : Optional[str]
+            Value of the Retry-After header of the response, if any.
+        """
+        host = self._host(url)
+        failed = status is None or status in RETRYABLE_STATUSES
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(host)
+            outcomes = self._outcomes[host]
+            outcomes.append(failed)
+
+            if failed:
+                self.counters["errors"] += 1
+            else:
+                self.counters["successes"] += 1
+                bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+
+            if status in THROTTLING_STATUSES:
+                self.counters["throttled"] += 1
+                self._slow_down(host, now)
+            elif len(outcomes) >= 10 and sum(outcomes) / len(outcomes) > self.error_threshold:
+                self._slow_down(host, now)
+
+            pause = parse_retry_after(retry_after)
+            if pause:
+                self.counters["retry_after"] += 1
+                self._paused_until[host] = max(self._paused_until.get(host, 0.0), now + min(pause, self.backoff_cap))
+
+    def backoff(self, attempt: int, base: float) -> float:
+        """
+        Returns an exponential backoff with full jitter for a retry.
+
+        Parameters:
+        ----------
+        attempt : int
+            Zero-based number of the failed attempt.
+        base : float
+            Backoff in seconds of the first retry.
+
+        Returns:
+        -------
+        float
+            Seconds to wait before the next attempt.
+        """
+        pause = random.uniform(0, min(self.backoff_cap, base * 2 ** attempt))
+        with self._lock:
+            self.counters["retries"] += 1
+            self.counters["backoff_seconds"] += pause
+        return pause
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Returns the request, retry and throttling counters and the current rate of each host.
+
+        Returns:
+        -------
+        dict
+            Counters of the limiter and a 'rates' mapping of host to requests per second.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats["rates"] = {host: round(bucket.rate, 2) for host, bucket in self._buckets.items()}
+        return stats
@@ -0,0 +1,211 @@
+# database agent
+import psycopg2
+
+# system
+import time
+from contextlib import contextmanager
+
+# functions typing
+from typing import Callable, Dict, Hashable, Iterator, List, Optional
+
+# instrumentation
+from .metrics_support import get_metrics
+
+from .dimension_cache_support import get_dimension_cache
+
+
+# units of work of the open connections, by connection
+_units_of_work: Dict[int, "UnitOfWork"] = {}
+
+
+def active_unit_of_work(conn: psycopg2.extensions.connection) -> Optional["UnitOfWork"]:
+    """
+    Returns the unit of work the connection is used by, or None if its statements are committed one by one.
+    """
+    return _units_of_work.get(id(conn))
+
+
+class UnitOfWork:
+    """
+    Groups the loading of several products into one transaction, committed every
+    `max_products` products or `max_seconds` seconds, instead of committing every row.
+
+    While it is open, the insert functions of `data_load_support` leave committing to it.
+    Each product is loaded inside a savepoint: a product failing with a database error is
+    rolled back alone, rows and prices together, and recorded in `failures`, and the rest of
+    the transaction is kept.
+    Callbacks registered with `after_commit` run once the work before them is committed, e.g.
+    to mark a product as done in the crawl frontier only when its rows are stored.
+
+    Parameters:
+    ----------
+    conn : psycopg2.extensions.connection
+        Connection to the PostgreSQL database.
+    max_products : int
+        Number of products loaded before the transaction is committed.
+    max_seconds : float
+        Age of the transaction, in seconds, after which it is committed.
+    """
+
+    def __init__(self, conn: psycopg2.extensions.connection, max_products: int = 100, max_seconds: float = 5.0) -> None:
+        self.conn = conn
+        self.max_products = max(max_products, 1)
+        self.max_seconds = max_seconds
+        self.failures: Dict[Hashable, str] = {}
+        self.counters = {"commits": 0, "rollbacks": 0, "products": 0, "failed_products": 0, "commit_seconds": 0.0}
+
+        self._pending_products = 0
+        self._started_at: Optional[float] = None
+        self._callbacks: List[Callable[[], None]] = []
+        self._savepoints = 0
+        self._cache_mark = self._dimension_cache_mark()
+        _units_of_work[id(conn)] = self
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None and not self.conn.closed:
+            self.rollback()
+        self.close()
+
+    @staticmethod
+    def _dimension_cache_mark() -> int:
+        dimension_cache = get_dimension_cache()
+        return dimension_cache.mark() if dimension_cache is not None else 0
+
+    @contextmanager
+    def savepoint(self) -> Iterator[None]:
+        """
+        Runs the block inside a savepoint, rolled back with the dimension IDs cached and the
+        `after_commit` callbacks registered in it if the block fails.
+        """
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+        self._savepoints += 1
+        name = f"unit_of_work_{self._savepoints}"
+        cache_mark = self._dimension_cache_mark()
+        callbacks_mark = len(self._callbacks)
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            dimension_cache = get_dimension_cache()
+            if dimension_cache is not None:
+                dimension_cache.rollback(cache_mark)
+            del self._callbacks[callbacks_mark:]
+            raise
+        else:
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"RELEASE SAVEPOINT {name}")
+        finally:
+            self._savepoints -= 1
+
+    @contextmanager
+    def product(self, key: Hashable) -> Iterator[None]:
+        """
+        Loads a product inside a savepoint. A database error rolls the product back and is
+        recorded in `failures` under `key` instead of being raised.
+        """
+        try:
+            with self.savepoint():
+                yield
+        except psycopg2.Error as error:
+            self.fail(key, error)
+        else:
+            self.loaded()
+
+    def loaded(self, products: int = 1) -> None:
+        """
+        Records products loaded in the transaction, e.g. a batch loaded in one savepoint.
+        """
+        self.counters["products"] += products
+        self._pending_products += products
+
+    def fail(self, key: Hashable, error: Exception) -> None:
+        """
+        Records a product that could not be loaded.
+        """
+        self.failures[key] = str(error).strip() or type(error).__name__
+        self.counters["failed_products"] += 1
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """
+        Runs `callback` after the next commit, or drops it if the transaction, or the savepoint it
+        is registered in, is rolled back.
+        """
+        self._callbacks.append(callback)
+
+    def maybe_commit(self) -> bool:
+        """
+        Commits the transaction if it holds `max_products` products or is older than `max_seconds`.
+
+        Returns:
+        -------
+        bool
+            Whether the transaction was committed.
+        """
+        if self._pending_products >= self.max_products or (
+                self._started_at is not None and time.perf_counter() - self._started_at >= self.max_seconds):
+            self.commit()
+            return True
+        return False
+
+    def commit(self) -> None:
+        """
+        Commits the transaction and runs the callbacks waiting for it.
+        """
+        with get_metrics().timer("commit"):
+            start = time.perf_counter()
+            self.conn.commit()
+            self.counters["commit_seconds"] += time.perf_counter() - start
+        self.counters["commits"] += 1
+        self._pending_products = 0
+        self._started_at = None
+        dimension_cache = get_dimension_cache()
+        if dimension_cache is not None:
+            dimension_cache.commit()
+        self._cache_mark = self._dimension_cache_mark()
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self) -> None:
+        """
+        Rolls the transaction back, with the dimension IDs cached since the last commit and the waiting callbacks.
+        """
+        self.conn.rollback()
+        self.counters["rollbacks"] += 1
+        self._pending_products = 0
+        self._started_at = None
+        dimension_cache = get_dimension_cache()
+        if dimension_cache is not None:
+            dimension_cache.rollback(self._cache_mark)
+        self._callbacks = []
+
+    def close(self) -> None:
+        """
+        Commits the pending work, or rolls it back if the transaction is aborted, and gives
+        committing back to the insert functions.
+        """
+        try:
+            if self.conn.closed:
+                return
+            status = self.conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+                self.rollback()
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE or self._callbacks:
+                self.commit()
+        finally:
+            _units_of_work.pop(id(self.conn), None)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the number of commits, rollbacks, loaded and failed products, and the mean commit latency in seconds.
+        """
+        stats = dict(self.counters)
+        stats["mean_commit_seconds"] = stats["commit_seconds"] / stats["commits"] if stats["commits"] else 0.0
+        return stats
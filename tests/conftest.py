@@ -0,0 +1,83 @@
+import os
+import sys
+
+# the modules are imported as the entry scripts of src/ import them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import psycopg2
+import pytest
+
+from support.dimension_cache_support import configure_dimension_cache
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, statement, arguments=None):
+        if self.conn.fail_on is not None and self.conn.fail_on in statement:
+            self.conn.status = psycopg2.extensions.TRANSACTION_STATUS_INERROR
+            raise psycopg2.Error(f"failed: {statement}")
+        if statement.startswith("ROLLBACK TO SAVEPOINT"):
+            # the transaction is usable again after a failed statement
+            self.conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        elif self.conn.status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            raise psycopg2.Error("current transaction is aborted")
+        self.conn.statements.append(statement)
+        # every copied row is inserted
+        self.rowcount = len(self.conn.copied)
+        if self.conn.status == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            self.conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+    def copy_expert(self, statement, file):
+        self.execute(statement)
+        self.conn.copied = file.read().splitlines()
+
+
+class FakeConnection:
+    """
+    Connection recording the statements sent to it and the transaction status they leave,
+    failing the statements containing `fail_on`.
+    """
+
+    def __init__(self):
+        self.closed = 0
+        self.statements = []
+        self.copied = []
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.fail_on = None
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def commit(self):
+        self.commits += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+@pytest.fixture
+def conn():
+    return FakeConnection()
+
+
+@pytest.fixture
+def dimension_cache():
+    cache = configure_dimension_cache()
+    yield cache
+    configure_dimension_cache(enabled=False)
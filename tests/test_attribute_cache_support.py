@@ -0,0 +1,58 @@
+import os
+import sqlite3
+
+import pytest
+
+from support import data_transformation_support
+from support.data_transformation_support import configure_attribute_cache, close_attribute_cache
+
+
+def stored_entries(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM attributes").fetchone()[0]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_worker_leaves_the_parent_cache_untouched(tmp_path):
+    path = str(tmp_path / "attributes.sqlite")
+    cache = configure_attribute_cache(path)
+    cache.flush_every = 1000
+    cache.put("leche", "leche entera", ("leche", "marca"))
+    cache.put("leche", "leche desnatada", ("leche", "marca"))
+    try:
+        pid = os.fork()
+        if pid == 0:
+            # what `init_transform_worker` does in a pipeline worker
+            code = 0
+            try:
+                configure_attribute_cache(path)
+                close_attribute_cache()
+            except BaseException:
+                code = 1
+            os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+
+        # the pending entries of the parent were not written by the child, and its WAL file is still there
+        assert stored_entries(path) == 0
+        assert os.path.exists(path + "-wal")
+
+        cache.put("leche", "leche sin lactosa", ("leche", "marca"))
+        cache.flush()
+        assert stored_entries(path) == 3
+        with sqlite3.connect(path) as db:
+            assert db.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    finally:
+        configure_attribute_cache()
+
+
+def test_close_in_the_same_process_writes_the_pending_entries(tmp_path):
+    path = str(tmp_path / "attributes.sqlite")
+    cache = configure_attribute_cache(path)
+    try:
+        cache.put("leche", "leche entera", ("leche", "marca"))
+        close_attribute_cache()
+        assert stored_entries(path) == 1
+        assert data_transformation_support.get_attribute_cache() is cache
+    finally:
+        configure_attribute_cache()
@@ -0,0 +1,38 @@
+from datetime import date
+
+import pytest
+
+from support.data_load_support import get_price_load_stats, insert_price, reset_price_load_stats
+from support.unit_of_work_support import UnitOfWork
+
+
+@pytest.fixture(autouse=True)
+def price_stats():
+    reset_price_load_stats()
+    yield
+    reset_price_load_stats()
+
+
+def test_insert_price_leaves_out_non_finite_prices(conn):
+    prices = [(1, date(2024, 1, 1), 1.45), (1, date(2024, 1, 2), float("nan")),
+              (1, date(2024, 1, 3), float("inf")), (1, date(2024, 1, 4), None)]
+
+    assert insert_price(conn, prices) == (1, 0)
+    assert conn.copied == ["0\t1\t2024-01-01\t1.45"]
+    assert get_price_load_stats() == {"inserted": 1, "skipped": 0, "invalid": 3}
+    assert conn.commits == 1
+
+
+def test_prices_are_counted_once_committed(conn, dimension_cache):
+    unit_of_work = UnitOfWork(conn)
+    with pytest.raises(RuntimeError):
+        with unit_of_work.savepoint():
+            insert_price(conn, [(1, date(2024, 1, 1), 1.45), (1, date(2024, 1, 2), float("nan"))])
+            raise RuntimeError("product failed")
+    with unit_of_work.savepoint():
+        insert_price(conn, [(2, date(2024, 1, 1), 2.5)])
+    assert get_price_load_stats() == {"inserted": 0, "skipped": 0, "invalid": 0}
+
+    unit_of_work.close()
+    assert get_price_load_stats() == {"inserted": 1, "skipped": 0, "invalid": 0}
+    assert conn.commits == 1
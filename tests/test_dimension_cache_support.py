@@ -0,0 +1,73 @@
+from decimal import Decimal
+
+from support.dimension_cache_support import DimensionCache, cached_dimension
+
+
+PRODUCT = (1, 2, "lacteos leche ", 1, "l", 1.5)
+
+
+def test_missing_and_numeric_values_match_like_the_unique_indexes():
+    cache = DimensionCache()
+    cache.put("products", PRODUCT, 10)
+    cache.put("subcategories", ("leche", 1, None, None), 20)
+
+    assert cache.get("products", (1, 2, "lacteos leche ", "1", "l", Decimal("1.50"))) == 10
+    assert cache.get("products", (1, 2, "lacteos leche ", 1, "l", 1.25)) is None
+    assert cache.get("subcategories", ("leche", 1, "", False)) == 20
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["products_misses"] == 1
+
+
+def test_rollback_forgets_the_ids_cached_after_the_mark():
+    cache = DimensionCache()
+    cache.put("brands", ("marca",), 1)
+    mark = cache.mark()
+    cache.put("brands", ("otra marca",), 2)
+    # a row found again is not journaled twice
+    cache.put("brands", ("marca",), 1)
+    assert cache.mark() == 2
+
+    cache.rollback(mark)
+    assert cache.get("brands", ("marca",)) == 1
+    assert cache.get("brands", ("otra marca",)) is None
+    assert cache.mark() == mark
+
+
+def test_nested_rollbacks_restore_the_journal():
+    cache = DimensionCache()
+    outer = cache.mark()
+    cache.put("brands", ("marca",), 1)
+    inner = cache.mark()
+    cache.put("categories", ("lacteos",), 1)
+    cache.rollback(inner)
+    assert cache.mark() == inner
+
+    cache.put("supermarkets", ("super",), 1)
+    cache.rollback(outer)
+    assert cache.mark() == outer
+    assert cache.stats()["entries"] == 0
+
+
+def test_commit_keeps_the_ids_and_empties_the_journal():
+    cache = DimensionCache()
+    cache.put("brands", ("marca",), 1)
+    cache.commit()
+    assert cache.mark() == 0
+
+    cache.rollback()
+    assert cache.get("brands", ("marca",)) == 1
+
+
+def test_cached_dimension_skips_the_insert_function_on_a_hit(conn, dimension_cache):
+    calls = []
+
+    @cached_dimension("brands")
+    def insert_brand(conn, brand_name):
+        calls.append(brand_name)
+        return len(calls)
+
+    assert insert_brand(conn, "marca") == 1
+    assert insert_brand(conn, brand_name="marca") == 1
+    assert insert_brand(conn, "otra marca") == 2
+    assert calls == ["marca", "otra marca"]
+    assert dimension_cache.mark() == 2
@@ -0,0 +1,125 @@
+import itertools
+from functools import partial
+
+import psycopg2
+import pytest
+
+from support.dimension_cache_support import cached_dimension
+from support.unit_of_work_support import UnitOfWork, active_unit_of_work
+
+
+_ids = itertools.count(1)
+
+
+@cached_dimension("brands")
+def insert_brand(conn, brand_name):
+    # the insert of a dimension row, failing like the database for the brand 'fails'
+    with conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO brands (brand_name) VALUES ('{brand_name}')")
+    return next(_ids)
+
+
+def load_products(unit_of_work, conn, brands, done):
+    # one product per brand, marked as done in the frontier once it is committed
+    for brand_name in brands:
+        with unit_of_work.product(brand_name):
+            insert_brand(conn, brand_name)
+            unit_of_work.after_commit(partial(done.append, brand_name))
+
+
+def test_failing_product_in_a_batch_leaves_no_cached_ids_or_callbacks(conn, dimension_cache):
+    conn.fail_on = "'fails'"
+    done = []
+    with UnitOfWork(conn) as unit_of_work:
+        with unit_of_work.savepoint():
+            load_products(unit_of_work, conn, ["leche", "fails", "cafe"], done)
+
+    assert list(unit_of_work.failures) == ["fails"]
+    assert done == ["leche", "cafe"]
+    assert dimension_cache.get("brands", ("leche",)) is not None
+    assert dimension_cache.get("brands", ("cafe",)) is not None
+    assert dimension_cache.get("brands", ("fails",)) is None
+    assert unit_of_work.stats()["products"] == 2
+    assert conn.commits == 1
+
+
+def test_failing_batch_is_rolled_back_with_its_cached_ids_and_callbacks(conn, dimension_cache):
+    done = []
+    with UnitOfWork(conn) as unit_of_work:
+        load_products(unit_of_work, conn, ["leche"], done)
+        with pytest.raises(psycopg2.Error):
+            with unit_of_work.savepoint():
+                insert_brand(conn, "cafe")
+                unit_of_work.after_commit(partial(done.append, "cafe"))
+                raise psycopg2.Error("batch failed")
+
+    assert done == ["leche"]
+    assert dimension_cache.get("brands", ("leche",)) is not None
+    assert dimension_cache.get("brands", ("cafe",)) is None
+    assert "ROLLBACK TO SAVEPOINT unit_of_work_1" in conn.statements
+
+
+def test_nested_savepoint_rollback_restores_the_journal(conn, dimension_cache):
+    unit_of_work = UnitOfWork(conn)
+    with pytest.raises(RuntimeError):
+        with unit_of_work.savepoint():
+            insert_brand(conn, "leche")
+            with pytest.raises(RuntimeError):
+                with unit_of_work.savepoint():
+                    insert_brand(conn, "cafe")
+                    raise RuntimeError("inner")
+            assert dimension_cache.mark() == 1
+            assert dimension_cache.get("brands", ("cafe",)) is None
+            insert_brand(conn, "arroz")
+            assert dimension_cache.mark() == 2
+            raise RuntimeError("outer")
+
+    # the outer rollback forgets what the outer savepoint cached, after the inner one was rolled back
+    assert dimension_cache.mark() == 0
+    assert [dimension_cache.get("brands", (brand_name,)) for brand_name in ("leche", "cafe", "arroz")] == [None] * 3
+    assert [statement for statement in conn.statements if "SAVEPOINT" in statement] == [
+        "SAVEPOINT unit_of_work_1", "SAVEPOINT unit_of_work_2", "ROLLBACK TO SAVEPOINT unit_of_work_2",
+        "ROLLBACK TO SAVEPOINT unit_of_work_1",
+    ]
+    unit_of_work.close()
+
+
+def test_rollback_drops_the_waiting_callbacks(conn, dimension_cache):
+    done = []
+    unit_of_work = UnitOfWork(conn)
+    load_products(unit_of_work, conn, ["leche"], done)
+    unit_of_work.rollback()
+    unit_of_work.commit()
+
+    assert done == []
+    assert dimension_cache.get("brands", ("leche",)) is None
+    assert unit_of_work.stats()["rollbacks"] == 1
+
+
+def test_close_rolls_back_an_aborted_transaction(conn, dimension_cache):
+    done = []
+    unit_of_work = UnitOfWork(conn)
+    load_products(unit_of_work, conn, ["leche"], done)
+    assert active_unit_of_work(conn) is unit_of_work
+
+    # a statement failing outside of any savepoint aborts the whole transaction
+    conn.status = psycopg2.extensions.TRANSACTION_STATUS_INERROR
+    unit_of_work.close()
+
+    assert (conn.commits, conn.rollbacks) == (0, 1)
+    assert done == []
+    assert dimension_cache.get("brands", ("leche",)) is None
+    assert active_unit_of_work(conn) is None
+
+
+def test_close_commits_the_pending_work(conn, dimension_cache):
+    done = []
+    unit_of_work = UnitOfWork(conn)
+    load_products(unit_of_work, conn, ["leche"], done)
+    unit_of_work.close()
+
+    assert (conn.commits, conn.rollbacks) == (1, 0)
+    assert done == ["leche"]
+    assert dimension_cache.mark() == 0
+    assert dimension_cache.get("brands", ("leche",)) is not None
+    assert active_unit_of_work(conn) is None